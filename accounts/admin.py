@@ -3,7 +3,8 @@ from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.shortcuts import redirect
 from django.urls import reverse
-from .models import AuditLog, User, UserProfile
+from django.utils import timezone
+from .models import AuditLog, EmailOutbox, ScheduledJobRun, User, UserProfile
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -84,3 +85,38 @@ class AuditLogAdmin(admin.ModelAdmin):
     def has_module_permission(self, request):
         """Admin has access to all modules"""
         return request.user.is_superuser or request.user.is_staff
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipient', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    search_fields = ('subject', 'recipient__username', 'recipient__email')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('created_at', 'sent_at', 'claim_token', 'claimed_at')
+    ordering = ('-created_at',)
+    actions = ['requeue']
+    
+    def requeue(self, request, queryset):
+        """Send dead-lettered emails again on the next drain"""
+        count = queryset.filter(status='dead').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now(), last_error=''
+        )
+        self.message_user(request, f'{count} emails requeued.')
+    requeue.short_description = 'Requeue dead-lettered emails'
+    
+    def has_module_permission(self, request):
+        """Admin has access to all modules"""
+        return request.user.is_superuser or request.user.is_staff
+
+
+@admin.register(ScheduledJobRun)
+class ScheduledJobRunAdmin(admin.ModelAdmin):
+    list_display = ('job_name', 'scheduled_for', 'status', 'attempts', 'duration_seconds', 'result', 'owner')
+    search_fields = ('job_name', 'error')
+    list_filter = ('job_name', 'status')
+    readonly_fields = [f.name for f in ScheduledJobRun._meta.fields]
+    ordering = ('-scheduled_for',)
+    
+    def has_module_permission(self, request):
+        """Admin has access to all modules"""
+        return request.user.is_superuser or request.user.is_staff
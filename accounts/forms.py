@@ -359,7 +359,7 @@ class UserProfileExtraForm(forms.ModelForm):
         model = UserProfile
         fields = [
             'bio', 'location', 'date_of_birth', 
-            'emergency_contact', 'emergency_contact_name'
+            'emergency_contact', 'emergency_contact_name', 'notification_frequency'
         ]
         widgets = {
             'bio': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
@@ -367,6 +367,7 @@ class UserProfileExtraForm(forms.ModelForm):
             'date_of_birth': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'emergency_contact': forms.TextInput(attrs={'class': 'form-control'}),
             'emergency_contact_name': forms.TextInput(attrs={'class': 'form-control'}),
+            'notification_frequency': forms.Select(attrs={'class': 'form-control'}),
         }
 
 
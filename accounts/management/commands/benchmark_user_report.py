@@ -0,0 +1,74 @@
+from datetime import timedelta
+import time as timer
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import User
+from umoor_sehhat.pdf_generator import PDFGenerator
+
+
+class Command(BaseCommand):
+    help = 'Time the user report PDF for a number of generated users; nothing is written to the database'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=10000,
+            help='Users in the report (default: 10000)'
+        )
+        
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Timed runs; the fastest is reported (default: 3)'
+        )
+        
+        parser.add_argument(
+            '--output',
+            help='Also write the PDF to this path'
+        )
+    
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be positive')
+        
+        roles = [role for role, _ in User.ROLE_CHOICES]
+        joined = timezone.now()
+        users = [
+            User(
+                username=f'user{index}',
+                first_name=f'First{index}',
+                last_name=f'Last{index}',
+                email=f'user{index}@example.com',
+                phone_number=f'+91 98{index:08d}',
+                role=roles[index % len(roles)],
+                date_joined=joined - timedelta(days=index % 1000)
+            )
+            for index in range(options['rows'])
+        ]
+        
+        timings = []
+        for _ in range(options['repeat']):
+            started = timer.perf_counter()
+            buffer = PDFGenerator.create_user_report_pdf(users)
+            timings.append(timer.perf_counter() - started)
+        
+        # Measured separately, tracing slows the run down considerably
+        tracemalloc.start()
+        PDFGenerator.create_user_report_pdf(users)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        pdf = buffer.getvalue()
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                f.write(pdf)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["rows"]} rows: best {min(timings):.2f}s of {options["repeat"]}, '
+            f'{len(pdf) / 1024:.0f} KB, peak traced memory {peak / (1024 * 1024):.1f} MB'
+        ))
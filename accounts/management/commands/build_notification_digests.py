@@ -0,0 +1,38 @@
+import time as timer
+
+from django.core.management.base import BaseCommand, CommandError
+
+from umoor_sehhat.notifications import NotificationDigestBuilder
+
+
+class Command(BaseCommand):
+    help = 'Merge held notification emails whose digest window has closed into digest emails'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Recipient and kind groups digested per batch (default: 500)'
+        )
+        
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches (default: until nothing is due)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        
+        builder = NotificationDigestBuilder(batch_size=options['batch_size'])
+        started = timer.perf_counter()
+        digests, released = builder.run(max_batches=options['max_batches'])
+        elapsed = timer.perf_counter() - started
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Built {digests} digests and released {released} single notifications in {elapsed:.1f}s'
+            )
+        )
@@ -1,19 +1,199 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import connections, transaction
 from django.utils import timezone
 from doctordirectory.models import Doctor, Patient
 from moze.models import Moze
 from umoor_sehhat.notifications import NotificationService
+from bulk_upload.services import UPSERT_CHUNK_SIZE, UserUpserter
+from accounts.provisioning import (
+    PASSWORD_MODES, PASSWORD_MODE_ACTIVATION, PASSWORD_MODE_HASHED,
+    create_provisioned_user, generate_temporary_password, get_activation_path, hash_passwords
+)
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import csv
 import logging
+import os
+import time
 from datetime import datetime
-import secrets
-import string
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_SIZE = 500
+LOOKUP_CHUNK_SIZE = 500
+USER_ROLES = ['aamil', 'moze_coordinator', 'doctor', 'student', 'badri_mahal_admin']
+
+
+def validate_user_row(row):
+    """Return an error message for an invalid users row, or None"""
+    if not row.get('email') or not row.get('role'):
+        return 'Missing email or role'
+    return None
+
+
+def validate_doctor_row(row):
+    """Return an error message for an invalid doctors row, or None"""
+    if not row.get('email') or not row.get('license_number'):
+        return 'Missing email or license_number'
+    return None
+
+
+def validate_patient_row(row):
+    """Return an error message for an invalid patients row, or None"""
+    # For patients, email is optional but ITS ID should be available
+    if not row.get('its_id', '').strip() and not row.get('email', '').strip():
+        return 'Missing both email and ITS ID'
+    return None
+
+
+def create_user_row(row, password_hash=None):
+    """
+    Create a user from a users CSV row
+    Expected columns: first_name, last_name, email, role, its_id, phone_number, arabic_full_name
+    """
+    email = row['email'].strip().lower()
+    its_id = row.get('its_id', '').strip()
+    
+    return create_provisioned_user(
+        password_hash=password_hash,
+        username=email,
+        email=email,
+        first_name=row.get('first_name', '').strip(),
+        last_name=row.get('last_name', '').strip(),
+        role=row['role'],
+        its_id=its_id if its_id else None,
+        phone_number=row.get('phone_number', '').strip() or None,
+        arabic_full_name=row.get('arabic_full_name', '').strip() or None
+    )
+
+
+def create_doctor_row(row, password_hash=None):
+    """
+    Create a doctor user and profile from a doctors CSV row
+    Expected columns: first_name, last_name, email, its_id, phone_number,
+                     license_number, specialty, experience_years, moze_name
+    """
+    email = row['email'].strip().lower()
+    its_id = row.get('its_id', '').strip()
+    
+    user = create_provisioned_user(
+        password_hash=password_hash,
+        username=email,
+        email=email,
+        first_name=row.get('first_name', '').strip(),
+        last_name=row.get('last_name', '').strip(),
+        role='doctor',
+        its_id=its_id if its_id else None,
+        phone_number=row.get('phone_number', '').strip() or None,
+        specialty=row.get('specialty', '').strip() or None
+    )
+    
+    # Find assigned moze
+    assigned_moze = None
+    moze_name = row.get('moze_name', '').strip()
+    if moze_name:
+        assigned_moze = Moze.objects.filter(name__icontains=moze_name).first()
+    
+    # Create doctor profile
+    Doctor.objects.create(
+        user=user,
+        license_number=row['license_number'].strip(),
+        experience_years=int(row.get('experience_years', 0) or 0),
+        assigned_moze=assigned_moze,
+        is_verified=False  # Require manual verification
+    )
+    return user
+
+
+def create_patient_row(row, password_hash=None):
+    """
+    Create a patient user and profile from a patients CSV row
+    Expected columns: first_name, last_name, email, its_id, phone_number,
+                     date_of_birth, emergency_contact, medical_history
+    """
+    email = row.get('email', '').strip().lower() or None
+    its_id = row.get('its_id', '').strip()
+    username = email or f"patient_{its_id}"
+    
+    # Parse date of birth
+    date_of_birth = None
+    if row.get('date_of_birth'):
+        try:
+            date_of_birth = datetime.strptime(row['date_of_birth'], '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    
+    user = create_provisioned_user(
+        password_hash=password_hash,
+        username=username,
+        email=email,
+        first_name=row.get('first_name', '').strip(),
+        last_name=row.get('last_name', '').strip(),
+        role='student',  # Default role for patients
+        its_id=its_id if its_id else None,
+        phone_number=row.get('phone_number', '').strip() or None
+    )
+    
+    # Create patient profile
+    Patient.objects.create(
+        user=user,
+        date_of_birth=date_of_birth,
+        emergency_contact=row.get('emergency_contact', '').strip() or None,
+        medical_history=row.get('medical_history', '').strip() or None
+    )
+    return user
+
+
+ROW_HANDLERS = {
+    # data type: (validator, creator, match existing users by ITS ID as well as email)
+    'users': (validate_user_row, create_user_row, True),
+    'doctors': (validate_doctor_row, create_doctor_row, False),
+    'patients': (validate_patient_row, create_patient_row, True),
+}
+
+
+def write_batch(data_type, batch, password_mode, hash_workers=1):
+    """
+    Create one batch of validated rows inside a single transaction
+    
+    Each row runs in its own savepoint so a failing row does not roll back
+    the rest of the batch. Runs in the importing process or in a worker
+    process, so it only returns plain data.
+    
+    Returns a dict with success/error counts, error details and the
+    ``(user_id, temporary_password)`` pairs needed for welcome emails.
+    """
+    results = {'success': 0, 'errors': 0, 'error_details': [], 'created': []}
+    create_row = ROW_HANDLERS[data_type][1]
+    
+    passwords = [None] * len(batch)
+    password_hashes = [None] * len(batch)
+    if password_mode == PASSWORD_MODE_HASHED:
+        passwords = [generate_temporary_password() for _ in batch]
+        password_hashes = hash_passwords(passwords, workers=hash_workers)
+    
+    with transaction.atomic():
+        for (row_num, row), temp_password, password_hash in zip(batch, passwords, password_hashes):
+            try:
+                with transaction.atomic():
+                    user = create_row(row, password_hash)
+                results['success'] += 1
+                results['created'].append((user.pk, temp_password))
+            except Exception as e:
+                results['errors'] += 1
+                results['error_details'].append(f'Row {row_num}: {str(e)}')
+                logger.error(f'Error creating {data_type} record from row {row_num}: {str(e)}')
+    
+    return results
+
+
+def _init_worker():
+    """Set up Django inside import worker processes"""
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'umoor_sehhat.settings')
+    django.setup()
+
 
 class Command(BaseCommand):
     help = 'Bulk upload users, doctors, or patients from CSV files'
@@ -42,7 +222,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--send-welcome-emails',
             action='store_true',
-            help='Send welcome emails to new users'
+            help='Send welcome emails to new users (batched over one connection at the end)'
         )
         
         parser.add_argument(
@@ -50,6 +230,42 @@ class Command(BaseCommand):
             action='store_true',
             help='Skip existing users (by email or ITS ID)'
         )
+        
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Create new users and update changed ones, matched by ITS ID (users only)'
+        )
+        
+        parser.add_argument(
+            '--password-mode',
+            type=str,
+            choices=PASSWORD_MODES,
+            default=PASSWORD_MODE_ACTIVATION,
+            help='activation: unusable password plus one-time activation link (fast); '
+                 'hashed: random temporary passwords hashed across a process pool'
+        )
+        
+        parser.add_argument(
+            '--hash-workers',
+            type=int,
+            default=None,
+            help='Worker processes used to hash passwords in hashed mode (default: CPU count)'
+        )
+        
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes writing batches in parallel (default: 1, use with PostgreSQL)'
+        )
+        
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Rows written per transaction (default: {DEFAULT_BATCH_SIZE})'
+        )
     
     def handle(self, *args, **options):
         csv_file = options['csv_file']
@@ -57,6 +273,21 @@ class Command(BaseCommand):
         dry_run = options['dry_run']
         send_emails = options['send_welcome_emails']
         skip_existing = options['skip_existing']
+        upsert = options['upsert']
+        workers = options['workers']
+        batch_size = options['batch_size']
+        self.password_mode = options['password_mode']
+        self.hash_workers = options['hash_workers']
+        
+        if upsert and data_type != 'users':
+            raise CommandError('--upsert is only supported for --type users')
+        if workers < 1 or batch_size < 1:
+            raise CommandError('--workers and --batch-size must be at least 1')
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            self.stdout.write(
+                self.style.WARNING('SQLite does not support concurrent writers - using a single worker')
+            )
+            workers = 1
         
         if dry_run:
             self.stdout.write(
@@ -65,14 +296,34 @@ class Command(BaseCommand):
         
         self.stdout.write(f'Starting bulk upload: {data_type} from {csv_file}')
         start_time = timezone.now()
+        timings = {'parse': 0.0, 'validate': 0.0, 'write': 0.0, 'notify': 0.0}
         
         try:
-            if data_type == 'users':
-                results = self.import_users(csv_file, dry_run, send_emails, skip_existing)
-            elif data_type == 'doctors':
-                results = self.import_doctors(csv_file, dry_run, send_emails, skip_existing)
-            elif data_type == 'patients':
-                results = self.import_patients(csv_file, dry_run, send_emails, skip_existing)
+            started = time.monotonic()
+            rows = self.parse_csv(csv_file)
+            timings['parse'] = time.monotonic() - started
+            
+            if upsert:
+                started = time.monotonic()
+                results = self.upsert_users(rows, dry_run, batch_size)
+                timings['write'] = time.monotonic() - started
+            else:
+                started = time.monotonic()
+                valid_rows, results = self.validate_rows(data_type, rows, skip_existing)
+                timings['validate'] = time.monotonic() - started
+                
+                started = time.monotonic()
+                if not dry_run:
+                    self.write_rows(data_type, valid_rows, results, workers, batch_size)
+                else:
+                    results['success'] += len(valid_rows)
+                timings['write'] = time.monotonic() - started
+            
+            if send_emails and results['created']:
+                started = time.monotonic()
+                sent = self.send_welcome_emails(results['created'])
+                timings['notify'] = time.monotonic() - started
+                self.stdout.write(f'Sent {sent} welcome emails')
             
             duration = timezone.now() - start_time
             
@@ -86,11 +337,22 @@ class Command(BaseCommand):
                 )
             )
             
+            if upsert:
+                self.stdout.write(
+                    f'Created: {results["created_count"]}, '
+                    f'Updated: {results["updated"]}, '
+                    f'Unchanged: {results["unchanged"]}'
+                )
+            
+            self.stdout.write(
+                'Timing: ' + ', '.join(f'{phase} {seconds:.2f}s' for phase, seconds in timings.items())
+            )
+            
             if results['error_details']:
                 self.stdout.write(self.style.WARNING('Errors encountered:'))
                 for error in results['error_details']:
                     self.stdout.write(f'  - {error}')
-            
+        
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error during bulk upload: {str(e)}')
@@ -98,250 +360,179 @@ class Command(BaseCommand):
             logger.error(f'Error in bulk upload: {str(e)}')
             raise
     
-    def import_users(self, csv_file, dry_run, send_emails, skip_existing):
+    def parse_csv(self, csv_file):
+        """Read the CSV into (row_number, row) pairs"""
+        with open(csv_file, 'r', encoding='utf-8') as file:
+            return list(enumerate(csv.DictReader(file), 1))
+    
+    def find_existing(self, field, values):
+        """Values of ``field`` that already belong to a user, looked up in chunks"""
+        values = list(values)
+        existing = set()
+        for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+            existing.update(
+                User.objects.filter(
+                    **{f'{field}__in': values[start:start + LOOKUP_CHUNK_SIZE]}
+                ).values_list(field, flat=True)
+            )
+        return existing
+    
+    def validate_rows(self, data_type, rows, skip_existing):
         """
-        Import users from CSV
-                        Expected columns: first_name, last_name, email, role, its_id, phone_number, arabic_full_name
+        Validate every row and drop rows for users that already exist
+        
+        Existing users are resolved with a few chunked queries for the whole
+        file instead of one lookup per row. Repeated emails/ITS IDs within the
+        file are treated like existing users.
         """
-        results = {'success': 0, 'skipped': 0, 'errors': 0, 'error_details': []}
+        validate_row, _, match_its_id = ROW_HANDLERS[data_type]
+        results = {'success': 0, 'skipped': 0, 'errors': 0, 'error_details': [], 'created': []}
         
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
+        emails = {row.get('email', '').strip().lower() for _, row in rows} - {''}
+        its_ids = {row.get('its_id', '').strip() for _, row in rows} - {''} if match_its_id else set()
+        seen_emails = self.find_existing('email', emails)
+        seen_its_ids = self.find_existing('its_id', its_ids)
+        
+        valid_rows = []
+        for row_num, row in rows:
+            error = validate_row(row)
+            if error:
+                results['errors'] += 1
+                results['error_details'].append(f'Row {row_num}: {error}')
+                continue
             
-            with transaction.atomic():
-                for row_num, row in enumerate(reader, 1):
-                    try:
-                        # Validate required fields
-                        if not row.get('email') or not row.get('role'):
-                            results['errors'] += 1
-                            results['error_details'].append(f'Row {row_num}: Missing email or role')
-                            continue
-                        
-                        email = row['email'].strip().lower()
-                        its_id = row.get('its_id', '').strip()
-                        
-                        # Check for existing user
-                        existing_user = None
-                        if email:
-                            existing_user = User.objects.filter(email=email).first()
-                        if not existing_user and its_id:
-                            existing_user = User.objects.filter(its_id=its_id).first()
-                        
-                        if existing_user and skip_existing:
-                            results['skipped'] += 1
-                            self.stdout.write(f'Skipping existing user: {email}')
-                            continue
-                        elif existing_user:
-                            results['errors'] += 1
-                            results['error_details'].append(f'Row {row_num}: User already exists: {email}')
-                            continue
-                        
-                        # Validate role
-                        valid_roles = ['aamil', 'moze_coordinator', 'doctor', 'student', 'badri_mahal_admin']
-                        if row['role'] not in valid_roles:
-                            results['errors'] += 1
-                            results['error_details'].append(f'Row {row_num}: Invalid role: {row["role"]}')
-                            continue
-                        
-                        if not dry_run:
-                            # Generate temporary password
-                            temp_password = self.generate_password()
-                            
-                            # Create user
-                            user = User.objects.create_user(
-                                username=email,
-                                email=email,
-                                first_name=row.get('first_name', '').strip(),
-                                last_name=row.get('last_name', '').strip(),
-                                role=row['role'],
-                                its_id=its_id if its_id else None,
-                                phone_number=row.get('phone_number', '').strip() or None,
-                                arabic_full_name=row.get('arabic_full_name', '').strip() or None,
-                                password=temp_password
-                            )
-                            
-                            # Send welcome email
-                            if send_emails and user.email:
-                                NotificationService.send_welcome_email(user, temp_password)
-                            
-                            self.stdout.write(f'Created user: {user.email} ({user.get_role_display()})')
-                        
-                        results['success'] += 1
-                        
-                    except Exception as e:
-                        results['errors'] += 1
-                        results['error_details'].append(f'Row {row_num}: {str(e)}')
-                        logger.error(f'Error creating user from row {row_num}: {str(e)}')
+            email = row.get('email', '').strip().lower()
+            its_id = row.get('its_id', '').strip() if match_its_id else ''
+            
+            if (email and email in seen_emails) or (its_id and its_id in seen_its_ids):
+                if skip_existing:
+                    results['skipped'] += 1
+                else:
+                    results['errors'] += 1
+                    results['error_details'].append(f'Row {row_num}: User already exists: {email or its_id}')
+                continue
+            
+            if data_type == 'users' and row['role'] not in USER_ROLES:
+                results['errors'] += 1
+                results['error_details'].append(f'Row {row_num}: Invalid role: {row["role"]}')
+                continue
+            
+            if email:
+                seen_emails.add(email)
+            if its_id:
+                seen_its_ids.add(its_id)
+            valid_rows.append((row_num, row))
         
-        return results
+        return valid_rows, results
     
-    def import_doctors(self, csv_file, dry_run, send_emails, skip_existing):
-        """
-        Import doctors from CSV
-        Expected columns: first_name, last_name, email, its_id, phone_number, 
-                         license_number, specialty, experience_years, moze_name
-        """
-        results = {'success': 0, 'skipped': 0, 'errors': 0, 'error_details': []}
+    def write_rows(self, data_type, valid_rows, results, workers, batch_size):
+        """Write validated rows in per-transaction batches, optionally across worker processes"""
+        batches = [valid_rows[i:i + batch_size] for i in range(0, len(valid_rows), batch_size)]
+        total = len(valid_rows)
+        done = 0
+        started = time.monotonic()
         
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            with transaction.atomic():
-                for row_num, row in enumerate(reader, 1):
-                    try:
-                        # Validate required fields
-                        if not row.get('email') or not row.get('license_number'):
-                            results['errors'] += 1
-                            results['error_details'].append(f'Row {row_num}: Missing email or license_number')
-                            continue
-                        
-                        email = row['email'].strip().lower()
-                        its_id = row.get('its_id', '').strip()
-                        
-                        # Check for existing user
-                        existing_user = User.objects.filter(email=email).first()
-                        if existing_user and skip_existing:
-                            results['skipped'] += 1
-                            continue
-                        elif existing_user:
-                            results['errors'] += 1
-                            results['error_details'].append(f'Row {row_num}: User already exists: {email}')
-                            continue
-                        
-                        if not dry_run:
-                            # Generate temporary password
-                            temp_password = self.generate_password()
-                            
-                            # Create user
-                            user = User.objects.create_user(
-                                username=email,
-                                email=email,
-                                first_name=row.get('first_name', '').strip(),
-                                last_name=row.get('last_name', '').strip(),
-                                role='doctor',
-                                its_id=its_id if its_id else None,
-                                phone_number=row.get('phone_number', '').strip() or None,
-                                specialty=row.get('specialty', '').strip() or None,
-                                password=temp_password
-                            )
-                            
-                            # Find assigned moze
-                            assigned_moze = None
-                            moze_name = row.get('moze_name', '').strip()
-                            if moze_name:
-                                assigned_moze = Moze.objects.filter(name__icontains=moze_name).first()
-                            
-                            # Create doctor profile
-                            doctor = Doctor.objects.create(
-                                user=user,
-                                license_number=row['license_number'].strip(),
-                                experience_years=int(row.get('experience_years', 0) or 0),
-                                assigned_moze=assigned_moze,
-                                is_verified=False  # Require manual verification
-                            )
-                            
-                            # Send welcome email
-                            if send_emails and user.email:
-                                NotificationService.send_welcome_email(user, temp_password)
-                            
-                            self.stdout.write(f'Created doctor: {user.email} (License: {doctor.license_number})')
-                        
-                        results['success'] += 1
-                        
-                    except Exception as e:
-                        results['errors'] += 1
-                        results['error_details'].append(f'Row {row_num}: {str(e)}')
-                        logger.error(f'Error creating doctor from row {row_num}: {str(e)}')
+        def merge(batch_results, batch_len):
+            nonlocal done
+            results['success'] += batch_results['success']
+            results['errors'] += batch_results['errors']
+            results['error_details'].extend(batch_results['error_details'])
+            results['created'].extend(batch_results['created'])
+            done += batch_len
+            self.show_progress(done, total, started)
         
-        return results
+        if workers > 1 and len(batches) > 1:
+            # Worker processes must open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = {
+                    pool.submit(write_batch, data_type, batch, self.password_mode, 1): len(batch)
+                    for batch in batches
+                }
+                for future in as_completed(futures):
+                    merge(future.result(), futures[future])
+        else:
+            for batch in batches:
+                merge(write_batch(data_type, batch, self.password_mode, self.hash_workers), len(batch))
+        
+        if total:
+            self.stdout.write('')
+        
+        # Report errors in file order regardless of batch completion order
+        results['error_details'].sort(key=lambda detail: int(detail.split(':')[0].split()[1]))
+    
+    def show_progress(self, done, total, started, width=30):
+        """Render a single-line progress bar with throughput"""
+        elapsed = max(time.monotonic() - started, 1e-6)
+        filled = int(width * done / total) if total else width
+        bar = '#' * filled + '-' * (width - filled)
+        self.stdout.write(f'\r[{bar}] {done}/{total} rows  {done / elapsed:.1f} rows/s', ending='')
+        self.stdout.flush()
     
-    def import_patients(self, csv_file, dry_run, send_emails, skip_existing):
+    def upsert_users(self, rows, dry_run, batch_size):
         """
-        Import patients from CSV
-        Expected columns: first_name, last_name, email, its_id, phone_number, 
-                         date_of_birth, emergency_contact, medical_history
+        Create or update users keyed by ITS ID
+        
+        Existing users are loaded once per chunk and only changed columns are
+        written back, so re-importing an unchanged file performs no writes.
         """
-        results = {'success': 0, 'skipped': 0, 'errors': 0, 'error_details': []}
+        results = {
+            'success': 0, 'skipped': 0, 'errors': 0, 'error_details': [], 'created': [],
+            'created_count': 0, 'updated': 0, 'unchanged': 0,
+        }
         
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
+        def create_user(row):
+            error = validate_user_row(row)
+            if error:
+                raise ValueError(error)
+            if User.objects.filter(email=row['email'].strip().lower()).exists():
+                raise ValueError(f'User already exists: {row["email"]}')
+            temp_password = None
+            password_hash = None
+            if self.password_mode == PASSWORD_MODE_HASHED:
+                temp_password = generate_temporary_password()
+                password_hash = hash_passwords([temp_password], workers=1)[0]
+            user = create_user_row(row, password_hash)
+            results['created'].append((user.pk, temp_password))
+            return user
+        
+        upserter = UserUpserter(create_user=create_user, dry_run=dry_run)
+        chunk_size = min(batch_size, UPSERT_CHUNK_SIZE)
+        
+        for start in range(0, len(rows), chunk_size):
+            chunk = []
+            for row_num, row in rows[start:start + chunk_size]:
+                row['_row_number'] = row_num
+                chunk.append(row)
             
             with transaction.atomic():
-                for row_num, row in enumerate(reader, 1):
-                    try:
-                        # For patients, email is optional but ITS ID should be available
-                        email = row.get('email', '').strip().lower() or None
-                        its_id = row.get('its_id', '').strip()
-                        
-                        if not its_id and not email:
-                            results['errors'] += 1
-                            results['error_details'].append(f'Row {row_num}: Missing both email and ITS ID')
-                            continue
-                        
-                        # Check for existing user
-                        existing_user = None
-                        if email:
-                            existing_user = User.objects.filter(email=email).first()
-                        if not existing_user and its_id:
-                            existing_user = User.objects.filter(its_id=its_id).first()
-                        
-                        if existing_user and skip_existing:
-                            results['skipped'] += 1
-                            continue
-                        elif existing_user:
-                            results['errors'] += 1
-                            results['error_details'].append(f'Row {row_num}: User already exists')
-                            continue
-                        
-                        if not dry_run:
-                            # Generate username and temporary password
-                            username = email or f"patient_{its_id}"
-                            temp_password = self.generate_password()
-                            
-                            # Parse date of birth
-                            date_of_birth = None
-                            if row.get('date_of_birth'):
-                                try:
-                                    date_of_birth = datetime.strptime(row['date_of_birth'], '%Y-%m-%d').date()
-                                except ValueError:
-                                    pass
-                            
-                            # Create user
-                            user = User.objects.create_user(
-                                username=username,
-                                email=email,
-                                first_name=row.get('first_name', '').strip(),
-                                last_name=row.get('last_name', '').strip(),
-                                role='student',  # Default role for patients
-                                its_id=its_id if its_id else None,
-                                phone_number=row.get('phone_number', '').strip() or None,
-                                password=temp_password
-                            )
-                            
-                            # Create patient profile
-                            patient = Patient.objects.create(
-                                user=user,
-                                date_of_birth=date_of_birth,
-                                emergency_contact=row.get('emergency_contact', '').strip() or None,
-                                medical_history=row.get('medical_history', '').strip() or None
-                            )
-                            
-                            # Send welcome email
-                            if send_emails and user.email:
-                                NotificationService.send_welcome_email(user, temp_password)
-                            
-                            self.stdout.write(f'Created patient: {user.get_full_name()} (ITS: {its_id})')
-                        
-                        results['success'] += 1
-                        
-                    except Exception as e:
-                        results['errors'] += 1
-                        results['error_details'].append(f'Row {row_num}: {str(e)}')
-                        logger.error(f'Error creating patient from row {row_num}: {str(e)}')
+                chunk_results = upserter.upsert_chunk(chunk)
+            
+            for row, action, detail in chunk_results:
+                if action == 'failed':
+                    results['errors'] += 1
+                    results['error_details'].append(f'Row {row["_row_number"]}: {detail}')
+                    continue
+                if action == 'created':
+                    results['created_count'] += 1
+                else:
+                    results[action] += 1
+                if action == 'unchanged':
+                    results['skipped'] += 1
+                else:
+                    results['success'] += 1
         
         return results
     
-    def generate_password(self, length=12):
-        """Generate a secure temporary password"""
-        alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
-        return ''.join(secrets.choice(alphabet) for _ in range(length))
\ No newline at end of file
+    def send_welcome_emails(self, created):
+        """Send all welcome emails in one batch over a single mail connection"""
+        users = User.objects.in_bulk([user_id for user_id, _ in created])
+        recipients = []
+        for user_id, temp_password in created:
+            user = users.get(user_id)
+            if not user or not user.email:
+                continue
+            # Passwordless accounts get a one-time activation link instead
+            activation_url = None if temp_password else get_activation_path(user)
+            recipients.append((user, temp_password, activation_url))
+        return NotificationService.send_welcome_emails(recipients)
@@ -0,0 +1,46 @@
+import time as timer
+
+from django.core.management.base import BaseCommand, CommandError
+
+from umoor_sehhat.notifications import EmailOutboxDrainer
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbox emails in batches; several workers can run this concurrently'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Emails claimed and sent over one connection per batch (default: 100)'
+        )
+        
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches (default: until nothing is due)'
+        )
+        
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=5,
+            help='Failed attempts before an email is moved to the dead letters (default: 5)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['max_attempts'] < 1:
+            raise CommandError('--batch-size and --max-attempts must be positive')
+        
+        drainer = EmailOutboxDrainer(
+            batch_size=options['batch_size'],
+            max_attempts=options['max_attempts']
+        )
+        started = timer.perf_counter()
+        sent, failed = drainer.run(max_batches=options['max_batches'])
+        elapsed = timer.perf_counter() - started
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Sent {sent} emails ({failed} failed) in {elapsed:.1f}s')
+        )
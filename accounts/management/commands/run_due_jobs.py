@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import ScheduledJobRun
+# Importing the notification services registers their jobs
+from umoor_sehhat import notifications  # noqa: F401
+from umoor_sehhat.scheduler import JobRunner, jobs
+
+
+class Command(BaseCommand):
+    help = 'Run scheduled jobs that are due; safe to run from cron every few minutes on every node'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--job',
+            action='append',
+            dest='jobs',
+            help='Only consider this job (may be repeated)'
+        )
+        
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List registered jobs with their latest run instead of running anything'
+        )
+    
+    def handle(self, *args, **options):
+        try:
+            selected = [jobs.get(name) for name in options['jobs']] if options['jobs'] else list(jobs)
+        except ValueError as e:
+            raise CommandError(str(e))
+        
+        if options['list']:
+            self.list_jobs(selected)
+            return
+        
+        outcomes = JobRunner().run_due(names=[job.name for job in selected])
+        for name, scheduled_for, outcome in outcomes:
+            message = f'{name} ({timezone.localtime(scheduled_for):%Y-%m-%d %H:%M}): {outcome}'
+            if outcome == 'failed':
+                self.stdout.write(self.style.ERROR(message))
+            elif outcome == 'succeeded':
+                self.stdout.write(self.style.SUCCESS(message))
+            else:
+                self.stdout.write(message)
+        
+        if not outcomes:
+            self.stdout.write('No jobs due')
+    
+    def list_jobs(self, selected):
+        for job in selected:
+            run = ScheduledJobRun.objects.filter(job_name=job.name).order_by('-scheduled_for').first()
+            if run is None:
+                last = 'never run'
+            else:
+                duration = f', {run.duration_seconds:.1f}s' if run.duration_seconds is not None else ''
+                last = f'{run.status} for {timezone.localtime(run.scheduled_for):%Y-%m-%d %H:%M}{duration}'
+            self.stdout.write(f'{job.name:<30} {str(job.schedule):<15} {last}')
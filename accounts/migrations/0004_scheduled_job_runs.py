@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-18 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_notification_digests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_name', models.CharField(max_length=100)),
+                ('scheduled_for', models.DateTimeField()),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=1)),
+                ('owner', models.CharField(help_text='Host, process and token of the node holding the lease', max_length=100)),
+                ('lease_expires_at', models.DateTimeField()),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('result', models.IntegerField(blank=True, help_text='Value returned by the job, e.g. emails sent', null=True)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['-scheduled_for', 'job_name'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scheduledjobrun',
+            constraint=models.UniqueConstraint(fields=('job_name', 'scheduled_for'), name='unique_job_occurrence'),
+        ),
+    ]
@@ -5,6 +5,8 @@ from django.db.models.signals import post_save, post_delete, m2m_changed, pre_sa
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.dispatch import receiver
 from django.utils import timezone
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
 
 
 class User(AbstractUser):
@@ -180,6 +182,16 @@ class UserProfile(models.Model):
     emergency_contact = models.CharField(max_length=15, blank=True, null=True)
     emergency_contact_name = models.CharField(max_length=100, blank=True, null=True)
     
+    NOTIFICATION_FREQUENCY_CHOICES = [
+        ('immediate', 'Immediately'),
+        ('hourly', 'Hourly digest'),
+        ('daily', 'Daily digest'),
+    ]
+    # How comment, araz and survey reminder emails are delivered
+    notification_frequency = models.CharField(
+        max_length=10, choices=NOTIFICATION_FREQUENCY_CHOICES, default='immediate'
+    )
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -219,6 +231,106 @@ class AuditLog(models.Model):
         return f"{self.user} {self.action} {self.object_type} {self.object_id} at {self.timestamp}"
 
 
+class EmailOutbox(models.Model):
+    """
+    Rendered email waiting to be sent by the outbox drainer.
+    
+    Rows are written in the same transaction as the change that caused
+    them, so request handlers never wait on SMTP and a rolled-back change
+    never sends mail. ``drain_email_outbox`` delivers them in batches.
+    Emails of a digest kind are ``held`` until the recipient's digest
+    window closes and are then merged by ``build_notification_digests``.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead Letter'),
+        ('held', 'Held for Digest'),
+        ('digested', 'Merged into Digest'),
+    ]
+    recipient = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbox_emails')
+    to_emails = models.JSONField(default=list)
+    from_email = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255)
+    body_text = models.TextField()
+    body_html = models.TextField(blank=True)
+    # Template the email was rendered from, e.g. moze_comment_notification
+    kind = models.CharField(max_length=64, blank=True)
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        verbose_name = 'Outbox Email'
+        verbose_name_plural = 'Email Outbox'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['claim_token']),
+            models.Index(fields=['status', 'recipient', 'kind']),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to_emails)} ({self.status})"
+    
+    def to_message(self, connection=None):
+        """Build the EmailMultiAlternatives to send for this row"""
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.body_text,
+            from_email=self.from_email or settings.DEFAULT_FROM_EMAIL,
+            to=self.to_emails,
+            connection=connection
+        )
+        if self.body_html:
+            message.attach_alternative(self.body_html, "text/html")
+        return message
+
+
+class ScheduledJobRun(models.Model):
+    """
+    One run of a scheduled job for one scheduled time.
+    
+    The row is unique per job and ``scheduled_for``, so it is both the
+    lease that stops two nodes running the same occurrence and the record
+    that keeps a finished occurrence from running again.
+    """
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    job_name = models.CharField(max_length=100)
+    scheduled_for = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    attempts = models.PositiveIntegerField(default=1)
+    owner = models.CharField(max_length=100, help_text='Host, process and token of the node holding the lease')
+    lease_expires_at = models.DateTimeField()
+    
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    result = models.IntegerField(null=True, blank=True, help_text='Value returned by the job, e.g. emails sent')
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-scheduled_for', 'job_name']
+        constraints = [
+            models.UniqueConstraint(fields=['job_name', 'scheduled_for'], name='unique_job_occurrence'),
+        ]
+    
+    def __str__(self):
+        return f"{self.job_name} at {self.scheduled_for} ({self.status})"
+
+
 @receiver(user_logged_in)
 def log_user_login(sender, user, request, **kwargs):
     """Log user login with atomic transaction and error handling"""
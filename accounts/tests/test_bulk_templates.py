@@ -0,0 +1,114 @@
+"""
+Tests for rendering one email template for many recipients
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from accounts.models import EmailOutbox, User
+from surveys.models import Survey
+from umoor_sehhat import bulk_templates
+from umoor_sehhat.bulk_templates import BulkTemplateRenderer
+from umoor_sehhat.notifications import NotificationService
+
+
+class BulkTemplateRendererTest(TestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create_user(username='creator', password='x')
+        self.survey = Survey.objects.create(
+            title='Health & Wellness', description='Annual survey', created_by=self.creator,
+            end_date=timezone.now() + timedelta(days=3, hours=1)
+        )
+        self.users = [
+            User.objects.create_user(username='ali1', email='ali1@test.com', first_name='Ali', last_name='Shah'),
+            User.objects.create_user(username='ali2', email='ali2@test.com', first_name='Ali', last_name='Shah'),
+            User.objects.create_user(username='sara', email='sara@test.com', first_name='Sara', last_name='Khan'),
+            User.objects.create_user(username='nameless', email='nameless@test.com'),
+        ]
+        self.context = {'survey': self.survey, 'survey_url': f'/surveys/{self.survey.id}/', 'site_name': 'Umoor Sehhat'}
+    
+    def test_matches_render_to_string(self):
+        renderer = BulkTemplateRenderer('survey_invitation', self.context)
+        
+        for user in self.users:
+            expected = render_to_string('emails/survey_invitation.html', {**self.context, 'user': user})
+            self.assertEqual(renderer.render({'user': user}), (expected, strip_tags(expected)))
+    
+    def test_shared_parts_render_once(self):
+        renders = []
+        
+        class Title:
+            def __str__(self):
+                renders.append(1)
+                return 'Counted survey'
+        
+        renderer = BulkTemplateRenderer('survey_invitation', {**self.context, 'survey': {'title': Title()}})
+        bodies = [renderer.render({'user': user}) for user in self.users]
+        
+        self.assertEqual(len(renders), 1)
+        self.assertTrue(all('Counted survey' in html and 'Counted survey' in text for html, text in bodies))
+    
+    def test_text_of_unsafe_personal_output_is_stripped_in_full(self):
+        user = User.objects.create_user(username='amp', email='amp@test.com', first_name='A & B', last_name="O'Neil")
+        renderer = BulkTemplateRenderer('survey_invitation', self.context)
+        renderer.render({'user': self.users[0]})
+        
+        html, text = renderer.render({'user': user})
+        
+        self.assertIn('A &amp; B O&#x27;Neil', html)
+        self.assertEqual(text, strip_tags(html))
+    
+    def test_identical_bodies_render_once(self):
+        renderer = BulkTemplateRenderer('survey_invitation', self.context)
+        
+        bodies = [renderer.render({'user': user}) for user in self.users]
+        
+        # Both Ali Shahs get the same body
+        self.assertEqual(renderer.rendered, 3)
+        self.assertIs(bodies[0], bodies[1])
+        self.assertIn('Sara Khan', bodies[2][0])
+        self.assertIn('nameless', bodies[3][0])
+    
+    def test_templates_with_includes_are_not_deduplicated(self):
+        template = engines['django'].from_string('{% include "emails/bulk_notification.html" %}')
+        with patch.object(bulk_templates, 'get_template', return_value=template):
+            bulk_templates.get_email_template.cache_clear()
+            bulk_templates.template_layout.cache_clear()
+            self.addCleanup(bulk_templates.get_email_template.cache_clear)
+            self.addCleanup(bulk_templates.template_layout.cache_clear)
+            
+            renderer = BulkTemplateRenderer('included', {'message': 'Hello', 'site_name': 'Umoor Sehhat'})
+            bodies = [renderer.render({'user': user}) for user in self.users[:2]]
+        
+        self.assertIsNone(renderer.variables)
+        self.assertEqual(renderer.rendered, 2)
+        self.assertEqual(bodies[0], bodies[1])
+    
+    def test_compiled_template_is_cached_per_process(self):
+        BulkTemplateRenderer('bulk_notification', {})
+        
+        with patch.object(bulk_templates, 'get_template') as get_template:
+            BulkTemplateRenderer('bulk_notification', {})
+        
+        get_template.assert_not_called()
+    
+    def test_survey_invitation_queues_personalised_emails(self):
+        sent = NotificationService.send_survey_invitation(self.survey, self.users)
+        
+        self.assertEqual(sent, 4)
+        email = EmailOutbox.objects.get(recipient=self.users[2])
+        self.assertEqual(email.subject, 'Survey Invitation: Health & Wellness')
+        self.assertIn('Assalaamo Alaikum Sara Khan', email.body_html)
+        self.assertIn('Health &amp; Wellness', email.body_html)
+        self.assertIn(f'/surveys/{self.survey.id}/', email.body_html)
+    
+    def test_survey_reminder_counts_days_remaining(self):
+        NotificationService.send_survey_reminder(self.survey, self.users[:1])
+        
+        self.assertIn('It closes in 3 days.', EmailOutbox.objects.get().body_text)
@@ -0,0 +1,97 @@
+"""
+Tests for the bulk_upload management command
+"""
+import csv
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from accounts.models import User
+
+
+class BulkUploadCommandTests(TestCase):
+    """Test importing users from CSV with the bulk_upload command"""
+    
+    fieldnames = ['first_name', 'last_name', 'email', 'role', 'its_id', 'phone_number']
+    
+    def write_csv(self, rows):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=self.fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        self.addCleanup(os.unlink, path)
+        return path
+    
+    def user_rows(self, count, **overrides):
+        rows = []
+        for i in range(count):
+            row = {
+                'first_name': f'First{i}',
+                'last_name': f'Last{i}',
+                'email': f'user{i}@example.com',
+                'role': 'student',
+                'its_id': f'{60000000 + i}',
+                'phone_number': '',
+            }
+            row.update(overrides)
+            rows.append(row)
+        return rows
+    
+    def run_command(self, path, *args):
+        out = StringIO()
+        call_command('bulk_upload', path, '--type', 'users', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_import_users_with_activation_passwords(self):
+        self.run_command(self.write_csv(self.user_rows(3)))
+        
+        users = User.objects.filter(its_id__startswith='6000')
+        self.assertEqual(users.count(), 3)
+        self.assertFalse(any(user.has_usable_password() for user in users))
+    
+    def test_upsert_updates_only_changed_users(self):
+        path = self.write_csv(self.user_rows(3))
+        self.run_command(path)
+        
+        rows = self.user_rows(4)
+        rows[1]['last_name'] = 'Changed'
+        output = self.run_command(self.write_csv(rows), '--upsert')
+        
+        self.assertIn('Created: 1, Updated: 1, Unchanged: 2', output)
+        self.assertEqual(User.objects.get(its_id='60000001').last_name, 'Changed')
+        self.assertTrue(User.objects.filter(its_id='60000003').exists())
+    
+    def test_upsert_rejected_for_non_user_types(self):
+        with self.assertRaises(CommandError):
+            call_command('bulk_upload', self.write_csv([]), '--type', 'doctors', '--upsert', stdout=StringIO())
+    
+    def test_batches_report_progress_and_timing(self):
+        output = self.run_command(self.write_csv(self.user_rows(5)), '--batch-size', '2')
+        
+        self.assertIn('5/5 rows', output)
+        self.assertIn('Timing: parse', output)
+        self.assertEqual(User.objects.filter(its_id__startswith='6000').count(), 5)
+    
+    def test_duplicate_rows_fail_without_rolling_back_batch(self):
+        rows = self.user_rows(3)
+        rows.append(dict(rows[0], its_id='60000099'))
+        output = self.run_command(self.write_csv(rows), '--batch-size', '10')
+        
+        self.assertIn('Row 4: User already exists: user0@example.com', output)
+        self.assertEqual(User.objects.filter(its_id__startswith='6000').count(), 3)
+    
+    def test_welcome_emails_sent_in_one_batch(self):
+        with patch('umoor_sehhat.notifications.get_connection', wraps=get_connection) as connection_factory:
+            self.run_command(self.write_csv(self.user_rows(3)), '--send-welcome-emails', '--batch-size', '1')
+        
+        self.assertEqual(connection_factory.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('/accounts/activate/', mail.outbox[0].body)
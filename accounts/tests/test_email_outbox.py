@@ -0,0 +1,165 @@
+"""
+Tests for the email outbox and its drainer
+"""
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import EmailOutbox, User
+from umoor_sehhat.notifications import EmailOutboxDrainer, NotificationService
+
+
+class FlakyBackend:
+    """locmem backend that rejects messages to one address"""
+    
+    failing_address = 'broken@test.com'
+    opened = 0
+    
+    def __init__(self):
+        self.backend = get_connection('django.core.mail.backends.locmem.EmailBackend')
+    
+    def open(self):
+        FlakyBackend.opened += 1
+        return self.backend.open()
+    
+    def close(self):
+        return self.backend.close()
+    
+    def send_messages(self, messages):
+        for message in messages:
+            if self.failing_address in message.to:
+                raise ConnectionError('Recipient refused')
+        return self.backend.send_messages(messages)
+
+
+class EmailOutboxTest(TestCase):
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@test.com', password='x')
+            for i in range(5)
+        ]
+    
+    def queue(self, email='user@test.com', **kwargs):
+        return NotificationService.send_email_notification(
+            email, 'Notice', 'bulk_notification', {'message': 'Hello', 'site_name': 'Umoor Sehhat'}, **kwargs
+        )
+    
+    def test_notifications_are_queued_not_sent(self):
+        self.assertTrue(self.queue())
+        
+        self.assertEqual(len(mail.outbox), 0)
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.to_emails, ['user@test.com'])
+        self.assertEqual(email.kind, 'bulk_notification')
+        self.assertIn('Hello', email.body_html)
+    
+    def test_rolled_back_transaction_queues_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.queue()
+                raise RuntimeError('business change failed')
+        
+        self.assertFalse(EmailOutbox.objects.exists())
+    
+    def test_bulk_notification_is_one_insert(self):
+        with self.assertNumQueries(1):
+            queued = NotificationService.send_bulk_notification(self.users, 'Notice', 'Hello')
+        
+        self.assertEqual(queued, 5)
+        self.assertEqual(
+            set(EmailOutbox.objects.values_list('recipient_id', flat=True)),
+            {user.pk for user in self.users}
+        )
+    
+    @override_settings(EMAIL_OUTBOX_ENABLED=False)
+    def test_outbox_can_be_disabled(self):
+        NotificationService.send_bulk_notification(self.users, 'Notice', 'Hello')
+        
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(EmailOutbox.objects.exists())
+    
+    def test_drainer_sends_each_batch_over_one_connection(self):
+        NotificationService.send_bulk_notification(self.users, 'Notice', 'Hello')
+        
+        FlakyBackend.opened = 0
+        with patch('umoor_sehhat.notifications.get_connection', side_effect=FlakyBackend):
+            sent, failed = EmailOutboxDrainer(batch_size=2).run()
+        
+        self.assertEqual((sent, failed), (5, 0))
+        self.assertEqual(FlakyBackend.opened, 3)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(EmailOutbox.objects.filter(status='sent', claim_token='').count(), 5)
+    
+    def test_failed_email_is_retried_with_backoff(self):
+        self.queue()
+        self.queue(FlakyBackend.failing_address)
+        
+        drainer = EmailOutboxDrainer(backoff_seconds=60, connection=FlakyBackend())
+        before = timezone.now()
+        self.assertEqual(drainer.run(), (1, 1))
+        
+        failed = EmailOutbox.objects.get(to_emails=[FlakyBackend.failing_address])
+        self.assertEqual(failed.status, 'pending')
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn('Recipient refused', failed.last_error)
+        self.assertGreaterEqual(failed.next_attempt_at, before + timedelta(seconds=60))
+        
+        # Not due yet, so a second run leaves it alone
+        self.assertEqual(drainer.run(), (0, 0))
+        
+        EmailOutbox.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+        drainer.run()
+        failed.refresh_from_db()
+        self.assertEqual(failed.attempts, 2)
+        self.assertGreaterEqual(failed.next_attempt_at, timezone.now() + timedelta(seconds=110))
+    
+    def test_email_is_dead_lettered_after_max_attempts(self):
+        self.queue(FlakyBackend.failing_address)
+        drainer = EmailOutboxDrainer(max_attempts=2, connection=FlakyBackend())
+        
+        drainer.run()
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        drainer.run()
+        
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, 'dead')
+        self.assertEqual(email.attempts, 2)
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(drainer.run(), (0, 0))
+    
+    def test_stale_claims_are_reclaimed(self):
+        self.queue()
+        EmailOutbox.objects.update(
+            status='sending', claim_token='abandoned', claimed_at=timezone.now() - timedelta(minutes=10)
+        )
+        
+        self.assertEqual(EmailOutboxDrainer(lease_seconds=300).run(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_claimed_emails_are_not_claimed_twice(self):
+        NotificationService.send_bulk_notification(self.users, 'Notice', 'Hello')
+        
+        first = EmailOutboxDrainer(batch_size=3).claim_batch()
+        second = EmailOutboxDrainer(batch_size=3).claim_batch()
+        
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({email.pk for email in first} & {email.pk for email in second})
+    
+    def test_drain_command(self):
+        NotificationService.send_bulk_notification(self.users, 'Notice', 'Hello')
+        out = StringIO()
+        
+        call_command('drain_email_outbox', '--batch-size', '2', '--max-batches', '1', stdout=out)
+        
+        self.assertIn('Sent 2 emails (0 failed)', out.getvalue())
+        self.assertEqual(EmailOutbox.objects.filter(status='pending').count(), 3)
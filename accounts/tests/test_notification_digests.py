@@ -0,0 +1,141 @@
+"""
+Tests for coalescing notification emails into digests
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import EmailOutbox, User, UserProfile
+from moze.models import Moze, MozeComment
+from umoor_sehhat.notifications import NotificationDigestBuilder, NotificationService, digest_window_end
+
+
+class NotificationDigestTest(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', email='author@test.com', first_name='Zahra')
+        self.aamil = User.objects.create_user(username='aamil', email='aamil@test.com', first_name='Hussain')
+        self.coordinator = User.objects.create_user(username='coordinator', email='coordinator@test.com')
+        UserProfile.objects.filter(user=self.aamil).update(notification_frequency='hourly')
+        self.moze = Moze.objects.create(
+            name='Saifee Moze', location='Mumbai', aamil=self.aamil, moze_coordinator=self.coordinator
+        )
+    
+    def comment(self, content='Please review the schedule'):
+        comment = MozeComment.objects.create(moze=self.moze, author=self.author, content=content)
+        NotificationService.send_moze_comment_notification(comment)
+        return comment
+    
+    def close_windows(self):
+        EmailOutbox.objects.filter(status='held').update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+    
+    def test_digest_users_are_held_and_others_sent_immediately(self):
+        self.comment()
+        
+        held = EmailOutbox.objects.get(recipient=self.aamil)
+        self.assertEqual(held.status, 'held')
+        self.assertEqual(held.next_attempt_at, digest_window_end('hourly'))
+        self.assertEqual(EmailOutbox.objects.get(recipient=self.coordinator).status, 'pending')
+    
+    def test_kinds_without_digests_are_never_held(self):
+        NotificationService.send_bulk_notification([self.aamil], 'Notice', 'Hello')
+        
+        self.assertEqual(EmailOutbox.objects.get().status, 'pending')
+    
+    def test_open_window_is_not_digested(self):
+        self.comment()
+        self.comment()
+        
+        self.assertEqual(NotificationDigestBuilder().run(), (0, 0))
+        self.assertEqual(EmailOutbox.objects.filter(status='held').count(), 2)
+    
+    def test_same_kind_notifications_merge_into_one_digest(self):
+        self.comment('First comment')
+        self.comment('Second comment')
+        self.comment('Third comment')
+        self.close_windows()
+        
+        self.assertEqual(NotificationDigestBuilder().run(), (1, 0))
+        
+        digest = EmailOutbox.objects.get(kind='notification_digest')
+        self.assertEqual(digest.status, 'pending')
+        self.assertEqual(digest.recipient, self.aamil)
+        self.assertEqual(digest.to_emails, ['aamil@test.com'])
+        self.assertEqual(digest.subject, 'Moze comments: 3 new notifications')
+        for content in ['First comment', 'Second comment', 'Third comment']:
+            self.assertIn(content, digest.body_html)
+        self.assertEqual(
+            EmailOutbox.objects.filter(recipient=self.aamil, kind='moze_comment_notification', status='digested').count(),
+            3
+        )
+    
+    def test_single_notification_is_released_unchanged(self):
+        self.comment()
+        self.close_windows()
+        
+        self.assertEqual(NotificationDigestBuilder().run(), (0, 1))
+        
+        email = EmailOutbox.objects.get(recipient=self.aamil)
+        self.assertEqual(email.status, 'pending')
+        self.assertLessEqual(email.next_attempt_at, timezone.now())
+    
+    def test_groups_are_built_in_batches(self):
+        for index in range(4):
+            user = User.objects.create_user(username=f'member{index}', email=f'member{index}@test.com')
+            UserProfile.objects.filter(user=user).update(notification_frequency='daily')
+            self.moze.team_members.add(user)
+        self.comment()
+        self.comment()
+        self.close_windows()
+        
+        # Orphan release, then per batch: groups, users, held rows, digest insert
+        # and digested update, plus the savepoint pair; then one empty group query
+        with self.assertNumQueries(1 + 2 * 7 + 1):
+            digests, released = NotificationDigestBuilder(batch_size=3).run()
+        
+        self.assertEqual((digests, released), (5, 0))
+        self.assertFalse(EmailOutbox.objects.filter(status='held').exists())
+    
+    def test_deleted_recipient_emails_are_released(self):
+        orphan = User.objects.create_user(username='orphan', email='orphan@test.com')
+        UserProfile.objects.filter(user=orphan).update(notification_frequency='daily')
+        self.moze.team_members.add(orphan)
+        self.comment('First comment')
+        self.comment('Second comment')
+        orphan.delete()
+        self.close_windows()
+        
+        self.assertEqual(NotificationDigestBuilder(batch_size=1).run(), (1, 2))
+        
+        self.assertFalse(EmailOutbox.objects.filter(status='held').exists())
+        self.assertEqual(EmailOutbox.objects.filter(recipient__isnull=True, status='pending').count(), 2)
+        self.assertEqual(EmailOutbox.objects.get(kind='notification_digest').recipient, self.aamil)
+    
+    def test_command(self):
+        self.comment()
+        self.comment()
+        self.close_windows()
+        out = StringIO()
+        
+        call_command('build_notification_digests', stdout=out)
+        
+        self.assertIn('Built 1 digests and released 0 single notifications', out.getvalue())
+
+
+@override_settings(TIME_ZONE='UTC', NOTIFICATION_DIGEST_HOUR=8)
+class DigestWindowTest(TestCase):
+
+    def test_hourly_window_closes_at_the_next_hour(self):
+        now = datetime(2024, 5, 1, 10, 20, tzinfo=dt_timezone.utc)
+        
+        self.assertEqual(digest_window_end('hourly', now), datetime(2024, 5, 1, 11, tzinfo=dt_timezone.utc))
+    
+    def test_daily_window_closes_at_the_digest_hour(self):
+        before = datetime(2024, 5, 1, 6, 0, tzinfo=dt_timezone.utc)
+        after = datetime(2024, 5, 1, 8, 0, tzinfo=dt_timezone.utc)
+        
+        self.assertEqual(digest_window_end('daily', before), datetime(2024, 5, 1, 8, tzinfo=dt_timezone.utc))
+        self.assertEqual(digest_window_end('daily', after), datetime(2024, 5, 2, 8, tzinfo=dt_timezone.utc))
@@ -0,0 +1,61 @@
+"""
+Tests for bulk password provisioning
+"""
+from django.contrib.auth.hashers import check_password
+from django.test import TestCase
+
+from accounts.models import User, UserProfile
+from accounts.provisioning import (
+    create_provisioned_user, get_activation_path, hash_passwords, make_activation_token
+)
+
+
+class PasswordProvisioningTests(TestCase):
+    """Test unusable-password provisioning and activation tokens"""
+    
+    def test_provisioned_user_has_unusable_password(self):
+        user = create_provisioned_user(
+            username='bulk1', email='Bulk1@Example.com', role='student', its_id='11110001'
+        )
+        user.refresh_from_db()
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(user.email, 'Bulk1@example.com')
+        # post_save signals still run for provisioned users
+        self.assertTrue(UserProfile.objects.filter(user=user).exists())
+    
+    def test_provisioned_user_with_precomputed_hash(self):
+        password_hash = hash_passwords(['s3cret-pass'], workers=1)[0]
+        user = create_provisioned_user(username='bulk2', password_hash=password_hash)
+        self.assertTrue(user.check_password('s3cret-pass'))
+    
+    def test_hash_passwords_in_process_pool(self):
+        raw_passwords = ['first-pass', 'second-pass', 'third-pass']
+        hashes = hash_passwords(raw_passwords, workers=2, chunksize=1)
+        self.assertEqual(len(hashes), 3)
+        for raw_password, encoded in zip(raw_passwords, hashes):
+            self.assertTrue(check_password(raw_password, encoded))
+    
+    def test_activation_link_sets_password_once(self):
+        user = create_provisioned_user(username='bulk3', email='bulk3@example.com')
+        path = get_activation_path(user)
+        
+        # The confirm view redirects to a session-backed URL before showing the form
+        response = self.client.get(path, follow=True)
+        self.assertTrue(response.context['validlink'])
+        response = self.client.post(response.redirect_chain[-1][0], {
+            'new_password1': 'Activated-Pass-123',
+            'new_password2': 'Activated-Pass-123',
+        })
+        self.assertEqual(response.status_code, 302)
+        
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('Activated-Pass-123'))
+        
+        # Token is invalidated by the password change
+        response = self.client.get(path, follow=True)
+        self.assertFalse(response.context['validlink'])
+    
+    def test_activation_token_differs_per_user(self):
+        first = create_provisioned_user(username='bulk4')
+        second = create_provisioned_user(username='bulk5')
+        self.assertNotEqual(make_activation_token(first), make_activation_token(second))
@@ -0,0 +1,204 @@
+"""
+Tests for the scheduled job runner
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+import time as timer
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from accounts.models import EmailOutbox, ScheduledJobRun
+from umoor_sehhat import notifications
+from umoor_sehhat.scheduler import CronSpec, JobRegistry, JobRunner, jobs
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+@override_settings(TIME_ZONE='UTC')
+class CronSpecTest(TestCase):
+
+    def test_previous_occurrence(self):
+        now = utc(2024, 5, 1, 10, 20)  # a Wednesday
+        
+        self.assertEqual(CronSpec('0 * * * *').previous(now), utc(2024, 5, 1, 10, 0))
+        self.assertEqual(CronSpec('*/15 * * * *').previous(now), utc(2024, 5, 1, 10, 15))
+        self.assertEqual(CronSpec('0 18 * * *').previous(now), utc(2024, 4, 30, 18, 0))
+        self.assertEqual(CronSpec('0 7 * * 1').previous(now), utc(2024, 4, 29, 7, 0))
+        self.assertEqual(CronSpec('30 9 1,15 * *').previous(now), utc(2024, 5, 1, 9, 30))
+        self.assertEqual(CronSpec('30 11 1,15 * *').previous(now), utc(2024, 4, 15, 11, 30))
+        self.assertEqual(CronSpec('20 10 * * *').previous(now), now)
+    
+    def test_sunday_is_0_or_7(self):
+        now = utc(2024, 5, 1, 10, 20)
+        
+        self.assertEqual(CronSpec('0 8 * * 0').previous(now), utc(2024, 4, 28, 8, 0))
+        self.assertEqual(CronSpec('0 8 * * 7').previous(now), utc(2024, 4, 28, 8, 0))
+    
+    def test_restricted_day_fields_match_either(self):
+        # The 1st of the month or any Monday
+        self.assertEqual(CronSpec('0 0 1 * 1').previous(utc(2024, 5, 5, 12, 0)), utc(2024, 5, 1, 0, 0))
+        self.assertEqual(CronSpec('0 0 1 * 1').previous(utc(2024, 5, 8, 12, 0)), utc(2024, 5, 6, 0, 0))
+    
+    def test_invalid_specs(self):
+        for spec in ['* * * *', '60 * * * *', '* 24 * * *', '5-1 * * * *', '*/0 * * * *', 'a * * * *']:
+            with self.assertRaises(ValueError, msg=spec):
+                CronSpec(spec)
+
+
+@override_settings(TIME_ZONE='UTC')
+class JobRunnerTest(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.registry = JobRegistry()
+        self.runner = JobRunner(self.registry)
+        self.now = utc(2024, 5, 1, 10, 20)
+    
+    def job(self, fail=False):
+        self.calls.append(1)
+        EmailOutbox.objects.create(to_emails=['a@test.com'], subject=f'Run {len(self.calls)}', body_text='x')
+        if fail:
+            raise RuntimeError('SMTP down')
+        return len(self.calls)
+    
+    def test_runs_once_per_occurrence(self):
+        self.registry.register('hourly', '0 * * * *', self.job)
+        
+        self.assertEqual(self.runner.run_due(now=self.now), [('hourly', utc(2024, 5, 1, 10), 'succeeded')])
+        self.assertEqual(
+            self.runner.run_due(now=self.now + timedelta(minutes=5)), [('hourly', utc(2024, 5, 1, 10), 'skipped')]
+        )
+        self.runner.run_due(now=self.now + timedelta(hours=1))
+        
+        self.assertEqual(len(self.calls), 2)
+        run = ScheduledJobRun.objects.get(job_name='hourly', scheduled_for=utc(2024, 5, 1, 10))
+        self.assertEqual(run.status, 'succeeded')
+        self.assertEqual(run.result, 1)
+        self.assertIsNotNone(run.duration_seconds)
+    
+    def test_failed_run_keeps_committed_work_and_is_retried(self):
+        self.registry.register('flaky', '0 * * * *', lambda: self.job(fail=len(self.calls) == 0))
+        
+        self.assertEqual(self.runner.run_due(now=self.now)[0][2], 'failed')
+        run = ScheduledJobRun.objects.get()
+        self.assertEqual(run.status, 'failed')
+        self.assertIn('SMTP down', run.error)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+        
+        self.assertEqual(self.runner.run_due(now=self.now)[0][2], 'succeeded')
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.attempts), ('succeeded', 2))
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+    
+    def test_gives_up_after_max_attempts(self):
+        self.registry.register('broken', '0 * * * *', lambda: self.job(fail=True), max_attempts=2)
+        
+        outcomes = [self.runner.run_due(now=self.now)[0][2] for _ in range(3)]
+        
+        self.assertEqual(outcomes, ['failed', 'failed', 'skipped'])
+        self.assertEqual(len(self.calls), 2)
+    
+    def test_running_occurrence_is_left_to_its_owner(self):
+        self.registry.register('hourly', '0 * * * *', self.job, lease_seconds=600)
+        job = self.registry.get('hourly')
+        self.assertIsNotNone(self.runner.acquire(job, utc(2024, 5, 1, 10), self.now))
+        
+        self.assertEqual(self.runner.run_due(now=self.now + timedelta(minutes=5))[0][2], 'skipped')
+        self.assertEqual(self.calls, [])
+        
+        # Once the lease expires another node takes over
+        self.assertEqual(self.runner.run_due(now=self.now + timedelta(minutes=11))[0][2], 'succeeded')
+        self.assertEqual(ScheduledJobRun.objects.get().attempts, 2)
+    
+    def test_lost_lease_is_not_marked_succeeded(self):
+        self.registry.register('hourly', '0 * * * *', self.job)
+        job = self.registry.get('hourly')
+        run = self.runner.acquire(job, utc(2024, 5, 1, 10), self.now)
+        ScheduledJobRun.objects.filter(pk=run.pk).update(owner='another-node')
+        
+        self.assertFalse(self.runner.run(job, run))
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.owner), ('running', 'another-node'))
+    
+    def test_renew_lease(self):
+        self.registry.register('hourly', '0 * * * *', self.job, lease_seconds=600)
+        job = self.registry.get('hourly')
+        run = self.runner.acquire(job, utc(2024, 5, 1, 10), self.now)
+        
+        self.assertTrue(self.runner.renew_lease(job, run))
+        self.assertGreater(ScheduledJobRun.objects.get().lease_expires_at, self.now + timedelta(seconds=600))
+        
+        ScheduledJobRun.objects.filter(pk=run.pk).update(owner='another-node')
+        self.assertFalse(self.runner.renew_lease(job, run))
+    
+    def test_missed_occurrences_past_grace_are_skipped(self):
+        self.registry.register('daily', '0 7 * * *', self.job, grace_seconds=3600)
+        
+        self.assertEqual(self.runner.run_due(now=utc(2024, 5, 1, 7, 30))[0][2], 'succeeded')
+        self.assertEqual(self.runner.run_due(now=utc(2024, 5, 2, 9, 0)), [])
+    
+    def test_schedules_can_be_overridden_in_settings(self):
+        with self.settings(SCHEDULED_JOBS={'hourly': '30 * * * *'}):
+            self.registry.register('hourly', '0 * * * *', self.job)
+        
+        self.assertEqual(str(self.registry.get('hourly').schedule), '30 * * * *')
+
+
+class JobHeartbeatTest(TransactionTestCase):
+
+    def test_lease_is_renewed_while_a_long_job_runs(self):
+        registry = JobRegistry()
+        runner = JobRunner(registry)
+        leases = []
+        
+        def slow_job():
+            leases.append(ScheduledJobRun.objects.get().lease_expires_at)
+            timer.sleep(1.5)
+            leases.append(ScheduledJobRun.objects.get().lease_expires_at)
+        
+        registry.register('slow', '* * * * *', slow_job, lease_seconds=3)
+        
+        self.assertEqual(runner.run_due()[0][2], 'succeeded')
+        self.assertGreater(leases[1], leases[0])
+
+
+class RunDueJobsCommandTest(TestCase):
+
+    def setUp(self):
+        jobs.register('test_job', '0 0 * * *', lambda: 7, grace_seconds=24 * 60 * 60)
+        self.addCleanup(jobs._jobs.pop, 'test_job')
+    
+    def test_notification_jobs_are_registered(self):
+        self.assertTrue(notifications)
+        names = {job.name for job in jobs}
+        for name in [
+            'daily_appointment_reminders', 'doctor_daily_schedules', 'survey_reminders', 'weekly_summary',
+            'waiting_list_holds'
+        ]:
+            self.assertIn(name, names)
+    
+    def test_runs_selected_job(self):
+        out = StringIO()
+        
+        call_command('run_due_jobs', '--job', 'test_job', stdout=out)
+        call_command('run_due_jobs', '--job', 'test_job', stdout=out)
+        
+        self.assertIn('test_job', out.getvalue())
+        self.assertIn('succeeded', out.getvalue())
+        self.assertIn('skipped', out.getvalue())
+        self.assertEqual(ScheduledJobRun.objects.get().result, 7)
+    
+    def test_list(self):
+        out = StringIO()
+        
+        call_command('run_due_jobs', '--list', '--job', 'test_job', stdout=out)
+        
+        self.assertIn('never run', out.getvalue())
+    
+    def test_unknown_job(self):
+        with self.assertRaises(CommandError):
+            call_command('run_due_jobs', '--job', 'nope')
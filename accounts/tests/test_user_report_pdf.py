@@ -0,0 +1,82 @@
+"""
+Tests for the user report PDF and the shared PDF layout helpers
+"""
+from io import StringIO
+import re
+import zlib
+
+from django.core.management import call_command
+from django.test import TestCase
+from reportlab.lib.rl_accel import asciiBase85Decode
+
+from accounts.models import User
+from umoor_sehhat.pdf_generator import PDFGenerator
+from umoor_sehhat.pdf_layout import LIST_TABLE_STYLE, PagedTable, get_styles, truncate
+
+PAGE_RE = re.compile(rb'/Type /Page\b(?!s)')
+CONTENT_STREAM_RE = re.compile(rb'/Filter \[ /ASCII85Decode /FlateDecode \] /Length \d+\s*>>\s*stream\r?\n(.*?)endstream', re.S)
+
+
+def page_contents(pdf):
+    """Decoded content stream of every page, in page order"""
+    return [zlib.decompress(asciiBase85Decode(stream.strip())) for stream in CONTENT_STREAM_RE.findall(pdf)]
+
+
+class PDFLayoutTests(TestCase):
+    """Test the cached styles and page-sized tables"""
+    
+    def test_styles_are_built_once(self):
+        self.assertIs(get_styles(), get_styles())
+        self.assertEqual(get_styles()['ReportTitle'].fontSize, 18)
+    
+    def test_tables_are_split_to_the_space_left(self):
+        rows = [[str(index)] for index in range(25)]
+        paged = PagedTable(['Number'], iter(rows), [100], LIST_TABLE_STYLE, row_height=10, header_height=20)
+        
+        self.assertGreater(paged.wrap(100, 125)[1], 125)
+        first, rest = paged.split(100, 125)
+        self.assertEqual(first._cellvalues, [['Number']] + rows[:10])
+        self.assertEqual(rest.wrap(100, 1000), (100, 20 + 10 * 15))
+        self.assertEqual(rest.split(100, 25), [])
+    
+    def test_truncate(self):
+        self.assertEqual(truncate('abcdef', 3), 'abc...')
+        self.assertEqual(truncate('abc', 3), 'abc')
+        self.assertEqual(truncate(None, 3), '')
+
+
+class UserReportPDFTests(TestCase):
+    """Test the user report with enough users for several pages"""
+    
+    def setUp(self):
+        User.objects.bulk_create([
+            User(username=f'user{index}', first_name=f'First{index}', email=f'user{index}@example.com', role='student')
+            for index in range(150)
+        ])
+    
+    def test_report_is_read_in_one_pass(self):
+        # The count and the users themselves
+        with self.assertNumQueries(2):
+            pdf = PDFGenerator.create_user_report_pdf(User.objects.order_by('pk')).getvalue()
+        
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        pages = page_contents(pdf)
+        self.assertEqual(len(pages), len(PAGE_RE.findall(pdf)))
+        self.assertGreater(len(pages), 2)
+        # Every page has exactly one header row and no user is left out
+        self.assertEqual([page.count(b'(Date Joined)') for page in pages], [1] * len(pages))
+        self.assertEqual(sum(page.count(b'@example.com)') for page in pages), 150)
+    
+    def test_lists_of_users(self):
+        pdf = PDFGenerator.create_user_report_pdf(list(User.objects.all()[:5]), title='Students').getvalue()
+        
+        self.assertEqual(len(PAGE_RE.findall(pdf)), 1)
+    
+    def test_benchmark_command(self):
+        out = StringIO()
+        users = User.objects.count()
+        
+        call_command('benchmark_user_report', rows=100, repeat=1, stdout=out)
+        
+        self.assertIn('100 rows', out.getvalue())
+        self.assertEqual(User.objects.count(), users)
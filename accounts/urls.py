@@ -33,7 +33,13 @@ urlpatterns = [
     path('password/reset/', auth_views.PasswordResetView.as_view(
         template_name='accounts/password_reset.html'
     ), name='password_reset'),
-    
+
+    # Account activation for bulk-provisioned users (one-time token)
+    path('activate/<uidb64>/<token>/', auth_views.PasswordResetConfirmView.as_view(
+        template_name='accounts/account_activate.html',
+        success_url='/accounts/login/'
+    ), name='activate'),
+
     # User management (for admins) - redirects to modern user directory
     path('users/', views.user_directory, name='user_list'),
     path('users/<int:pk>/', views.UserDetailView.as_view(), name='user_detail'),
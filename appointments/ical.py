@@ -0,0 +1,193 @@
+"""
+iCalendar (.ics) feeds of doctor and patient appointments
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Appointment, AppointmentStatus, AppointmentType
+
+ICAL_CACHE_TIMEOUT = 60 * 60
+# Feeds larger than this are streamed every time instead of being cached
+ICAL_CACHE_MAX_BYTES = 512 * 1024
+ICAL_CHUNK_SIZE = 500
+# Bump when the rendered format changes so cached feeds and client ETags go stale
+ICAL_FORMAT_VERSION = 1
+
+ICAL_STATUS = {
+    AppointmentStatus.PENDING: 'TENTATIVE',
+    AppointmentStatus.CANCELLED: 'CANCELLED',
+    AppointmentStatus.RESCHEDULED: 'CANCELLED',
+}
+APPOINTMENT_TYPE_LABELS = dict(AppointmentType.CHOICES)
+
+FEED_FIELDS = (
+    'appointment_id', 'appointment_date', 'appointment_time', 'duration_minutes', 'status',
+    'appointment_type', 'reason_for_visit', 'updated_at',
+    'doctor__name', 'doctor__address', 'doctor__user__first_name', 'doctor__user__last_name',
+    'patient__user__first_name', 'patient__user__last_name',
+)
+
+
+def escape_text(value):
+    """Escape a TEXT property value (RFC 5545 3.3.11)"""
+    return (
+        str(value or '')
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def fold_line(line, limit=75):
+    """Fold a content line into CRLF-terminated chunks of at most ``limit`` octets"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= limit:
+        return line + '\r\n'
+    
+    parts = []
+    current = []
+    size = 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            parts.append(''.join(current))
+            # Continuation lines start with a space, which counts towards the limit
+            current = [' ']
+            size = 1
+        current.append(char)
+        size += char_size
+    parts.append(''.join(current))
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def format_utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _full_name(first_name, last_name, fallback=''):
+    return f"{first_name or ''} {last_name or ''}".strip() or fallback
+
+
+class AppointmentFeed:
+    """
+    Appointments of one doctor or patient rendered as an iCalendar feed.
+    
+    ``etag()`` costs a single aggregate (row count and latest
+    ``updated_at``), so unchanged feeds can be answered with 304 without
+    loading any appointments. Rendered feeds up to ``ICAL_CACHE_MAX_BYTES``
+    are cached under their ETag; larger ones are streamed in chunks.
+    """
+    
+    OWNER_FIELDS = {
+        'doctor': 'doctor_id',
+        'patient': 'patient_id',
+    }
+    
+    def __init__(self, owner_type, owner_id, date_from, date_to):
+        if owner_type not in self.OWNER_FIELDS:
+            raise ValueError(f"Unknown feed owner type: {owner_type}")
+        if date_from > date_to:
+            raise ValueError("date_from must not be after date_to")
+        self.owner_type = owner_type
+        self.owner_id = owner_id
+        self.date_from = date_from
+        self.date_to = date_to
+    
+    @property
+    def cache_key(self):
+        return f'appointments:ical:{self.owner_type}:{self.owner_id}:{self.date_from}:{self.date_to}'
+    
+    def get_queryset(self):
+        return Appointment.objects.filter(
+            **{self.OWNER_FIELDS[self.owner_type]: self.owner_id},
+            appointment_date__gte=self.date_from,
+            appointment_date__lte=self.date_to
+        )
+    
+    def etag(self):
+        """Validator for the feed's current contents, from one aggregate query"""
+        stats = self.get_queryset().order_by().aggregate(count=Count('pk'), last_updated=Max('updated_at'))
+        last_updated = stats['last_updated'].isoformat() if stats['last_updated'] else ''
+        return hashlib.sha1(
+            f"{ICAL_FORMAT_VERSION}:{self.cache_key}:{stats['count']}:{last_updated}".encode()
+        ).hexdigest()
+    
+    def cached_body(self, etag):
+        cached = cache.get(self.cache_key)
+        if cached and cached[0] == etag:
+            return cached[1]
+        return None
+    
+    def stream(self, etag):
+        """Yield the feed as encoded chunks, caching it when it is small enough"""
+        chunks = []
+        size = 0
+        for chunk in self._render():
+            data = chunk.encode('utf-8')
+            if chunks is not None:
+                size += len(data)
+                chunks.append(data)
+                if size > ICAL_CACHE_MAX_BYTES:
+                    chunks = None
+            yield data
+        
+        if chunks is not None:
+            cache.set(self.cache_key, (etag, b''.join(chunks)), ICAL_CACHE_TIMEOUT)
+    
+    def _render(self):
+        yield ''.join([
+            'BEGIN:VCALENDAR\r\n',
+            'VERSION:2.0\r\n',
+            'PRODID:-//Umoor Sehhat//Appointments//EN\r\n',
+            'CALSCALE:GREGORIAN\r\n',
+            'METHOD:PUBLISH\r\n',
+            fold_line(f'X-WR-CALNAME:{escape_text(self.calendar_name())}'),
+        ])
+        
+        rows = self.get_queryset().order_by('appointment_date', 'appointment_time').values(*FEED_FIELDS)
+        batch = []
+        for row in rows.iterator(chunk_size=ICAL_CHUNK_SIZE):
+            batch.append(self.render_event(row))
+            if len(batch) >= ICAL_CHUNK_SIZE:
+                yield ''.join(batch)
+                batch = []
+        batch.append('END:VCALENDAR\r\n')
+        yield ''.join(batch)
+    
+    def calendar_name(self):
+        return f'Umoor Sehhat appointments ({self.owner_type} {self.owner_id})'
+    
+    def render_event(self, row):
+        start = timezone.make_aware(datetime.combine(row['appointment_date'], row['appointment_time']))
+        end = start + timedelta(minutes=row['duration_minutes'] or 30)
+        doctor_name = _full_name(row['doctor__user__first_name'], row['doctor__user__last_name'], row['doctor__name'])
+        patient_name = _full_name(row['patient__user__first_name'], row['patient__user__last_name'], 'Patient')
+        
+        if self.owner_type == 'doctor':
+            summary = f'Appointment with {patient_name}'
+        else:
+            summary = f'Appointment with Dr. {doctor_name}'
+        description = APPOINTMENT_TYPE_LABELS.get(row['appointment_type'], row['appointment_type'])
+        if row['reason_for_visit']:
+            description = f"{description}: {row['reason_for_visit']}"
+        
+        lines = [
+            'BEGIN:VEVENT\r\n',
+            f"UID:{row['appointment_id']}@umoor-sehhat\r\n",
+            f"DTSTAMP:{format_utc(row['updated_at'])}\r\n",
+            f'DTSTART:{format_utc(start)}\r\n',
+            f'DTEND:{format_utc(end)}\r\n',
+            fold_line(f'SUMMARY:{escape_text(summary)}'),
+            fold_line(f'DESCRIPTION:{escape_text(description)}'),
+            f"STATUS:{ICAL_STATUS.get(row['status'], 'CONFIRMED')}\r\n",
+        ]
+        if row['doctor__address']:
+            lines.append(fold_line(f"LOCATION:{escape_text(row['doctor__address'])}"))
+        lines.append('END:VEVENT\r\n')
+        return ''.join(lines)
@@ -0,0 +1,48 @@
+from datetime import timedelta
+import time as timer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from appointments.models import Appointment, AppointmentStatus
+from appointments.utils import ReminderPolicy
+
+
+class Command(BaseCommand):
+    help = 'Create missing default reminders for upcoming appointments after a reminder policy change'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Only backfill appointments within this many days from today (default: all upcoming)'
+        )
+        
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Appointments handled per bulk insert (default: 2000)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        
+        today = timezone.now().date()
+        appointments = Appointment.objects.filter(
+            appointment_date__gte=today,
+            status__in=AppointmentStatus.ACTIVE + [AppointmentStatus.PENDING]
+        )
+        if options['days'] is not None:
+            appointments = appointments.filter(appointment_date__lte=today + timedelta(days=options['days']))
+        rows = appointments.order_by('pk').values_list('pk', 'appointment_date', 'appointment_time')
+        
+        policy = ReminderPolicy(batch_size=options['batch_size'])
+        started = timer.perf_counter()
+        created = policy.schedule_rows(rows.iterator(chunk_size=options['batch_size']))
+        elapsed = timer.perf_counter() - started
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Created {created} reminders in {elapsed:.1f}s')
+        )
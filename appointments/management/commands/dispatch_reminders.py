@@ -0,0 +1,46 @@
+import time as timer
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.utils import ReminderDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Send due appointment reminders; several workers can run this concurrently'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Reminders claimed and sent per batch (default: 100)'
+        )
+        
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches (default: until nothing is due)'
+        )
+        
+        parser.add_argument(
+            '--lease-seconds',
+            type=int,
+            default=300,
+            help='Seconds before an unfinished claim may be taken by another worker (default: 300)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['lease_seconds'] < 1:
+            raise CommandError('--batch-size and --lease-seconds must be positive')
+        
+        dispatcher = ReminderDispatcher(
+            batch_size=options['batch_size'],
+            lease_seconds=options['lease_seconds']
+        )
+        started = timer.perf_counter()
+        sent, failed = dispatcher.run(max_batches=options['max_batches'])
+        elapsed = timer.perf_counter() - started
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Sent {sent} reminders ({failed} failed) in {elapsed:.1f}s')
+        )
@@ -0,0 +1,162 @@
+from datetime import date, datetime, time, timedelta
+import time as timer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from appointments.utils import AppointmentScheduler
+from doctordirectory.models import Doctor
+from moze.models import MozeSettings
+
+
+def build_slot_config(start_time, end_time, slot_minutes, max_appointments):
+    """Split a working day into consecutive slots of ``slot_minutes``"""
+    config = []
+    current = datetime.combine(date.min, start_time)
+    day_end = datetime.combine(date.min, end_time)
+    while current + timedelta(minutes=slot_minutes) <= day_end:
+        slot_end = current + timedelta(minutes=slot_minutes)
+        config.append({
+            'start_time': current.time(),
+            'end_time': slot_end.time(),
+            'max_appointments': max_appointments
+        })
+        current = slot_end
+    return config
+
+
+class Command(BaseCommand):
+    help = 'Generate recurring appointment time slots for every doctor'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Number of days to generate, starting at --start-date (default: 90)'
+        )
+        
+        parser.add_argument(
+            '--start-date',
+            type=date.fromisoformat,
+            help='First day to generate (YYYY-MM-DD, default: today)'
+        )
+        
+        parser.add_argument(
+            '--start-time',
+            type=time.fromisoformat,
+            default=time(9, 0),
+            help='Start of the working day (default: 09:00)'
+        )
+        
+        parser.add_argument(
+            '--end-time',
+            type=time.fromisoformat,
+            default=time(17, 0),
+            help='End of the working day (default: 17:00)'
+        )
+        
+        parser.add_argument(
+            '--slot-minutes',
+            type=int,
+            default=30,
+            help='Length of each slot in minutes (default: 30)'
+        )
+        
+        parser.add_argument(
+            '--max-appointments',
+            type=int,
+            default=1,
+            help='Appointments allowed per slot (default: 1)'
+        )
+        
+        parser.add_argument(
+            '--weekdays',
+            type=str,
+            default='0,1,2,3,4,5',
+            help='Comma-separated weekday numbers, 0=Monday (default: Monday to Saturday)'
+        )
+        
+        parser.add_argument(
+            '--doctor',
+            type=int,
+            action='append',
+            dest='doctors',
+            help='Only generate slots for this doctor ID (can be repeated)'
+        )
+        
+        parser.add_argument(
+            '--ignore-moze-settings',
+            action='store_true',
+            help="Do not use the working hours and days configured for a doctor's moze"
+        )
+        
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Doctors handled per set operation (default: 200)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['slot_minutes'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days, --slot-minutes and --batch-size must be positive')
+        if options['start_time'] >= options['end_time']:
+            raise CommandError('--end-time must be after --start-time')
+        try:
+            weekdays = sorted({int(day) for day in options['weekdays'].split(',') if day.strip()})
+        except ValueError:
+            raise CommandError('--weekdays must be a comma-separated list of numbers between 0 and 6')
+        if any(day < 0 or day > 6 for day in weekdays):
+            raise CommandError('--weekdays must be a comma-separated list of numbers between 0 and 6')
+        
+        start_date = options['start_date'] or timezone.now().date()
+        end_date = start_date + timedelta(days=options['days'] - 1)
+        default_config = build_slot_config(
+            options['start_time'], options['end_time'], options['slot_minutes'], options['max_appointments']
+        )
+        
+        doctors = Doctor.objects.filter(is_available=True).select_related('assigned_moze__settings').order_by('pk')
+        if options['doctors']:
+            doctors = doctors.filter(pk__in=options['doctors'])
+        
+        self.stdout.write(f'Generating time slots from {start_date} to {end_date}')
+        started = timer.perf_counter()
+        
+        total_created = 0
+        doctor_count = 0
+        batch = []
+        for doctor in doctors.iterator(chunk_size=options['batch_size']):
+            batch.append(self.get_schedule(doctor, default_config, weekdays, options))
+            doctor_count += 1
+            if len(batch) >= options['batch_size']:
+                total_created += len(AppointmentScheduler.generate_recurring_slots(batch, start_date, end_date))
+                batch = []
+        if batch:
+            total_created += len(AppointmentScheduler.generate_recurring_slots(batch, start_date, end_date))
+        
+        elapsed = timer.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Created {total_created} time slots for {doctor_count} doctors in {elapsed:.1f}s'
+            )
+        )
+    
+    def get_schedule(self, doctor, default_config, weekdays, options):
+        """(doctor, config, weekdays) for a doctor, preferring its moze's working hours"""
+        moze = doctor.assigned_moze
+        if options['ignore_moze_settings'] or moze is None:
+            return doctor, default_config, weekdays
+        
+        try:
+            settings = moze.settings
+        except MozeSettings.DoesNotExist:
+            return doctor, default_config, weekdays
+        
+        config = build_slot_config(
+            settings.working_hours_start,
+            settings.working_hours_end,
+            settings.appointment_duration or options['slot_minutes'],
+            options['max_appointments']
+        )
+        return doctor, config, settings.working_days or weekdays
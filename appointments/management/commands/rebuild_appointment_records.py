@@ -0,0 +1,39 @@
+import time as timer
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointments.read_model import REBUILD_BATCH_SIZE, SOURCES_BY_NAME, rebuild_records
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalised appointment read model from all appointment tables'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            choices=sorted(SOURCES_BY_NAME),
+            action='append',
+            dest='sources',
+            help='Only rebuild records from this app (can be repeated, default: all)'
+        )
+        
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=REBUILD_BATCH_SIZE,
+            help=f'Appointments upserted per query (default: {REBUILD_BATCH_SIZE})'
+        )
+    
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        
+        for source_name in options['sources'] or SOURCES_BY_NAME:
+            started = timer.perf_counter()
+            upserted, deleted = rebuild_records(source_name, options['batch_size'])
+            elapsed = timer.perf_counter() - started
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'{source_name}: {upserted} records rebuilt, {deleted} stale records removed in {elapsed:.1f}s'
+                )
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+        ('doctordirectory', '0003_appointment_payment_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['date', 'start_time'], name='appointment_date_985ff0_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 21:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_reminder_claims'),
+        ('doctordirectory', '0003_appointment_payment_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waitinglist',
+            name='offer_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='waitinglist',
+            name='offered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='waitinglist',
+            name='offered_slot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waiting_list_offers', to='appointments.timeslot'),
+        ),
+        migrations.AddIndex(
+            model_name='waitinglist',
+            index=models.Index(condition=models.Q(('is_active', True), ('notified', False)), fields=['doctor', 'preferred_date', 'priority', 'created_at'], name='waitinglist_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='waitinglist',
+            index=models.Index(fields=['offered_slot', 'offer_expires_at'], name='appointment_offered_9f75b2_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-18 22:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_waitinglist_offers'),
+        ('moze', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('appointments', 'Appointments'), ('doctordirectory', 'Doctor Directory'), ('mahalshifa', 'Mahal Shifa')], max_length=20)),
+                ('source_id', models.PositiveBigIntegerField()),
+                ('doctor_name', models.CharField(blank=True, max_length=200)),
+                ('patient_name', models.CharField(blank=True, max_length=200)),
+                ('appointment_date', models.DateField()),
+                ('appointment_time', models.TimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('source_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('doctor_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('moze', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='moze.moze')),
+                ('patient_user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['appointment_date', 'appointment_time'],
+                'indexes': [models.Index(fields=['appointment_date', 'status'], name='appointment_appoint_3b3908_idx'), models.Index(fields=['doctor_user', 'appointment_date', 'status'], name='appointment_doctor__ea8f3d_idx'), models.Index(fields=['patient_user', 'appointment_date'], name='appointment_patient_9f8d50_idx'), models.Index(fields=['moze', 'appointment_date', 'status'], name='appointment_moze_id_44ffa9_idx'), models.Index(fields=['source', 'appointment_date'], name='appointment_source_b961c1_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='appointmentrecord',
+            constraint=models.UniqueConstraint(fields=('source', 'source_id'), name='unique_appointment_record_source'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def backfill_appointment_records(apps, schema_editor):
+    from appointments.read_model import SOURCES_BY_NAME, rebuild_records
+    
+    for source_name in SOURCES_BY_NAME:
+        rebuild_records(source_name, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointmentrecord'),
+        ('doctordirectory', '0003_appointment_payment_status'),
+        ('mahalshifa', '0002_prescription_updated_at'),
+    ]
+    
+    operations = [
+        migrations.RunPython(backfill_appointment_records, migrations.RunPython.noop),
+    ]
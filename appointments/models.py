@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -9,6 +13,10 @@ import uuid
 
 User = get_user_model()
 
+# Sent after commit when an appointment gives back its time, with doctor_id,
+# date, start_time and time_slot_id (None for appointments without a slot)
+appointment_time_released = Signal()
+
 
 class AppointmentStatus:
     """Constants for appointment statuses"""
@@ -20,7 +28,7 @@ class AppointmentStatus:
     CANCELLED = 'cancelled'
     NO_SHOW = 'no_show'
     RESCHEDULED = 'rescheduled'
-
+    
     CHOICES = [
         (PENDING, 'Pending Confirmation'),
         (CONFIRMED, 'Confirmed'),
@@ -31,6 +39,16 @@ class AppointmentStatus:
         (NO_SHOW, 'No Show'),
         (RESCHEDULED, 'Rescheduled'),
     ]
+    
+    # Statuses that occupy a slot's capacity
+    ACTIVE = [CONFIRMED, SCHEDULED, IN_PROGRESS]
+    
+    # Statuses counted against a time slot's capacity, both by
+    # current_appointments and by the availability queries
+    HOLDS_SLOT = [PENDING, CONFIRMED, SCHEDULED, IN_PROGRESS, COMPLETED, NO_SHOW]
+    
+    # Statuses that give a booked time slot's capacity back
+    RELEASES_SLOT = [CANCELLED, RESCHEDULED]
 
 
 class AppointmentType:
@@ -87,6 +105,8 @@ class TimeSlot(models.Model):
         indexes = [
             models.Index(fields=['doctor', 'date', 'is_available']),
             models.Index(fields=['date', 'is_available', 'is_booked']),
+            # Ordered scan for earliest-slot searches across doctors
+            models.Index(fields=['date', 'start_time']),
         ]
     
     def __str__(self):
@@ -114,6 +134,47 @@ class TimeSlot(models.Model):
             self.current_appointments < self.max_appointments and
             self.date >= timezone.now().date()
         )
+    
+    @classmethod
+    def reserve(cls, slot_id, patient_id=None):
+        """
+        Atomically take one unit of a slot's capacity.
+        
+        Runs a single conditional UPDATE, so concurrent bookings can never
+        push ``current_appointments`` past ``max_appointments``. Places
+        held for other patients' waiting list offers are not free. Returns
+        False when the slot is full, held or unavailable.
+        """
+        held_for_others = WaitingList.objects.filter(
+            offered_slot=OuterRef('pk'),
+            offer_expires_at__gt=timezone.now(),
+            is_active=True
+        ).exclude(patient_id=patient_id).order_by().values('offered_slot').annotate(total=Count('pk')).values('total')
+        
+        # is_booked is listed first so every backend evaluates it against the old count
+        return cls.objects.filter(
+            pk=slot_id,
+            is_available=True,
+            current_appointments__lt=F('max_appointments') - Coalesce(
+                Subquery(held_for_others, output_field=models.IntegerField()), 0
+            )
+        ).update(
+            is_booked=models.Case(
+                models.When(current_appointments__gte=F('max_appointments') - 1, then=models.Value(True)),
+                default=models.Value(False)
+            ),
+            current_appointments=F('current_appointments') + 1,
+            updated_at=timezone.now()
+        ) == 1
+    
+    @classmethod
+    def release(cls, slot_id):
+        """Atomically give back one unit of a slot's capacity"""
+        return cls.objects.filter(pk=slot_id, current_appointments__gt=0).update(
+            is_booked=False,
+            current_appointments=F('current_appointments') - 1,
+            updated_at=timezone.now()
+        ) == 1
 
 
 class Appointment(models.Model):
@@ -278,21 +339,79 @@ class Appointment(models.Model):
             if conflicting:
                 raise ValidationError("This time slot is already booked")
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names and 'time_slot_id' in field_names:
+            instance._held_slot_id = instance._slot_to_hold()
+            instance._stored_status = instance.status
+        return instance
+    
+    def _slot_to_hold(self):
+        """Slot whose capacity this appointment occupies in its current state"""
+        if self.status not in AppointmentStatus.HOLDS_SLOT:
+            return None
+        return self.time_slot_id
+    
+    def _get_held_slot_id(self):
+        if self._state.adding:
+            return None
+        if not hasattr(self, '_held_slot_id'):
+            stored = Appointment.objects.filter(pk=self.pk).values_list('status', 'time_slot_id').first()
+            held = None
+            if stored and stored[0] in AppointmentStatus.HOLDS_SLOT:
+                held = stored[1]
+            self._held_slot_id = held
+        return self._held_slot_id
+    
     def save(self, *args, **kwargs):
         # Auto-set consultation fee from doctor or service
         if not self.consultation_fee and self.doctor:
             self.consultation_fee = self.doctor.consultation_fee
         
-        # Update time slot booking status
-        if self.time_slot:
-            self.time_slot.current_appointments = self.time_slot.appointments.filter(
-                status__in=[AppointmentStatus.CONFIRMED, AppointmentStatus.SCHEDULED]
-            ).count()
-            if self.time_slot.current_appointments >= self.time_slot.max_appointments:
-                self.time_slot.is_booked = True
-            self.time_slot.save()
+        # Slot capacity only changes when the appointment takes, moves or
+        # gives back its slot; other edits never touch the slot row
+        held_slot_id = self._get_held_slot_id()
+        wanted_slot_id = self._slot_to_hold()
+        
+        if held_slot_id == wanted_slot_id:
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic():
+                if wanted_slot_id and not TimeSlot.reserve(wanted_slot_id, self.patient_id):
+                    if TimeSlot.objects.filter(
+                        pk=wanted_slot_id, is_available=True, current_appointments__lt=F('max_appointments')
+                    ).exists():
+                        raise ValidationError("This time slot is being held for a waiting list patient")
+                    raise ValidationError("This time slot is fully booked")
+                if held_slot_id:
+                    TimeSlot.release(held_slot_id)
+                super().save(*args, **kwargs)
+                if wanted_slot_id:
+                    # A waiting list offer for this slot has been taken up
+                    WaitingList.objects.filter(
+                        offered_slot_id=wanted_slot_id, patient_id=self.patient_id, is_active=True
+                    ).update(is_active=False, offer_expires_at=None, updated_at=timezone.now())
+        
+        if self.status in AppointmentStatus.RELEASES_SLOT and (held_slot_id or self._was_active()):
+            transaction.on_commit(self._announce_release(held_slot_id))
         
-        super().save(*args, **kwargs)
+        self._held_slot_id = wanted_slot_id
+        self._stored_status = self.status
+    
+    def _was_active(self):
+        """Whether the stored row still occupied the doctor's time before this save"""
+        return getattr(self, '_stored_status', None) not in AppointmentStatus.RELEASES_SLOT + [None]
+    
+    def _announce_release(self, slot_id):
+        doctor_id, date, start_time = self.doctor_id, self.appointment_date, self.appointment_time
+        return lambda: appointment_time_released.send(
+            sender=Appointment,
+            doctor_id=doctor_id,
+            date=date,
+            start_time=start_time,
+            time_slot_id=slot_id
+        )
     
     @property
     def end_time(self):
@@ -347,14 +466,9 @@ class Appointment(models.Model):
         self.cancelled_at = timezone.now()
         self.cancelled_by = cancelled_by
         self.cancellation_reason = reason
+        # save() gives the slot's capacity back
         self.save()
         
-        # Free up the time slot
-        if self.time_slot:
-            self.time_slot.current_appointments -= 1
-            self.time_slot.is_booked = False
-            self.time_slot.save()
-        
         # Create cancellation log
         AppointmentLog.objects.create(
             appointment=self,
@@ -441,6 +555,7 @@ class AppointmentReminder(models.Model):
         max_length=20,
         choices=[
             ('pending', 'Pending'),
+            ('processing', 'Processing'),
             ('sent', 'Sent'),
             ('failed', 'Failed'),
             ('cancelled', 'Cancelled'),
@@ -449,6 +564,10 @@ class AppointmentReminder(models.Model):
     )
     error_message = models.TextField(blank=True)
     
+    # Set while a dispatcher worker owns the reminder
+    claim_token = models.CharField(max_length=32, blank=True, db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -457,6 +576,7 @@ class AppointmentReminder(models.Model):
         indexes = [
             models.Index(fields=['scheduled_for', 'is_sent']),
             models.Index(fields=['appointment', 'reminder_type']),
+            models.Index(fields=['status', 'scheduled_for']),
         ]
     
     def __str__(self):
@@ -492,6 +612,17 @@ class WaitingList(models.Model):
     is_active = models.BooleanField(default=True)
     notified = models.BooleanField(default=False)
     
+    # Slot held for this entry after it was offered a released time
+    offered_slot = models.ForeignKey(
+        TimeSlot,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='waiting_list_offers'
+    )
+    offered_at = models.DateTimeField(null=True, blank=True)
+    offer_expires_at = models.DateTimeField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -500,7 +631,107 @@ class WaitingList(models.Model):
         indexes = [
             models.Index(fields=['doctor', 'preferred_date', 'is_active']),
             models.Index(fields=['patient', 'is_active']),
+            # Entries still waiting for an offer, in the order the matcher takes them
+            models.Index(
+                fields=['doctor', 'preferred_date', 'priority', 'created_at'],
+                condition=models.Q(is_active=True, notified=False),
+                name='waitinglist_open_idx'
+            ),
+            models.Index(fields=['offered_slot', 'offer_expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient} waiting for {self.doctor} on {self.preferred_date}"
+
+
+class AppointmentRecord(models.Model):
+    """
+    Denormalised, read-only row for every appointment in the project.
+    
+    Mirrors appointments.Appointment, doctordirectory.Appointment and
+    mahalshifa.Appointment so cross-app dashboards and reports can query
+    a single indexed table. Rows are kept in sync by signals and can be
+    rebuilt with the ``rebuild_appointment_records`` command.
+    """
+    SOURCE_CHOICES = [
+        ('appointments', 'Appointments'),
+        ('doctordirectory', 'Doctor Directory'),
+        ('mahalshifa', 'Mahal Shifa'),
+    ]
+    
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.PositiveBigIntegerField()
+    
+    doctor_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    doctor_name = models.CharField(max_length=200, blank=True)
+    patient_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    patient_name = models.CharField(max_length=200, blank=True)
+    moze = models.ForeignKey(
+        'moze.Moze',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    
+    appointment_date = models.DateField()
+    appointment_time = models.TimeField()
+    status = models.CharField(max_length=20)
+    source_updated_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['appointment_date', 'appointment_time']
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'source_id'], name='unique_appointment_record_source'),
+        ]
+        indexes = [
+            models.Index(fields=['appointment_date', 'status']),
+            models.Index(fields=['doctor_user', 'appointment_date', 'status']),
+            models.Index(fields=['patient_user', 'appointment_date']),
+            models.Index(fields=['moze', 'appointment_date', 'status']),
+            models.Index(fields=['source', 'appointment_date']),
         ]
     
     def __str__(self):
-        return f"{self.patient} waiting for {self.doctor} on {self.preferred_date}"
\ No newline at end of file
+        return f"{self.get_source_display()} #{self.source_id} on {self.appointment_date}"
+
+
+@receiver(appointment_time_released, sender=Appointment)
+def offer_released_time_to_waiting_list(sender, doctor_id, date, start_time, time_slot_id, **kwargs):
+    """Offer time given back by a cancelled or rescheduled appointment to the waiting list"""
+    from .utils import WaitingListMatcher
+    
+    WaitingListMatcher().offer_released_time(doctor_id, date, start_time, time_slot_id)
+
+
+@receiver(post_save, sender='appointments.Appointment')
+@receiver(post_save, sender='doctordirectory.Appointment')
+@receiver(post_save, sender='mahalshifa.Appointment')
+def sync_appointment_record(sender, instance, raw=False, **kwargs):
+    """Keep the appointment read model in step with every appointment table"""
+    if raw:
+        return
+    from .read_model import sync_record
+    
+    sync_record(instance)
+
+
+@receiver(post_delete, sender='appointments.Appointment')
+@receiver(post_delete, sender='doctordirectory.Appointment')
+@receiver(post_delete, sender='mahalshifa.Appointment')
+def delete_appointment_record(sender, instance, **kwargs):
+    from .read_model import delete_record
+    
+    delete_record(instance)
@@ -0,0 +1,147 @@
+"""
+Maintenance of the AppointmentRecord read model.
+
+Each appointment table is described by a ``RecordSource`` mapping its
+columns onto the narrow AppointmentRecord row; single rows are upserted
+from signals and whole tables are rebuilt in batches.
+"""
+from typing import Dict, NamedTuple, Optional, Tuple
+import logging
+
+from django.apps import apps as global_apps
+
+from .models import AppointmentRecord
+
+logger = logging.getLogger(__name__)
+
+RECORD_FIELDS = [
+    'doctor_user_id', 'doctor_name', 'patient_user_id', 'patient_name', 'moze_id',
+    'appointment_date', 'appointment_time', 'status', 'source_updated_at',
+]
+REBUILD_BATCH_SIZE = 2000
+
+
+class RecordSource(NamedTuple):
+    """How one appointment table maps onto AppointmentRecord"""
+    name: str
+    model_label: str
+    # Record field -> lookup on the source model
+    columns: Dict[str, str]
+    # Record name field -> (first name lookup, last name lookup, fallback lookup)
+    names: Dict[str, Tuple[str, str, Optional[str]]]
+    
+    def get_model(self, apps=global_apps):
+        return apps.get_model(self.model_label)
+    
+    @property
+    def lookups(self):
+        lookups = ['pk', *self.columns.values()]
+        for name_lookups in self.names.values():
+            lookups.extend(lookup for lookup in name_lookups if lookup)
+        return lookups
+    
+    def to_record(self, row, record_model=AppointmentRecord):
+        record = record_model(source=self.name, source_id=row['pk'])
+        for field, lookup in self.columns.items():
+            setattr(record, field, row[lookup])
+        for field, (first_name, last_name, fallback) in self.names.items():
+            name = f"{row[first_name] or ''} {row[last_name] or ''}".strip()
+            setattr(record, field, name or (row[fallback] if fallback else '') or '')
+        return record
+
+
+_DIRECTORY_COLUMNS = {
+    'doctor_user_id': 'doctor__user_id',
+    'patient_user_id': 'patient__user_id',
+    'moze_id': 'doctor__assigned_moze_id',
+    'appointment_date': 'appointment_date',
+    'appointment_time': 'appointment_time',
+    'status': 'status',
+    'source_updated_at': 'updated_at',
+}
+_DIRECTORY_NAMES = {
+    'doctor_name': ('doctor__user__first_name', 'doctor__user__last_name', 'doctor__name'),
+    'patient_name': ('patient__user__first_name', 'patient__user__last_name', None),
+}
+
+SOURCES = {
+    source.model_label: source
+    for source in [
+        RecordSource('appointments', 'appointments.Appointment', _DIRECTORY_COLUMNS, _DIRECTORY_NAMES),
+        RecordSource('doctordirectory', 'doctordirectory.Appointment', _DIRECTORY_COLUMNS, _DIRECTORY_NAMES),
+        RecordSource(
+            'mahalshifa',
+            'mahalshifa.Appointment',
+            {
+                'doctor_user_id': 'doctor__user_id',
+                'patient_user_id': 'patient__user_account_id',
+                'moze_id': 'moze_id',
+                'appointment_date': 'appointment_date',
+                'appointment_time': 'appointment_time',
+                'status': 'status',
+                'source_updated_at': 'updated_at',
+            },
+            {
+                'doctor_name': ('doctor__user__first_name', 'doctor__user__last_name', None),
+                'patient_name': ('patient__first_name', 'patient__last_name', None),
+            }
+        ),
+    ]
+}
+SOURCES_BY_NAME = {source.name: source for source in SOURCES.values()}
+
+
+def _upsert(records, record_model=AppointmentRecord):
+    record_model.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=['source', 'source_id'],
+        update_fields=RECORD_FIELDS
+    )
+
+
+def sync_record(instance):
+    """Upsert the record of one saved appointment"""
+    source = SOURCES[instance._meta.label]
+    row = source.get_model().objects.filter(pk=instance.pk).values(*source.lookups).first()
+    if row is not None:
+        _upsert([source.to_record(row)])
+
+
+def delete_record(instance):
+    source = SOURCES[instance._meta.label]
+    AppointmentRecord.objects.filter(source=source.name, source_id=instance.pk).delete()
+
+
+def rebuild_records(source_name, batch_size=REBUILD_BATCH_SIZE, apps=global_apps):
+    """
+    Rebuild the records of one source table.
+    
+    Rows are read with ``values()`` and upserted ``batch_size`` at a time;
+    records whose appointment no longer exists are deleted afterwards.
+    ``apps`` is the app registry to take the models from, the historical
+    one when run from a migration. Returns ``(upserted, deleted)``.
+    """
+    source = SOURCES_BY_NAME[source_name]
+    model = source.get_model(apps)
+    record_model = apps.get_model('appointments', 'AppointmentRecord')
+    rows = model.objects.order_by('pk').values(*source.lookups)
+    
+    upserted = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(source.to_record(row, record_model))
+        if len(batch) >= batch_size:
+            _upsert(batch, record_model)
+            upserted += len(batch)
+            batch = []
+    if batch:
+        _upsert(batch, record_model)
+        upserted += len(batch)
+    
+    deleted, _ = record_model.objects.filter(source=source.name).exclude(
+        source_id__in=model.objects.values('pk')
+    ).delete()
+    
+    logger.info(f"Rebuilt {upserted} {source.name} appointment records, removed {deleted}")
+    return upserted, deleted
@@ -131,11 +131,19 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = [
-            'doctor', 'patient', 'service', 'appointment_date', 'appointment_time',
+            'doctor', 'patient', 'time_slot', 'service', 'appointment_date', 'appointment_time',
             'duration_minutes', 'appointment_type', 'reason_for_visit', 'symptoms',
             'chief_complaint', 'notes', 'booking_method', 'available_slots'
         ]
     
+    def validate(self, data):
+        time_slot = data.get('time_slot')
+        if time_slot and time_slot.doctor_id != data['doctor'].pk:
+            raise serializers.ValidationError({
+                'time_slot': 'This time slot belongs to another doctor'
+            })
+        return data
+    
     def get_available_slots(self, obj):
         """Get available time slots for the selected doctor and date"""
         request = self.context.get('request')
@@ -305,6 +313,42 @@ class DoctorAvailabilitySerializer(serializers.Serializer):
         return value
 
 
+class SlotSearchSerializer(serializers.Serializer):
+    """Query parameters for the earliest-slot search"""
+    specialty = serializers.CharField(required=False)
+    moze = serializers.IntegerField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    time_from = serializers.TimeField(required=False)
+    time_to = serializers.TimeField(required=False)
+    limit = serializers.IntegerField(default=10, min_value=1, max_value=50)
+    
+    def validate(self, data):
+        if data.get('date_from') and data.get('date_to') and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_to must be on or after date_from")
+        if data.get('time_from') and data.get('time_to') and data['time_from'] >= data['time_to']:
+            raise serializers.ValidationError("time_to must be after time_from")
+        return data
+
+
+class CalendarFeedSerializer(serializers.Serializer):
+    """Query parameters for the iCalendar feeds"""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    
+    MAX_RANGE_DAYS = 3 * 366
+    
+    def validate(self, data):
+        today = timezone.now().date()
+        data.setdefault('date_from', today - timedelta(days=30))
+        data.setdefault('date_to', data['date_from'] + timedelta(days=395))
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_to must be on or after date_from")
+        if (data['date_to'] - data['date_from']).days > self.MAX_RANGE_DAYS:
+            raise serializers.ValidationError(f"The feed can cover at most {self.MAX_RANGE_DAYS} days")
+        return data
+
+
 class BulkTimeSlotSerializer(serializers.Serializer):
     """Serializer for creating multiple time slots"""
     doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all())
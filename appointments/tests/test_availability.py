@@ -0,0 +1,283 @@
+"""
+Tests for the slot availability engine
+"""
+import random
+from datetime import date, time, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from appointments.models import Appointment, AppointmentStatus, TimeSlot
+from appointments.utils import AppointmentScheduler, AvailableSlot, DaySchedule
+from doctordirectory.models import Doctor, Patient
+from moze.models import Moze, MozeSettings
+
+User = get_user_model()
+
+
+class SlotAvailabilityTest(TestCase):
+    """Test single-query availability lookups"""
+    
+    def setUp(self):
+        self.doctor = Doctor.objects.create(name='Dr. Availability', specialty='General Medicine')
+        patient_user = User.objects.create_user(
+            username='availability_patient', email='patient@test.com', password='test123', role='student'
+        )
+        self.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1), gender='male')
+        self.start = timezone.now().date() + timedelta(days=1)
+        
+        for day in range(3):
+            for hour in (9, 10, 11):
+                TimeSlot.objects.create(
+                    doctor=self.doctor,
+                    date=self.start + timedelta(days=day),
+                    start_time=time(hour, 0),
+                    end_time=time(hour, 30),
+                    max_appointments=2
+                )
+    
+    def _book(self, slot_date, slot_time, status=AppointmentStatus.CONFIRMED):
+        return Appointment.objects.create(
+            doctor=self.doctor,
+            patient=self.patient,
+            appointment_date=slot_date,
+            appointment_time=slot_time,
+            status=status,
+            reason_for_visit='Checkup'
+        )
+    
+    def test_range_lookup_is_a_single_query(self):
+        self._book(self.start, time(9, 0))
+        self._book(self.start, time(9, 15))
+        self._book(self.start, time(10, 0))
+        self._book(self.start, time(10, 10), status=AppointmentStatus.CANCELLED)
+        
+        with self.assertNumQueries(1):
+            slots = AppointmentScheduler.get_availability(self.doctor, self.start, self.start + timedelta(days=2))
+        
+        # 9:00 on the first day is full; cancelled appointments free capacity
+        self.assertEqual(len(slots), 8)
+        self.assertIsInstance(slots[0], AvailableSlot)
+        self.assertEqual((slots[0].date, slots[0].start_time, slots[0].available_count), (self.start, time(10, 0), 1))
+        self.assertEqual(slots[1].available_count, 2)
+        self.assertEqual(slots[-1].date, self.start + timedelta(days=2))
+    
+    def test_availability_matches_slot_capacity(self):
+        slot = TimeSlot.objects.create(
+            doctor=self.doctor, date=self.start, start_time=time(14, 0), end_time=time(14, 30), max_appointments=3
+        )
+        for status in (AppointmentStatus.PENDING, AppointmentStatus.CONFIRMED):
+            appointment = self._book(self.start, time(14, 0), status=status)
+            appointment.time_slot = slot
+            appointment.save()
+        
+        slots = AppointmentScheduler.get_availability(self.doctor, self.start)
+        slot.refresh_from_db()
+        
+        self.assertEqual(slots[-1].available_count, 1)
+        self.assertEqual(slot.max_appointments - slot.current_appointments, 1)
+    
+    def test_duration_filter_and_past_dates(self):
+        TimeSlot.objects.create(
+            doctor=self.doctor,
+            date=timezone.now().date() - timedelta(days=1),
+            start_time=time(9, 0),
+            end_time=time(10, 0)
+        )
+        slots = AppointmentScheduler.get_availability(
+            self.doctor, timezone.now().date() - timedelta(days=1), self.start, duration_minutes=45
+        )
+        self.assertEqual(slots, [])
+    
+    def test_get_available_slots_keeps_its_shape(self):
+        self._book(self.start, time(11, 0))
+        
+        with self.assertNumQueries(1):
+            available = AppointmentScheduler.get_available_slots(self.doctor, self.start)
+        
+        self.assertEqual([entry['slot'].start_time for entry in available], [time(9, 0), time(10, 0), time(11, 0)])
+        self.assertEqual([entry['available_count'] for entry in available], [2, 2, 1])
+
+
+class EarliestSlotSearchTest(TestCase):
+    """Test the cross-doctor earliest-slot search"""
+    
+    def setUp(self):
+        aamil = User.objects.create_user(username='search_aamil', email='aamil@test.com', password='test123', role='aamil')
+        self.moze = Moze.objects.create(name='Search Moze', location='Mumbai', aamil=aamil)
+        self.cardiologist = Doctor.objects.create(name='Dr. Heart', specialty='Cardiology', assigned_moze=self.moze)
+        self.other_cardiologist = Doctor.objects.create(name='Dr. Pulse', specialty='Cardiology')
+        self.dentist = Doctor.objects.create(name='Dr. Tooth', specialty='Dentistry', assigned_moze=self.moze)
+        patient_user = User.objects.create_user(
+            username='search_patient', email='search@test.com', password='test123', role='student'
+        )
+        self.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1), gender='female')
+        self.start = timezone.now().date() + timedelta(days=1)
+        
+        for doctor, day, hour in [
+            (self.cardiologist, 0, 9), (self.cardiologist, 0, 14), (self.cardiologist, 2, 9),
+            (self.other_cardiologist, 1, 8), (self.other_cardiologist, 0, 11),
+            (self.dentist, 0, 8),
+        ]:
+            TimeSlot.objects.create(
+                doctor=doctor,
+                date=self.start + timedelta(days=day),
+                start_time=time(hour, 0),
+                end_time=time(hour, 30)
+            )
+        
+        # The earliest cardiology slot is already taken
+        Appointment.objects.create(
+            doctor=self.cardiologist,
+            patient=self.patient,
+            appointment_date=self.start,
+            appointment_time=time(9, 0),
+            status=AppointmentStatus.SCHEDULED,
+            reason_for_visit='Checkup'
+        )
+    
+    def test_earliest_slots_across_doctors(self):
+        with self.assertNumQueries(1):
+            slots = AppointmentScheduler.find_earliest_slots(limit=3, specialty='cardiology')
+        
+        self.assertEqual(
+            [(slot.doctor.name, slot.date, slot.start_time) for slot in slots],
+            [
+                ('Dr. Pulse', self.start, time(11, 0)),
+                ('Dr. Heart', self.start, time(14, 0)),
+                ('Dr. Pulse', self.start + timedelta(days=1), time(8, 0)),
+            ]
+        )
+    
+    def test_moze_and_time_window_filters(self):
+        slots = AppointmentScheduler.find_earliest_slots(moze=self.moze.pk, time_from=time(8, 30), time_to=time(12, 0))
+        self.assertEqual([(slot.doctor_id, slot.start_time) for slot in slots], [(self.cardiologist.pk, time(9, 0))])
+        self.assertEqual(slots[0].date, self.start + timedelta(days=2))
+    
+    def test_search_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=self.patient.user)
+        
+        response = client.get('/api/appointments/earliest-slots/', {'specialty': 'Cardiology', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0]['doctor_id'], self.other_cardiologist.pk)
+        self.assertEqual(response.data['results'][0]['available_count'], 1)
+        
+        response = client.get('/api/appointments/earliest-slots/', {'time_from': '12:00', 'time_to': '09:00'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecurringSlotGenerationTest(TestCase):
+    """Test set-based recurring slot generation"""
+    
+    def setUp(self):
+        self.doctors = [Doctor.objects.create(name=f'Dr. Slot {i}', specialty='General Medicine') for i in range(3)]
+        self.start = timezone.now().date() + timedelta(days=1)
+        self.config = [
+            {'start_time': time(9, 0), 'end_time': time(9, 30), 'max_appointments': 2},
+            {'start_time': '09:30', 'end_time': '10:00'},
+        ]
+    
+    def test_generation_skips_existing_slots_in_constant_queries(self):
+        TimeSlot.objects.create(doctor=self.doctors[0], date=self.start, start_time=time(9, 0), end_time=time(9, 30))
+        schedules = [(doctor, self.config, None) for doctor in self.doctors]
+        
+        with self.assertNumQueries(2):
+            created = AppointmentScheduler.generate_recurring_slots(schedules, self.start, self.start + timedelta(days=9))
+        
+        self.assertEqual(len(created), 3 * 10 * 2 - 1)
+        self.assertEqual(TimeSlot.objects.count(), 60)
+        self.assertEqual(TimeSlot.objects.filter(start_time=time(9, 30), max_appointments=1).count(), 30)
+        
+        # Running again creates nothing
+        self.assertEqual(AppointmentScheduler.generate_recurring_slots(schedules, self.start, self.start + timedelta(days=9)), [])
+    
+    def test_create_recurring_slots_honours_weekdays(self):
+        created = AppointmentScheduler.create_recurring_slots(
+            self.doctors[0], self.start, self.start + timedelta(days=6), self.config, weekdays=[0, 2]
+        )
+        self.assertEqual(len(created), 4)
+        self.assertTrue(all(slot.date.weekday() in (0, 2) for slot in created))
+        self.assertEqual(set(TimeSlot.objects.values_list('recurring_days', flat=True)), {'0,2'})
+    
+    def test_generate_time_slots_command(self):
+        aamil = User.objects.create_user(username='slot_aamil', email='slot_aamil@test.com', password='test123', role='aamil')
+        moze = Moze.objects.create(name='Slot Moze', location='Pune', aamil=aamil)
+        MozeSettings.objects.create(
+            moze=moze, working_hours_start=time(10, 0), working_hours_end=time(12, 0),
+            appointment_duration=60, working_days=[0, 1, 2, 3, 4, 5, 6]
+        )
+        self.doctors[1].assigned_moze = moze
+        self.doctors[1].save()
+        
+        out = StringIO()
+        call_command(
+            'generate_time_slots', '--days', '7', '--start-date', self.start.isoformat(),
+            '--start-time', '09:00', '--end-time', '11:00', '--weekdays', '0,1,2,3,4,5,6',
+            '--batch-size', '2', stdout=out
+        )
+        
+        self.assertIn('Created 70 time slots for 3 doctors', out.getvalue())
+        self.assertEqual(TimeSlot.objects.filter(doctor=self.doctors[0]).count(), 28)
+        moze_slots = TimeSlot.objects.filter(doctor=self.doctors[1])
+        self.assertEqual(moze_slots.count(), 14)
+        self.assertEqual(set(moze_slots.values_list('start_time', flat=True)), {time(10, 0), time(11, 0)})
+
+
+class DayScheduleTest(TestCase):
+    """Test interval-based overlap and capacity checks"""
+    
+    def test_overlap_counts_respect_durations(self):
+        # 9:00-9:45, 9:30-9:45 and 10:00-11:00
+        schedule = DaySchedule([(540, 720, 2)], [(540, 585), (570, 585), (600, 660)])
+        
+        self.assertEqual(schedule.count_overlapping(585, 600), 0)
+        self.assertEqual(schedule.count_overlapping(575, 590), 2)
+        self.assertEqual(schedule.count_overlapping(590, 610), 1)
+        self.assertEqual(schedule.check(time(9, 45), 15), (True, "Doctor is available"))
+        self.assertEqual(schedule.check(time(9, 30), 30), (False, "Doctor is fully booked for this time"))
+        # A late start that used to be blocked by every earlier appointment
+        self.assertTrue(schedule.check(time(11, 0), 30)[0])
+        self.assertEqual(schedule.check(time(11, 45), 30), (False, "No available time slot for this period"))
+    
+    def test_matches_brute_force(self):
+        rng = random.Random(35)
+        appointments = []
+        for _ in range(200):
+            start = rng.randrange(480, 1020)
+            appointments.append((start, start + rng.choice([15, 30, 45, 60, 90])))
+        schedule = DaySchedule([(480, 600, 3), (600, 780, 4), (840, 1080, 5)], appointments)
+        
+        for _ in range(500):
+            start = rng.randrange(450, 1100)
+            end = start + rng.choice([15, 30, 60])
+            expected = sum(1 for a_start, a_end in appointments if a_start < end and a_end > start)
+            self.assertEqual(schedule.count_overlapping(start, end), expected)
+    
+    def test_batch_check_loads_the_day_once(self):
+        doctor = Doctor.objects.create(name='Dr. Intervals')
+        patient_user = User.objects.create_user(
+            username='interval_patient', email='interval@test.com', password='test123', role='student'
+        )
+        patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1), gender='male')
+        day = timezone.now().date() + timedelta(days=1)
+        TimeSlot.objects.create(doctor=doctor, date=day, start_time=time(9, 0), end_time=time(12, 0))
+        Appointment.objects.create(
+            doctor=doctor, patient=patient, appointment_date=day, appointment_time=time(9, 30),
+            duration_minutes=60, status=AppointmentStatus.CONFIRMED, reason_for_visit='Long visit'
+        )
+        
+        candidates = [(time(9, 0), 30), (time(9, 0), 45), (time(10, 15), 30), (time(10, 30), 30), (time(11, 45), 30)]
+        with self.assertNumQueries(2):
+            results = AppointmentScheduler.check_doctor_availability_batch(doctor, day, candidates)
+        
+        self.assertEqual([available for available, _ in results], [True, False, False, True, False])
+        self.assertEqual(
+            AppointmentScheduler.check_doctor_availability(doctor, day, time(10, 30), 30),
+            (True, "Doctor is available")
+        )
@@ -0,0 +1,139 @@
+"""
+Tests for concurrency-safe slot booking
+"""
+import threading
+from datetime import date, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from appointments.models import Appointment, AppointmentStatus, TimeSlot
+from appointments.utils import AppointmentScheduler
+from doctordirectory.models import Doctor, Patient
+
+User = get_user_model()
+
+
+def create_patient(username):
+    user = User.objects.create_user(username=username, email=f'{username}@test.com', password='test123', role='student')
+    return Patient.objects.create(user=user, date_of_birth=date(1990, 1, 1), gender='male')
+
+
+class SlotBookingTest(TestCase):
+    """Test slot capacity bookkeeping on booking, editing and cancelling"""
+    
+    def setUp(self):
+        self.doctor = Doctor.objects.create(name='Dr. Booking')
+        self.patient = create_patient('booking_patient')
+        self.slot = TimeSlot.objects.create(
+            doctor=self.doctor,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0),
+            end_time=time(10, 0),
+            max_appointments=2
+        )
+    
+    def test_booking_fills_slot_and_rejects_overbooking(self):
+        AppointmentScheduler.book_slot(self.slot, self.patient, reason_for_visit='First')
+        AppointmentScheduler.book_slot(self.slot, self.patient, appointment_time=time(9, 30), reason_for_visit='Second')
+        
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.current_appointments, 2)
+        self.assertTrue(self.slot.is_booked)
+        
+        with self.assertRaises(ValidationError):
+            AppointmentScheduler.book_slot(self.slot, self.patient, reason_for_visit='Third')
+        self.assertEqual(Appointment.objects.count(), 2)
+    
+    def test_unrelated_edits_do_not_touch_the_slot(self):
+        appointment = AppointmentScheduler.book_slot(self.slot, self.patient, reason_for_visit='Checkup')
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        
+        appointment.notes = 'Bring reports'
+        with CaptureQueriesContext(connection) as queries:
+            appointment.save()
+        self.assertFalse([query for query in queries if 'appointments_timeslot' in query['sql']])
+        
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.current_appointments, 1)
+    
+    def test_cancellation_releases_capacity_once(self):
+        appointment = AppointmentScheduler.book_slot(self.slot, self.patient, reason_for_visit='Checkup')
+        appointment.cancel(reason='Travel')
+        appointment.save()
+        
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.current_appointments, 0)
+        self.assertFalse(self.slot.is_booked)
+        
+        # Re-activating a cancelled appointment takes the capacity again
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.status = AppointmentStatus.SCHEDULED
+        appointment.save()
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.current_appointments, 1)
+    
+    def test_unavailable_slot_cannot_be_booked(self):
+        TimeSlot.objects.filter(pk=self.slot.pk).update(is_available=False)
+        self.assertFalse(TimeSlot.reserve(self.slot.pk))
+        self.assertFalse(TimeSlot.release(self.slot.pk))
+
+
+class ConcurrentBookingTest(TransactionTestCase):
+    """Stress slot booking from many threads at once"""
+    
+    THREADS = 8
+    ATTEMPTS_PER_THREAD = 10
+    CAPACITY = 5
+    
+    def setUp(self):
+        self.doctor = Doctor.objects.create(name='Dr. Busy')
+        self.patients = [create_patient(f'busy_patient_{i}') for i in range(self.THREADS)]
+        self.slot = TimeSlot.objects.create(
+            doctor=self.doctor,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(9, 0),
+            end_time=time(12, 0),
+            max_appointments=self.CAPACITY
+        )
+    
+    def _book_repeatedly(self, patient, outcomes):
+        slot = TimeSlot.objects.get(pk=self.slot.pk)
+        self.barrier.wait()
+        try:
+            for attempt in range(self.ATTEMPTS_PER_THREAD):
+                while True:
+                    try:
+                        AppointmentScheduler.book_slot(slot, patient, reason_for_visit=f'Attempt {attempt}')
+                        outcomes.append('booked')
+                    except ValidationError:
+                        outcomes.append('full')
+                    except OperationalError:
+                        # SQLite serialises writers; retry when the database is locked
+                        continue
+                    break
+        finally:
+            connection.close()
+    
+    def test_concurrent_bookings_never_overbook(self):
+        outcomes = []
+        self.barrier = threading.Barrier(self.THREADS)
+        threads = [
+            threading.Thread(target=self._book_repeatedly, args=(patient, outcomes))
+            for patient in self.patients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.slot.refresh_from_db()
+        self.assertEqual(outcomes.count('booked'), self.CAPACITY)
+        self.assertEqual(outcomes.count('full'), self.THREADS * self.ATTEMPTS_PER_THREAD - self.CAPACITY)
+        self.assertEqual(self.slot.current_appointments, self.CAPACITY)
+        self.assertEqual(Appointment.objects.filter(time_slot=self.slot).count(), self.CAPACITY)
+        self.assertTrue(self.slot.is_booked)
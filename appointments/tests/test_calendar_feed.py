@@ -0,0 +1,118 @@
+"""
+Tests for the iCalendar appointment feeds
+"""
+from datetime import date, time, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from appointments.ical import AppointmentFeed, fold_line
+from appointments.models import Appointment
+from doctordirectory.models import Doctor, Patient
+
+User = get_user_model()
+
+
+class CalendarFeedTest(TestCase):
+    """Test ETag validation, caching and content of the .ics feeds"""
+    
+    def setUp(self):
+        cache.clear()
+        self.doctor_user = User.objects.create_user(
+            username='feed_doctor', email='doctor@test.com', password='test123',
+            role='doctor', first_name='Hasan', last_name='Ali'
+        )
+        self.doctor = Doctor.objects.create(name='Dr. Feed', user=self.doctor_user, address='Clinic 1, Burhani Road')
+        patient_user = User.objects.create_user(
+            username='feed_patient', email='patient@test.com', password='test123',
+            role='student', first_name='Zahra', last_name='Husain'
+        )
+        self.patient = Patient.objects.create(user=patient_user, date_of_birth=date(1990, 1, 1), gender='female')
+        self.day = timezone.now().date() + timedelta(days=2)
+        self.appointments = [
+            Appointment.objects.create(
+                doctor=self.doctor,
+                patient=self.patient,
+                appointment_date=self.day,
+                appointment_time=time(9 + i, 0),
+                reason_for_visit=f'Follow up; visit {i}'
+            )
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.doctor_user)
+        self.url = reverse('appointments:doctor-calendar-feed', args=[self.doctor.pk])
+    
+    def test_feed_lists_appointments(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+        self.assertIn(f'UID:{self.appointments[0].appointment_id}@umoor-sehhat', body)
+        self.assertIn('SUMMARY:Appointment with Zahra Husain', body)
+        self.assertIn('Follow up\\; visit 0', body)
+        self.assertIn('LOCATION:Clinic 1\\, Burhani Road', body)
+    
+    def test_unchanged_feed_answers_304_with_one_query(self):
+        etag = self.client.get(self.url)['ETag']
+        
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_changes_invalidate_etag(self):
+        first = self.client.get(self.url)
+        b''.join(first.streaming_content)
+        
+        # A second full request is served from the cache
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached['ETag'], first['ETag'])
+        
+        self.appointments[0].cancel(reason='Travel')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertIn('STATUS:CANCELLED', b''.join(response.streaming_content).decode())
+        
+        etag = response['ETag']
+        self.appointments[1].delete()
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+    
+    def test_patient_feed_is_private(self):
+        url = reverse('appointments:patient-calendar-feed', args=[self.patient.pk])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        
+        self.client.force_authenticate(user=self.patient.user)
+        response = self.client.get(url, {'date_from': self.day, 'date_to': self.day})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Appointment with Dr. Hasan Ali', b''.join(response.streaming_content).decode())
+        
+        self.assertEqual(self.client.get(url, {'date_from': self.day, 'date_to': self.day - timedelta(days=1)}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('appointments:patient-calendar-feed', args=[self.patient.pk + 100])).status_code, 404
+        )
+    
+    def test_large_feeds_stream_without_caching(self):
+        feed = AppointmentFeed('doctor', self.doctor.pk, self.day, self.day)
+        etag = feed.etag()
+        with mock.patch('appointments.ical.ICAL_CACHE_MAX_BYTES', 100):
+            chunks = list(feed.stream(etag))
+        self.assertTrue(b''.join(chunks).endswith(b'END:VCALENDAR\r\n'))
+        self.assertIsNone(feed.cached_body(etag))
+    
+    def test_fold_line(self):
+        line = 'DESCRIPTION:' + 'é' * 80
+        folded = fold_line(line)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in folded.split('\r\n')))
+        self.assertEqual(folded.replace('\r\n ', '').rstrip('\r\n'), line)
@@ -0,0 +1,129 @@
+"""
+Tests for the denormalised appointment read model
+"""
+from datetime import date, time, timedelta
+from importlib import import_module
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count
+from django.test import TestCase
+from django.utils import timezone
+
+from appointments.models import Appointment, AppointmentRecord
+from doctordirectory.models import Appointment as DirectoryAppointment, Doctor, Patient
+from mahalshifa.models import (
+    Appointment as MahalShifaAppointment, Department, Doctor as MahalShifaDoctor,
+    Hospital, Patient as MahalShifaPatient
+)
+from moze.models import Moze
+
+User = get_user_model()
+
+
+class AppointmentRecordTest(TestCase):
+    """Test that every appointment table is mirrored into AppointmentRecord"""
+    
+    def setUp(self):
+        self.today = timezone.now().date()
+        aamil = User.objects.create_user(username='record_aamil', password='test123', role='aamil')
+        self.moze = Moze.objects.create(name='Record Moze', location='Colombo', aamil=aamil)
+        
+        self.doctor_user = User.objects.create_user(
+            username='record_doctor', password='test123', role='doctor', first_name='Hasan', last_name='Ali'
+        )
+        self.doctor = Doctor.objects.create(name='Dr. Record', user=self.doctor_user, assigned_moze=self.moze)
+        self.patient_user = User.objects.create_user(
+            username='record_patient', password='test123', role='student', first_name='Zahra', last_name='Husain'
+        )
+        self.patient = Patient.objects.create(user=self.patient_user, date_of_birth=date(1990, 1, 1), gender='female')
+        
+        hospital = Hospital.objects.create(
+            name='Record Hospital', address='Main Road', phone='123', email='hospital@test.com', hospital_type='general'
+        )
+        department = Department.objects.create(hospital=hospital, name='General', head=self.doctor_user)
+        self.shifa_doctor = MahalShifaDoctor.objects.create(
+            user=self.doctor_user, license_number='LIC1', specialization='General', qualification='MBBS',
+            hospital=hospital, department=department
+        )
+        self.shifa_patient = MahalShifaPatient.objects.create(
+            its_id='12345678', first_name='Musa', last_name='Kazim', date_of_birth=date(1985, 5, 5),
+            gender='male', registered_moze=self.moze
+        )
+    
+    def create_all_sources(self):
+        appointment = Appointment.objects.create(
+            doctor=self.doctor, patient=self.patient, appointment_date=self.today,
+            appointment_time=time(9, 0), reason_for_visit='Checkup'
+        )
+        directory = DirectoryAppointment.objects.create(
+            doctor=self.doctor, patient=self.patient, appointment_date=self.today, appointment_time=time(10, 0)
+        )
+        shifa = MahalShifaAppointment.objects.create(
+            doctor=self.shifa_doctor, patient=self.shifa_patient, moze=self.moze,
+            appointment_date=self.today + timedelta(days=1), appointment_time=time(11, 0), reason='Fever'
+        )
+        return appointment, directory, shifa
+    
+    def test_signals_mirror_all_sources(self):
+        appointment, directory, shifa = self.create_all_sources()
+        
+        records = {record.source: record for record in AppointmentRecord.objects.all()}
+        self.assertEqual(set(records), {'appointments', 'doctordirectory', 'mahalshifa'})
+        self.assertEqual(records['appointments'].source_id, appointment.pk)
+        self.assertEqual(records['appointments'].doctor_name, 'Hasan Ali')
+        self.assertEqual(records['appointments'].patient_name, 'Zahra Husain')
+        self.assertEqual(records['doctordirectory'].moze, self.moze)
+        self.assertEqual(records['mahalshifa'].patient_name, 'Musa Kazim')
+        self.assertEqual(records['mahalshifa'].doctor_user, self.doctor_user)
+        
+        appointment.cancel(reason='Travel')
+        self.assertEqual(AppointmentRecord.objects.get(source='appointments').status, 'cancelled')
+        
+        shifa.delete()
+        self.assertFalse(AppointmentRecord.objects.filter(source='mahalshifa').exists())
+    
+    def test_cross_app_query_uses_one_table(self):
+        self.create_all_sources()
+        
+        with self.assertNumQueries(1):
+            per_source = dict(
+                AppointmentRecord.objects.filter(doctor_user=self.doctor_user)
+                .values_list('source').annotate(total=Count('pk'))
+            )
+        self.assertEqual(per_source, {'appointments': 1, 'doctordirectory': 1, 'mahalshifa': 1})
+    
+    def test_rebuild_command_repairs_drift(self):
+        appointment, directory, shifa = self.create_all_sources()
+        
+        # Bulk updates and deletes bypass the signals
+        DirectoryAppointment.objects.filter(pk=directory.pk).update(status='completed')
+        AppointmentRecord.objects.filter(source='mahalshifa').delete()
+        AppointmentRecord.objects.create(
+            source='appointments', source_id=appointment.pk + 1000,
+            appointment_date=self.today, appointment_time=time(8, 0), status='scheduled'
+        )
+        
+        out = StringIO()
+        call_command('rebuild_appointment_records', '--batch-size', '1', stdout=out)
+        
+        self.assertIn('appointments: 1 records rebuilt, 1 stale records removed', out.getvalue())
+        self.assertEqual(AppointmentRecord.objects.count(), 3)
+        self.assertEqual(AppointmentRecord.objects.get(source='doctordirectory').status, 'completed')
+        self.assertTrue(AppointmentRecord.objects.filter(source='mahalshifa', source_id=shifa.pk).exists())
+    
+    def test_migration_backfills_existing_appointments(self):
+        self.create_all_sources()
+        AppointmentRecord.objects.all().delete()
+        
+        migration = ('appointments', '0006_backfill_appointmentrecord')
+        state = MigrationExecutor(connection).loader.project_state(migration)
+        import_module(f'appointments.migrations.{migration[1]}').backfill_appointment_records(state.apps, None)
+        
+        self.assertEqual(
+            set(AppointmentRecord.objects.values_list('source', 'doctor_user')),
+            {(source, self.doctor_user.pk) for source in ['appointments', 'doctordirectory', 'mahalshifa']}
+        )
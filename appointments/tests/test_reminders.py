@@ -0,0 +1,226 @@
+"""
+Tests for the batched reminder dispatcher
+"""
+import threading
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from appointments.models import Appointment, AppointmentReminder, AppointmentStatus
+from appointments.utils import AppointmentRemindersProcessor, ReminderDispatcher, ReminderPolicy
+from doctordirectory.models import Doctor, Patient
+
+User = get_user_model()
+
+
+def create_due_reminders(count, reminder_type='email'):
+    doctor = Doctor.objects.create(name='Dr. Reminder')
+    now = timezone.now()
+    reminders = []
+    for i in range(count):
+        user = User.objects.create_user(
+            username=f'reminder_patient_{i}', email=f'patient{i}@test.com', password='test123', role='student'
+        )
+        patient = Patient.objects.create(user=user, date_of_birth=date(1990, 1, 1), gender='male')
+        appointment = Appointment.objects.create(
+            doctor=doctor,
+            patient=patient,
+            appointment_date=now.date() + timedelta(days=1),
+            appointment_time=time(9, 0),
+            reason_for_visit='Checkup'
+        )
+        reminders.append(AppointmentReminder(
+            appointment=appointment,
+            reminder_type=reminder_type,
+            scheduled_for=now - timedelta(minutes=5)
+        ))
+    return AppointmentReminder.objects.bulk_create(reminders)
+
+
+class ReminderDispatcherTest(TestCase):
+    """Test claiming, sending and recording reminder batches"""
+    
+    def test_workers_claim_disjoint_batches(self):
+        create_due_reminders(10)
+        workers = [ReminderDispatcher(batch_size=4) for _ in range(3)]
+        
+        # Every worker claims before any of them sends
+        batches = [worker.claim_batch() for worker in workers]
+        claimed = [{reminder.pk for reminder in batch} for batch in batches]
+        
+        self.assertEqual([len(ids) for ids in claimed], [4, 4, 2])
+        self.assertEqual(len(set.union(*claimed)), 10)
+        self.assertEqual(ReminderDispatcher(batch_size=4).claim_batch(), [])
+        
+        for worker, batch in zip(workers, batches):
+            worker.dispatch_batch(batch)
+        
+        self.assertEqual(len(mail.outbox), 10)
+        self.assertEqual(len({message.to[0] for message in mail.outbox}), 10)
+        self.assertEqual(AppointmentReminder.objects.filter(status='sent', is_sent=True).count(), 10)
+        self.assertEqual(Appointment.objects.filter(reminder_sent=True).count(), 10)
+    
+    def test_one_connection_per_batch(self):
+        create_due_reminders(6)
+        with mock.patch('appointments.utils.get_connection', wraps=mail.get_connection) as get_connection:
+            sent, failed = ReminderDispatcher(batch_size=3).run()
+        
+        self.assertEqual((sent, failed), (6, 0))
+        self.assertEqual(get_connection.call_count, 2)
+        self.assertIn('Appointment Reminder', mail.outbox[0].subject)
+    
+    def test_stale_claims_are_reclaimed(self):
+        create_due_reminders(3)
+        abandoned = ReminderDispatcher(batch_size=3, lease_seconds=60).claim_batch()
+        self.assertEqual(len(abandoned), 3)
+        self.assertEqual(ReminderDispatcher(lease_seconds=60).claim_batch(), [])
+        
+        AppointmentReminder.objects.update(claimed_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(ReminderDispatcher(lease_seconds=60).run(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+    
+    def test_cancelled_and_unsupported_reminders(self):
+        email_reminders = create_due_reminders(2)
+        Appointment.objects.filter(pk=email_reminders[0].appointment_id).update(status=AppointmentStatus.CANCELLED)
+        sms = AppointmentReminder.objects.create(
+            appointment=email_reminders[1].appointment,
+            reminder_type='sms',
+            scheduled_for=timezone.now() - timedelta(minutes=1)
+        )
+        
+        self.assertEqual(AppointmentRemindersProcessor.process_pending_reminders(), (1, 1))
+        self.assertEqual(AppointmentReminder.objects.get(pk=email_reminders[0].pk).status, 'cancelled')
+        self.assertEqual(AppointmentReminder.objects.get(pk=sms.pk).status, 'failed')
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_failed_send_marks_batch_failed(self):
+        create_due_reminders(2)
+        with mock.patch('appointments.utils.get_connection') as get_connection:
+            get_connection.return_value.send_messages.side_effect = ConnectionError('SMTP down')
+            self.assertEqual(ReminderDispatcher().run(), (0, 2))
+        
+        self.assertEqual(
+            list(AppointmentReminder.objects.values_list('status', 'error_message', 'claim_token')),
+            [('failed', 'SMTP down', '')] * 2
+        )
+    
+    def test_dispatch_reminders_command(self):
+        create_due_reminders(3)
+        call_command('dispatch_reminders', '--batch-size', '2', stdout=mock.MagicMock())
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class ReminderPolicyTest(TestCase):
+    """Test bulk scheduling of default reminders"""
+    
+    def setUp(self):
+        self.doctor = Doctor.objects.create(name='Dr. Policy')
+        user = User.objects.create_user(username='policy_patient', email='policy@test.com', password='test123', role='student')
+        self.patient = Patient.objects.create(user=user, date_of_birth=date(1990, 1, 1), gender='male')
+        self.in_two_days = timezone.now().date() + timedelta(days=2)
+    
+    def create_appointments(self, count, appointment_date=None):
+        return Appointment.objects.bulk_create([
+            Appointment(
+                doctor=self.doctor,
+                patient=self.patient,
+                appointment_date=appointment_date or self.in_two_days,
+                appointment_time=time(9 + i % 8, 0),
+                reason_for_visit='Checkup'
+            )
+            for i in range(count)
+        ])
+    
+    def test_offsets_per_channel(self):
+        appointment = self.create_appointments(1)[0]
+        start = timezone.make_aware(datetime.combine(appointment.appointment_date, appointment.appointment_time))
+        policy = ReminderPolicy({'email': [48, 24], 'whatsapp': [1]})
+        # Offsets that have already passed are skipped
+        reminders = policy.schedule([appointment], now=start - timedelta(hours=30))
+        
+        self.assertEqual(
+            sorted((reminder.reminder_type, start - reminder.scheduled_for) for reminder in reminders),
+            [('email', timedelta(hours=24)), ('whatsapp', timedelta(hours=1))]
+        )
+    
+    def test_bulk_schedule_dedupes_against_existing(self):
+        appointments = self.create_appointments(30)
+        AppointmentRemindersProcessor.schedule_default_reminders(appointments[0])
+        
+        policy = ReminderPolicy(batch_size=10)
+        with self.assertNumQueries(6):
+            created = policy.schedule(appointments)
+        self.assertEqual(len(created), 58)
+        self.assertEqual(policy.schedule(appointments), [])
+        self.assertEqual(AppointmentReminder.objects.count(), 60)
+    
+    def test_unknown_channel_rejected(self):
+        with self.assertRaises(ValueError):
+            ReminderPolicy({'pigeon': [1]})
+    
+    @override_settings(APPOINTMENT_REMINDER_OFFSETS={'email': [72, 24]})
+    def test_backfill_command_applies_settings_policy(self):
+        self.create_appointments(5, self.in_two_days + timedelta(days=5))
+        past = self.create_appointments(2, timezone.now().date() - timedelta(days=3))
+        cancelled = self.create_appointments(1)[0]
+        Appointment.objects.filter(pk=cancelled.pk).update(status=AppointmentStatus.CANCELLED)
+        
+        call_command('backfill_reminders', '--batch-size', '2', stdout=mock.MagicMock())
+        self.assertEqual(AppointmentReminder.objects.count(), 10)
+        self.assertFalse(AppointmentReminder.objects.filter(appointment__in=past + [cancelled]).exists())
+        
+        call_command('backfill_reminders', stdout=mock.MagicMock())
+        self.assertEqual(AppointmentReminder.objects.count(), 10)
+
+
+class ConcurrentReminderDispatchTest(TransactionTestCase):
+    """Run several dispatcher workers in parallel threads"""
+    
+    WORKERS = 4
+    REMINDERS = 40
+    
+    def _work(self, sent_counts):
+        dispatcher = ReminderDispatcher(batch_size=5)
+        self.barrier.wait()
+        sent = 0
+        try:
+            while True:
+                try:
+                    batch = dispatcher.claim_batch()
+                except OperationalError:
+                    # SQLite serialises writers; retry when the database is locked
+                    continue
+                if not batch:
+                    break
+                dispatcher.send_batch(batch)
+                while True:
+                    try:
+                        sent += dispatcher.record_batch(batch)[0]
+                    except OperationalError:
+                        continue
+                    break
+        finally:
+            sent_counts.append(sent)
+            connection.close()
+    
+    def test_parallel_workers_send_each_reminder_once(self):
+        create_due_reminders(self.REMINDERS)
+        sent_counts = []
+        self.barrier = threading.Barrier(self.WORKERS)
+        threads = [threading.Thread(target=self._work, args=(sent_counts,)) for _ in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(sum(sent_counts), self.REMINDERS)
+        recipients = [message.to[0] for message in mail.outbox]
+        self.assertEqual(len(recipients), self.REMINDERS)
+        self.assertEqual(len(set(recipients)), self.REMINDERS)
+        self.assertEqual(AppointmentReminder.objects.filter(status='sent').count(), self.REMINDERS)
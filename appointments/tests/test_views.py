@@ -218,6 +218,26 @@ class AppointmentAPITest(TestCase):
         self.assertEqual(appointment.booked_by, self.patient_user)
         self.assertEqual(appointment.consultation_fee, Decimal('150.00'))
     
+    def test_create_appointment_in_full_slot(self):
+        """Test booking a fully booked slot is rejected"""
+        TimeSlot.objects.filter(pk=self.time_slot.pk).update(current_appointments=1, max_appointments=1)
+        self.client.force_authenticate(user=self.patient_user)
+        
+        data = {
+            'doctor': self.doctor.id,
+            'patient': self.patient.id,
+            'time_slot': self.time_slot.id,
+            'appointment_date': self.future_date.isoformat(),
+            'appointment_time': '10:00',
+            'reason_for_visit': 'Regular checkup'
+        }
+        
+        response = self.client.post('/api/appointments/appointments/', data)
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('time_slot', response.data)
+        self.assertEqual(Appointment.objects.count(), 0)
+    
     def test_list_appointments_as_patient(self):
         """Test listing appointments as patient"""
         # Create appointments
@@ -0,0 +1,154 @@
+"""
+Tests for the event-driven waiting list matcher
+"""
+from datetime import date, time, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import EmailOutbox, ScheduledJobRun
+from appointments.models import Appointment, TimeSlot, WaitingList
+from appointments.utils import AppointmentScheduler, WaitingListManager, WaitingListMatcher
+from doctordirectory.models import Doctor, Patient
+
+User = get_user_model()
+
+
+def create_patient(username):
+    user = User.objects.create_user(username=username, email=f'{username}@test.com', password='test123', role='student')
+    return Patient.objects.create(user=user, date_of_birth=date(1990, 1, 1), gender='male')
+
+
+class WaitingListMatcherTest(TestCase):
+    """Test offering released appointment time to the waiting list"""
+    
+    def setUp(self):
+        self.doctor = Doctor.objects.create(name='Dr. Waiting')
+        self.day = timezone.now().date() + timedelta(days=3)
+        self.slot = TimeSlot.objects.create(
+            doctor=self.doctor, date=self.day, start_time=time(10, 0), end_time=time(10, 30), max_appointments=1
+        )
+        self.booked_patient = create_patient('booked_patient')
+        self.appointment = AppointmentScheduler.book_slot(self.slot, self.booked_patient, reason_for_visit='Checkup')
+    
+    def add_entry(self, username, priority=5, start=None, end=None, preferred_date=None):
+        return WaitingList.objects.create(
+            patient=create_patient(username),
+            doctor=self.doctor,
+            preferred_date=preferred_date or self.day,
+            preferred_time_start=start,
+            preferred_time_end=end,
+            reason='Waiting',
+            priority=priority
+        )
+    
+    def cancel_appointment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.get(pk=self.appointment.pk).cancel(reason='Travel')
+    
+    def test_cancellation_offers_slot_to_highest_priority_match(self):
+        low = self.add_entry('low_priority', priority=8)
+        high = self.add_entry('high_priority', priority=2, start=time(9, 0), end=time(11, 0))
+        outside_window = self.add_entry('afternoon', priority=1, start=time(14, 0), end=time(17, 0))
+        other_day = self.add_entry('other_day', priority=1, preferred_date=self.day + timedelta(days=1))
+        
+        self.cancel_appointment()
+        
+        high.refresh_from_db()
+        self.assertTrue(high.notified)
+        self.assertEqual(high.offered_slot, self.slot)
+        self.assertGreater(high.offer_expires_at, timezone.now())
+        self.assertFalse(WaitingList.objects.filter(pk__in=[low.pk, outside_window.pk, other_day.pk], notified=True).exists())
+        # The offer is queued for the outbox drainer, not sent while cancelling
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(
+            list(EmailOutbox.objects.values_list('to_emails', 'kind')), [(['high_priority@test.com'], 'waiting_list_offer')]
+        )
+    
+    def test_hold_blocks_other_patients_until_it_lapses(self):
+        entry = self.add_entry('waiting_patient')
+        self.add_entry('next_in_line', priority=6)
+        self.cancel_appointment()
+        
+        with self.assertRaises(ValidationError):
+            AppointmentScheduler.book_slot(self.slot, create_patient('walk_in'), reason_for_visit='Walk in')
+        
+        # Nothing more is offered while the hold is live
+        self.assertEqual(WaitingListMatcher().reoffer_expired_holds(), [])
+        
+        WaitingList.objects.filter(pk=entry.pk).update(offer_expires_at=timezone.now() - timedelta(minutes=1))
+        offers = WaitingListMatcher().reoffer_expired_holds()
+        self.assertEqual([offer.patient.user.username for offer in offers], ['next_in_line'])
+    
+    def test_api_booking_respects_hold(self):
+        self.add_entry('waiting_patient')
+        self.cancel_appointment()
+        walk_in = create_patient('walk_in')
+        client = APIClient()
+        client.force_authenticate(user=walk_in.user)
+        
+        response = client.post('/api/appointments/appointments/', {
+            'doctor': self.doctor.id,
+            'patient': walk_in.id,
+            'time_slot': self.slot.id,
+            'appointment_date': self.day.isoformat(),
+            'appointment_time': '10:00',
+            'reason_for_visit': 'Walk in'
+        })
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['time_slot'], ['This time slot is being held for a waiting list patient'])
+        self.assertFalse(Appointment.objects.filter(patient=walk_in).exists())
+    
+    def test_lapsed_holds_are_reoffered_by_the_scheduled_job(self):
+        entry = self.add_entry('waiting_patient')
+        next_in_line = self.add_entry('next_in_line', priority=6)
+        self.cancel_appointment()
+        WaitingList.objects.filter(pk=entry.pk).update(offer_expires_at=timezone.now() - timedelta(minutes=1))
+        
+        call_command('run_due_jobs', '--job', 'waiting_list_holds', stdout=StringIO())
+        
+        next_in_line.refresh_from_db()
+        self.assertEqual(next_in_line.offered_slot, self.slot)
+        self.assertEqual(ScheduledJobRun.objects.get(job_name='waiting_list_holds').result, 1)
+    
+    def test_holder_can_book_held_slot(self):
+        entry = self.add_entry('waiting_patient')
+        self.cancel_appointment()
+        
+        AppointmentScheduler.book_slot(self.slot, entry.patient, reason_for_visit='From waiting list')
+        entry.refresh_from_db()
+        self.assertFalse(entry.is_active)
+        self.assertEqual(WaitingListMatcher.live_holds(self.slot.pk), [])
+    
+    def test_cancellation_without_slot_offers_time(self):
+        entry = self.add_entry('waiting_patient', start=time(15, 0), end=time(16, 0))
+        appointment = Appointment.objects.create(
+            doctor=self.doctor,
+            patient=self.booked_patient,
+            appointment_date=self.day,
+            appointment_time=time(15, 30),
+            reason_for_visit='Follow up'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.cancel()
+        
+        entry.refresh_from_db()
+        self.assertTrue(entry.notified)
+        self.assertIsNone(entry.offered_slot)
+        self.assertIsNone(entry.offer_expires_at)
+    
+    def test_manager_notifies_matches_in_one_update(self):
+        self.add_entry('in_window', start=time(9, 0), end=time(11, 0))
+        self.add_entry('no_preference')
+        self.add_entry('outside_window', start=time(12, 0), end=time(13, 0))
+        
+        with self.assertNumQueries(2):
+            notified = WaitingListManager.check_and_notify_waiting_list(self.doctor, self.day, self.slot)
+        self.assertEqual(notified, 2)
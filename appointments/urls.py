@@ -13,4 +13,7 @@ app_name = 'appointments'
 urlpatterns = [
     path('', include(router.urls)),
     path('check-availability/', views.DoctorAvailabilityView.as_view(), name='check-availability'),
+    path('earliest-slots/', views.EarliestSlotSearchView.as_view(), name='earliest-slots'),
+    path('calendar/doctor/<int:pk>.ics', views.DoctorCalendarFeedView.as_view(), name='doctor-calendar-feed'),
+    path('calendar/patient/<int:pk>.ics', views.PatientCalendarFeedView.as_view(), name='patient-calendar-feed'),
 ]
\ No newline at end of file
@@ -1,15 +1,66 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.template.loader import render_to_string
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date as date_type, datetime, time, timedelta
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, NamedTuple, Tuple
 import logging
+import uuid
 
-from .models import Appointment, AppointmentReminder, TimeSlot, AppointmentStatus
+from .models import Appointment, AppointmentReminder, TimeSlot, AppointmentStatus, WaitingList
 
 logger = logging.getLogger(__name__)
 
 
+REMINDER_EMAIL_BODY = """
+Dear {patient_name},
+
+This is a reminder about your upcoming appointment:
+
+- Doctor: Dr. {doctor_name}
+- Date: {date}
+- Time: {time}
+- Location: {location}
+
+Your appointment is in approximately {hours_until} hours.
+
+Please remember to bring:
+- Your ID/ITS card
+- Any relevant medical records
+- List of current medications
+
+If you need to cancel or reschedule, please contact us immediately.
+
+Thank you,
+Umoor Sehhat Medical Center
+                """
+
+
+def render_reminder_email(appointment, now=None, doctor_name=None):
+    """Subject and plain-text body of an appointment reminder"""
+    now = now or timezone.now()
+    appointment_datetime = timezone.make_aware(
+        datetime.combine(appointment.appointment_date, appointment.appointment_time)
+    )
+    patient_user = appointment.patient.user
+    
+    subject = f'Appointment Reminder - {appointment.appointment_date}'
+    body = REMINDER_EMAIL_BODY.format(
+        patient_name=patient_user.get_full_name() if patient_user else 'Patient',
+        doctor_name=doctor_name or appointment.doctor.get_full_name(),
+        date=appointment.appointment_date.strftime('%B %d, %Y'),
+        time=appointment.appointment_time.strftime('%I:%M %p'),
+        location=appointment.doctor.address or 'Please check your appointment details',
+        hours_until=int((appointment_datetime - now).total_seconds() / 3600)
+    )
+    return subject, body
+
+
 class AppointmentNotificationService:
     """Service for handling appointment notifications"""
     
@@ -67,7 +118,7 @@ Thank you,
                 
                 logger.info(f"Confirmation email sent for appointment {appointment.appointment_id}")
                 return True
-            
+        
         except Exception as e:
             logger.error(f"Failed to send confirmation for appointment {appointment.appointment_id}: {str(e)}")
             return False
@@ -79,37 +130,7 @@ Thank you,
             appointment = reminder.appointment
             
             if reminder.reminder_type == 'email':
-                subject = f'Appointment Reminder - {appointment.appointment_date}'
-                
-                time_until = datetime.combine(
-                    appointment.appointment_date,
-                    appointment.appointment_time
-                ) - timezone.now()
-                
-                hours_until = int(time_until.total_seconds() / 3600)
-                
-                message = f"""
-Dear {appointment.patient.user.get_full_name() if appointment.patient.user else 'Patient'},
-
-This is a reminder about your upcoming appointment:
-
-- Doctor: Dr. {appointment.doctor.get_full_name()}
-- Date: {appointment.appointment_date.strftime('%B %d, %Y')}
-- Time: {appointment.appointment_time.strftime('%I:%M %p')}
-- Location: {appointment.doctor.address if appointment.doctor.address else 'Please check your appointment details'}
-
-Your appointment is in approximately {hours_until} hours.
-
-Please remember to bring:
-- Your ID/ITS card
-- Any relevant medical records
-- List of current medications
-
-If you need to cancel or reschedule, please contact us immediately.
-
-Thank you,
-Umoor Sehhat Medical Center
-                """
+                subject, message = render_reminder_email(appointment)
                 
                 recipient_email = appointment.patient.user.email if appointment.patient.user else None
                 
@@ -142,7 +163,7 @@ Umoor Sehhat Medical Center
                 # WhatsApp implementation would go here
                 logger.info(f"WhatsApp reminder for appointment {appointment.appointment_id} - Not implemented")
                 return False
-                
+        
         except Exception as e:
             reminder.status = 'failed'
             reminder.error_message = str(e)
@@ -188,117 +209,324 @@ Umoor Sehhat Medical Center
                 
                 logger.info(f"Cancellation notification sent for appointment {appointment.appointment_id}")
                 return True
-                
+        
         except Exception as e:
             logger.error(f"Failed to send cancellation notification for appointment {appointment.appointment_id}: {str(e)}")
             return False
 
 
+class AvailableSlot(NamedTuple):
+    """Compact availability row for a bookable time slot"""
+    slot_id: int
+    date: date_type
+    start_time: time
+    end_time: time
+    available_count: int
+
+
+def _as_time(value):
+    """Accept slot times given either as ``time`` objects or 'HH:MM' strings"""
+    return time.fromisoformat(value) if isinstance(value, str) else value
+
+
+RECURRING_SLOT_BATCH_SIZE = 1000
+
+
+def _to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+class DaySchedule:
+    """
+    A doctor's day loaded once into sorted interval arrays.
+    
+    Slots and active appointments are kept as minute offsets from
+    midnight. An appointment ``[start, end)`` overlaps a requested interval
+    ``[s, e)`` when ``start < e`` and ``end > s``; every appointment that
+    ended by ``s`` also started before ``e``, so the overlap count is
+    ``bisect_left(starts, e) - bisect_right(ends, s)`` over independently
+    sorted start and end arrays. Each check is O(log n) after the load.
+    """
+    
+    def __init__(self, slots, appointments):
+        """
+        Args:
+            slots: (start_minute, end_minute, max_appointments) tuples
+            appointments: (start_minute, end_minute) tuples
+        """
+        slots = sorted(slots)
+        self.slot_starts = [start for start, _, _ in slots]
+        self.slot_ends = [end for _, end, _ in slots]
+        self.slot_capacity = [capacity for _, _, capacity in slots]
+        
+        # Running maximum of slot ends lets covering-slot lookups stop early
+        self.slot_max_end = []
+        running_end = -1
+        for end in self.slot_ends:
+            running_end = max(running_end, end)
+            self.slot_max_end.append(running_end)
+        
+        self.appointment_starts = sorted(start for start, _ in appointments)
+        self.appointment_ends = sorted(end for _, end in appointments)
+    
+    @classmethod
+    def load(cls, doctor, date):
+        """Load a doctor's available slots and active appointments for a date (two queries)"""
+        slots = [
+            (_to_minutes(start_time), _to_minutes(end_time), max_appointments)
+            for start_time, end_time, max_appointments in TimeSlot.objects.filter(
+                doctor=doctor, date=date, is_available=True
+            ).values_list('start_time', 'end_time', 'max_appointments')
+        ]
+        appointments = [
+            (_to_minutes(appointment_time), _to_minutes(appointment_time) + duration)
+            for appointment_time, duration in Appointment.objects.filter(
+                doctor=doctor, appointment_date=date, status__in=AppointmentStatus.HOLDS_SLOT
+            ).values_list('appointment_time', 'duration_minutes')
+        ]
+        return cls(slots, appointments)
+    
+    def count_overlapping(self, start_minute, end_minute):
+        """Number of active appointments overlapping ``[start_minute, end_minute)``"""
+        return (
+            bisect_left(self.appointment_starts, end_minute)
+            - bisect_right(self.appointment_ends, start_minute)
+        )
+    
+    def covering_slot_capacity(self, start_minute, end_minute):
+        """Largest capacity among slots containing the interval, or None if no slot does"""
+        capacity = None
+        index = bisect_right(self.slot_starts, start_minute) - 1
+        while index >= 0 and self.slot_max_end[index] >= end_minute:
+            if self.slot_ends[index] >= end_minute:
+                capacity = max(capacity or 0, self.slot_capacity[index])
+            index -= 1
+        return capacity
+    
+    def check(self, start_time, duration_minutes) -> Tuple[bool, str]:
+        """Same contract as ``AppointmentScheduler.check_doctor_availability``"""
+        start_minute = _to_minutes(start_time)
+        end_minute = start_minute + duration_minutes
+        
+        capacity = self.covering_slot_capacity(start_minute, end_minute)
+        if capacity is None:
+            return False, "No available time slot for this period"
+        
+        if self.count_overlapping(start_minute, end_minute) >= capacity:
+            return False, "Doctor is fully booked for this time"
+        
+        return True, "Doctor is available"
+
+
 class AppointmentScheduler:
     """Utility class for appointment scheduling operations"""
     
     @staticmethod
-    def get_available_slots(doctor, date, duration_minutes=30):
-        """Get available time slots for a doctor on a specific date"""
-        # Get all time slots for the doctor on the date
-        time_slots = TimeSlot.objects.filter(
+    def annotate_booked_count(slots):
+        """
+        Annotate ``booked_count`` (appointments holding each slot) on a
+        TimeSlot queryset using a correlated subquery, so capacity for any
+        number of slots is computed in the same query.
+        """
+        booked = Appointment.objects.filter(
+            doctor=OuterRef('doctor'),
+            appointment_date=OuterRef('date'),
+            appointment_time__gte=OuterRef('start_time'),
+            appointment_time__lt=OuterRef('end_time'),
+            status__in=AppointmentStatus.HOLDS_SLOT
+        ).order_by().values('doctor').annotate(total=Count('pk')).values('total')
+        
+        return slots.annotate(
+            booked_count=Coalesce(Subquery(booked, output_field=IntegerField()), 0)
+        )
+    
+    @staticmethod
+    def bookable_slots(doctor, start_date, end_date=None):
+        """Bookable slots of a doctor between two dates, annotated with ``booked_count``"""
+        end_date = end_date or start_date
+        slots = TimeSlot.objects.filter(
             doctor=doctor,
-            date=date,
-            is_available=True
-        ).order_by('start_time')
+            date__gte=max(start_date, timezone.now().date()),
+            date__lte=end_date,
+            is_available=True,
+            is_booked=False,
+            current_appointments__lt=F('max_appointments')
+        )
+        return AppointmentScheduler.annotate_booked_count(slots).filter(
+            booked_count__lt=F('max_appointments')
+        ).order_by('date', 'start_time')
+    
+    @staticmethod
+    def get_availability(doctor, start_date, end_date=None, duration_minutes=30) -> List[AvailableSlot]:
+        """
+        Remaining capacity for every bookable slot of a doctor in a date range.
+        
+        Runs a single query regardless of the number of slots or days and
+        returns ``AvailableSlot`` tuples ordered by date and start time.
+        """
+        rows = AppointmentScheduler.bookable_slots(doctor, start_date, end_date).values_list(
+            'id', 'date', 'start_time', 'end_time', 'max_appointments', 'booked_count'
+        )
+        return [
+            AvailableSlot(slot_id, slot_date, start_time, end_time, max_appointments - booked_count)
+            for slot_id, slot_date, start_time, end_time, max_appointments, booked_count in rows
+            if _to_minutes(end_time) - _to_minutes(start_time) >= duration_minutes
+        ]
+    
+    @staticmethod
+    def find_earliest_slots(limit=10, specialty=None, moze=None, date_from=None, date_to=None,
+                            time_from=None, time_to=None):
+        """
+        Earliest bookable slots across all doctors.
+        
+        Filters by doctor specialty, assigned moze and a date/time-of-day
+        window, checks remaining capacity in SQL and returns at most
+        ``limit`` slots ordered by start, each annotated with
+        ``booked_count`` and with its doctor preloaded. This is one query
+        regardless of how many doctors match.
+        """
+        now = timezone.now()
+        today = now.date()
+        date_from = max(date_from or today, today)
+        
+        slots = TimeSlot.objects.filter(
+            is_available=True,
+            is_booked=False,
+            current_appointments__lt=F('max_appointments'),
+            date__gte=date_from,
+            doctor__is_available=True
+        ).exclude(date=today, start_time__lt=now.time())
+        
+        if date_to:
+            slots = slots.filter(date__lte=date_to)
+        if time_from:
+            slots = slots.filter(start_time__gte=time_from)
+        if time_to:
+            slots = slots.filter(start_time__lt=time_to)
+        if specialty:
+            slots = slots.filter(doctor__specialty__iexact=specialty)
+        if moze:
+            slots = slots.filter(doctor__assigned_moze=moze)
         
+        slots = AppointmentScheduler.annotate_booked_count(slots).filter(
+            booked_count__lt=F('max_appointments')
+        )
+        return list(
+            slots.select_related('doctor', 'doctor__user').order_by('date', 'start_time', 'doctor_id')[:limit]
+        )
+    
+    @staticmethod
+    def get_available_slots(doctor, date, duration_minutes=30):
+        """Get available time slots for a doctor on a specific date"""
         available_slots = []
         
-        for slot in time_slots:
-            if slot.can_book() and slot.duration_minutes >= duration_minutes:
-                # Check for existing appointments in this slot
-                conflicting_appointments = Appointment.objects.filter(
-                    doctor=doctor,
-                    appointment_date=date,
-                    appointment_time__gte=slot.start_time,
-                    appointment_time__lt=slot.end_time,
-                    status__in=[
-                        AppointmentStatus.CONFIRMED,
-                        AppointmentStatus.SCHEDULED,
-                        AppointmentStatus.IN_PROGRESS
-                    ]
-                ).count()
-                
-                if conflicting_appointments < slot.max_appointments:
-                    available_slots.append({
-                        'slot': slot,
-                        'available_count': slot.max_appointments - conflicting_appointments
-                    })
+        for slot in AppointmentScheduler.bookable_slots(doctor, date):
+            if slot.duration_minutes >= duration_minutes:
+                available_slots.append({
+                    'slot': slot,
+                    'available_count': slot.max_appointments - slot.booked_count
+                })
         
         return available_slots
     
     @staticmethod
     def create_recurring_slots(doctor, start_date, end_date, time_slots_config, weekdays=None):
         """Create recurring time slots for a doctor"""
-        created_slots = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            # Check if this weekday should have slots
-            if weekdays is None or current_date.weekday() in weekdays:
-                for slot_config in time_slots_config:
-                    # Check if slot already exists
-                    if not TimeSlot.objects.filter(
-                        doctor=doctor,
-                        date=current_date,
-                        start_time=slot_config['start_time']
-                    ).exists():
-                        slot = TimeSlot.objects.create(
+        return AppointmentScheduler.generate_recurring_slots(
+            [(doctor, time_slots_config, weekdays)], start_date, end_date
+        )
+    
+    @staticmethod
+    def generate_recurring_slots(schedules, start_date, end_date, batch_size=RECURRING_SLOT_BATCH_SIZE):
+        """
+        Create recurring time slots for many doctors as one set operation.
+        
+        ``schedules`` is an iterable of ``(doctor, time_slots_config, weekdays)``.
+        Every candidate (doctor, date, start_time) key is built in memory, the
+        keys that already exist in the range are fetched with a single query
+        and only the difference is inserted with ``bulk_create``. Conflicts
+        with slots inserted concurrently are ignored via the unique key.
+        
+        Returns the inserted TimeSlot instances; because of
+        ``ignore_conflicts`` their primary keys are not populated.
+        """
+        candidates = {}
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        
+        for doctor, time_slots_config, weekdays in schedules:
+            recurring_days = ','.join(map(str, weekdays)) if weekdays else ''
+            slot_days = [day for day in days if weekdays is None or day.weekday() in weekdays]
+            
+            for slot_config in time_slots_config:
+                start_time = _as_time(slot_config['start_time'])
+                end_time = _as_time(slot_config['end_time'])
+                max_appointments = slot_config.get('max_appointments', 1)
+                
+                for day in slot_days:
+                    key = (doctor.pk, day, start_time)
+                    if key not in candidates:
+                        candidates[key] = TimeSlot(
                             doctor=doctor,
-                            date=current_date,
-                            start_time=slot_config['start_time'],
-                            end_time=slot_config['end_time'],
-                            max_appointments=slot_config.get('max_appointments', 1),
+                            date=day,
+                            start_time=start_time,
+                            end_time=end_time,
+                            max_appointments=max_appointments,
                             is_recurring=True,
-                            recurring_days=','.join(map(str, weekdays)) if weekdays else ''
+                            recurring_days=recurring_days
                         )
-                        created_slots.append(slot)
-            
-            current_date += timedelta(days=1)
         
-        return created_slots
+        if not candidates:
+            return []
+        
+        existing = set(
+            TimeSlot.objects.filter(
+                doctor_id__in={doctor_id for doctor_id, _, _ in candidates},
+                date__gte=start_date,
+                date__lte=end_date
+            ).values_list('doctor_id', 'date', 'start_time')
+        )
+        
+        new_slots = [slot for key, slot in candidates.items() if key not in existing]
+        TimeSlot.objects.bulk_create(new_slots, batch_size=batch_size, ignore_conflicts=True)
+        return new_slots
+    
+    @staticmethod
+    def book_slot(time_slot, patient, appointment_time=None, status=AppointmentStatus.SCHEDULED, **fields):
+        """
+        Book an appointment into a time slot.
+        
+        Capacity is taken with a conditional UPDATE on the slot (see
+        ``TimeSlot.reserve``), so concurrent bookings cannot overbook it or
+        take a place held for another patient's waiting list offer.
+        Raises ValidationError when the slot is full, held or unavailable.
+        """
+        appointment = Appointment(
+            doctor=time_slot.doctor,
+            patient=patient,
+            time_slot=time_slot,
+            appointment_date=time_slot.date,
+            appointment_time=appointment_time or time_slot.start_time,
+            status=status,
+            **fields
+        )
+        appointment.save()
+        return appointment
     
     @staticmethod
     def check_doctor_availability(doctor, date, start_time, duration_minutes):
         """Check if doctor is available for a specific time"""
-        end_time = (datetime.combine(date, start_time) + timedelta(minutes=duration_minutes)).time()
-        
-        # Check if there's a time slot covering this period
-        covering_slot = TimeSlot.objects.filter(
-            doctor=doctor,
-            date=date,
-            start_time__lte=start_time,
-            end_time__gte=end_time,
-            is_available=True
-        ).first()
-        
-        if not covering_slot:
-            return False, "No available time slot for this period"
-        
-        # Check for conflicting appointments
-        conflicting_appointments = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date=date,
-            status__in=[
-                AppointmentStatus.CONFIRMED,
-                AppointmentStatus.SCHEDULED,
-                AppointmentStatus.IN_PROGRESS
-            ]
-        ).filter(
-            # Check for overlapping appointments
-            appointment_time__lt=end_time,
-            # This is a simplified check - in production, you'd want more sophisticated overlap detection
-        ).count()
-        
-        if conflicting_appointments >= covering_slot.max_appointments:
-            return False, "Doctor is fully booked for this time"
+        return DaySchedule.load(doctor, date).check(start_time, duration_minutes)
+    
+    @staticmethod
+    def check_doctor_availability_batch(doctor, date, candidates: Iterable[Tuple[time, int]]):
+        """
+        Check many ``(start_time, duration_minutes)`` candidates for one day.
         
-        return True, "Doctor is available"
+        The day is loaded once; results are ``(available, message)`` tuples in
+        the order of ``candidates``.
+        """
+        schedule = DaySchedule.load(doctor, date)
+        return [schedule.check(start_time, duration) for start_time, duration in candidates]
     
     @staticmethod
     def get_next_available_slot(doctor, after_datetime=None):
@@ -332,77 +560,391 @@ class AppointmentScheduler:
         return None
 
 
-class AppointmentRemindersProcessor:
-    """Process and send appointment reminders"""
+class ReminderDispatcher:
+    """
+    Send due reminders in batches; safe to run from several workers at once.
     
-    @staticmethod
-    def process_pending_reminders():
-        """Process all pending reminders that are due"""
-        notification_service = AppointmentNotificationService()
-        
-        # Get reminders that are due and not sent
-        due_reminders = AppointmentReminder.objects.filter(
-            scheduled_for__lte=timezone.now(),
-            is_sent=False,
-            status='pending'
-        ).select_related('appointment', 'appointment__doctor', 'appointment__patient')
+    A worker claims a batch by locking due rows with
+    ``select_for_update(skip_locked=True)`` and stamping them with its own
+    claim token in the same short transaction. Rows another worker holds
+    are skipped, and the conditional UPDATE keeps claims disjoint on
+    backends without row locks. Claims older than ``lease_seconds`` are
+    treated as abandoned and can be picked up again.
+    
+    Each batch is rendered up front, sent over a single mail connection
+    and written back with one ``bulk_update``.
+    """
+    
+    UPDATE_FIELDS = ['status', 'is_sent', 'sent_at', 'error_message', 'claim_token', 'claimed_at', 'updated_at']
+    
+    def __init__(self, batch_size=100, lease_seconds=300, connection=None):
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.connection = connection
+    
+    def _claimable(self, now):
+        stale = now - timedelta(seconds=self.lease_seconds)
+        return AppointmentReminder.objects.filter(
+            Q(status='pending') | Q(status='processing', claimed_at__lt=stale),
+            scheduled_for__lte=now,
+            is_sent=False
+        )
+    
+    def claim_batch(self):
+        """Claim up to ``batch_size`` due reminders for this worker"""
+        now = timezone.now()
+        token = uuid.uuid4().hex
         
-        processed = 0
-        failed = 0
+        with transaction.atomic():
+            ids = list(
+                self._claimable(now).select_for_update(skip_locked=True)
+                .order_by('scheduled_for', 'pk').values_list('pk', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return []
+            self._claimable(now).filter(pk__in=ids).update(
+                status='processing', claim_token=token, claimed_at=now
+            )
+            # Loaded inside the transaction so a failure here gives the claim back
+            return list(
+                AppointmentReminder.objects.filter(claim_token=token, status='processing').select_related(
+                    'appointment', 'appointment__doctor', 'appointment__doctor__user',
+                    'appointment__patient', 'appointment__patient__user'
+                )
+            )
+    
+    def dispatch_batch(self, reminders):
+        """Send and record one claimed batch; returns (sent, failed)"""
+        self.send_batch(reminders)
+        return self.record_batch(reminders)
+    
+    def send_batch(self, reminders):
+        """Render and send a claimed batch, setting each reminder's outcome in memory"""
+        now = timezone.now()
+        doctor_names = {}
+        outgoing = []
         
-        for reminder in due_reminders:
-            # Skip if appointment is cancelled
-            if reminder.appointment.status == AppointmentStatus.CANCELLED:
+        for reminder in reminders:
+            appointment = reminder.appointment
+            reminder.claim_token = ''
+            reminder.claimed_at = None
+            reminder.updated_at = now
+            
+            if appointment.status in AppointmentStatus.RELEASES_SLOT:
                 reminder.status = 'cancelled'
-                reminder.save()
+                continue
+            if reminder.reminder_type != 'email':
+                reminder.status = 'failed'
+                reminder.error_message = f'{reminder.get_reminder_type_display()} reminders are not supported'
                 continue
             
-            # Send the reminder
-            if notification_service.send_appointment_reminder(reminder):
-                processed += 1
-            else:
-                failed += 1
+            patient_user = appointment.patient.user
+            if not patient_user or not patient_user.email:
+                reminder.status = 'failed'
+                reminder.error_message = 'Patient has no email address'
+                continue
+            
+            if appointment.doctor_id not in doctor_names:
+                doctor_names[appointment.doctor_id] = appointment.doctor.get_full_name()
+            subject, body = render_reminder_email(appointment, now, doctor_names[appointment.doctor_id])
+            outgoing.append((reminder, EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [patient_user.email])))
+        
+        if outgoing:
+            try:
+                connection = self.connection or get_connection()
+                connection.send_messages([message for _, message in outgoing])
+                for reminder, _ in outgoing:
+                    reminder.status = 'sent'
+                    reminder.is_sent = True
+                    reminder.sent_at = now
+            except Exception as e:
+                logger.error(f"Failed to send reminder batch of {len(outgoing)}: {str(e)}")
+                for reminder, _ in outgoing:
+                    reminder.status = 'failed'
+                    reminder.error_message = str(e)
+    
+    def record_batch(self, reminders):
+        """Write a sent batch back in one bulk update; returns (sent, failed)"""
+        with transaction.atomic():
+            AppointmentReminder.objects.bulk_update(reminders, self.UPDATE_FIELDS)
+            sent_appointment_ids = [reminder.appointment_id for reminder in reminders if reminder.status == 'sent']
+            if sent_appointment_ids:
+                Appointment.objects.filter(pk__in=sent_appointment_ids).update(reminder_sent=True)
         
-        logger.info(f"Processed {processed} reminders, {failed} failed")
-        return processed, failed
+        failed = sum(1 for reminder in reminders if reminder.status == 'failed')
+        return len(sent_appointment_ids), failed
+    
+    def run(self, max_batches=None):
+        """Claim and dispatch batches until nothing is due; returns (sent, failed)"""
+        sent = failed = batches = 0
+        while max_batches is None or batches < max_batches:
+            reminders = self.claim_batch()
+            if not reminders:
+                break
+            batch_sent, batch_failed = self.dispatch_batch(reminders)
+            sent += batch_sent
+            failed += batch_failed
+            batches += 1
+        
+        logger.info(f"Dispatched {batches} reminder batches: {sent} sent, {failed} failed")
+        return sent, failed
+
+
+class AppointmentRemindersProcessor:
+    """Process and send appointment reminders"""
+    
+    @staticmethod
+    def process_pending_reminders():
+        """Process all pending reminders that are due"""
+        return ReminderDispatcher().run()
     
     @staticmethod
     def schedule_default_reminders(appointment):
         """Schedule default reminders for an appointment"""
-        appointment_datetime = datetime.combine(
-            appointment.appointment_date,
-            appointment.appointment_time
+        return ReminderPolicy().schedule([appointment])
+
+
+# Hours before the appointment at which each channel is reminded
+DEFAULT_REMINDER_OFFSETS = {
+    'email': [24],
+    'sms': [2],
+}
+
+
+class ReminderPolicy:
+    """
+    Compute and bulk-create the default reminders for many appointments.
+    
+    Offsets come from ``settings.APPOINTMENT_REMINDER_OFFSETS`` (channel ->
+    hours before the appointment) unless given explicitly. Reminders that
+    would already be due are skipped, and reminders matching an existing
+    (appointment, reminder_type, scheduled_for) are never inserted twice,
+    so scheduling the same appointments again is a no-op.
+    """
+    
+    def __init__(self, offsets=None, batch_size=1000):
+        if offsets is None:
+            offsets = getattr(settings, 'APPOINTMENT_REMINDER_OFFSETS', DEFAULT_REMINDER_OFFSETS)
+        
+        valid_types = {choice for choice, _ in AppointmentReminder._meta.get_field('reminder_type').choices}
+        unknown = set(offsets) - valid_types
+        if unknown:
+            raise ValueError(f"Unknown reminder channels: {', '.join(sorted(unknown))}")
+        
+        self.offsets = sorted(
+            (reminder_type, timedelta(hours=hours))
+            for reminder_type, hours_list in offsets.items()
+            for hours in hours_list
         )
+        self.batch_size = batch_size
+    
+    def plan(self, appointment_id, appointment_date, appointment_time, now=None):
+        """(reminder_type, scheduled_for) pairs still ahead of ``now`` for one appointment"""
+        now = now or timezone.now()
+        appointment_datetime = timezone.make_aware(datetime.combine(appointment_date, appointment_time))
+        return [
+            (reminder_type, appointment_datetime - offset)
+            for reminder_type, offset in self.offsets
+            if appointment_datetime - offset > now
+        ]
+    
+    def schedule(self, appointments, now=None):
+        """Create missing reminders for appointment instances; returns the new reminders"""
+        now = now or timezone.now()
+        rows = [(appointment.pk, appointment.appointment_date, appointment.appointment_time) for appointment in appointments]
+        created = []
+        for start in range(0, len(rows), self.batch_size):
+            created.extend(self._schedule_batch(rows[start:start + self.batch_size], now))
+        return created
+    
+    def schedule_rows(self, rows, now=None):
+        """
+        Create missing reminders for (appointment_id, date, time) rows.
         
-        # Don't schedule reminders for past appointments
-        if appointment_datetime <= timezone.now():
+        Rows are handled ``batch_size`` appointments at a time: one query
+        for the reminders they already have and one bulk INSERT. Returns
+        the number of reminders created.
+        """
+        now = now or timezone.now()
+        created = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                created += len(self._schedule_batch(batch, now))
+                batch = []
+        if batch:
+            created += len(self._schedule_batch(batch, now))
+        return created
+    
+    def _schedule_batch(self, rows, now):
+        candidates = {}
+        for appointment_id, appointment_date, appointment_time in rows:
+            for reminder_type, scheduled_for in self.plan(appointment_id, appointment_date, appointment_time, now):
+                candidates[(appointment_id, reminder_type, scheduled_for)] = None
+        if not candidates:
             return []
         
-        reminders = []
+        existing = AppointmentReminder.objects.filter(
+            appointment_id__in={key[0] for key in candidates},
+            reminder_type__in={key[1] for key in candidates}
+        ).order_by().values_list('appointment_id', 'reminder_type', 'scheduled_for')
+        for key in existing:
+            candidates.pop(key, None)
         
-        # 24 hours before - Email
-        reminder_24h = appointment_datetime - timedelta(hours=24)
-        if reminder_24h > timezone.now():
-            reminders.append(
-                AppointmentReminder.objects.create(
-                    appointment=appointment,
-                    reminder_type='email',
-                    scheduled_for=reminder_24h
-                )
+        return AppointmentReminder.objects.bulk_create(
+            [
+                AppointmentReminder(appointment_id=appointment_id, reminder_type=reminder_type, scheduled_for=scheduled_for)
+                for appointment_id, reminder_type, scheduled_for in candidates
+            ]
+        )
+
+
+WAITING_LIST_OFFER_EMAIL_BODY = """
+Dear {patient_name},
+
+A time you are waiting for has become available:
+
+- Doctor: Dr. {doctor_name}
+- Date: {date}
+- Time: {time}
+
+{hold_note}
+
+Thank you,
+Umoor Sehhat Medical Center
+"""
+
+
+class WaitingListMatcher:
+    """
+    Offer released appointment time to the waiting list.
+    
+    Runs when an appointment is cancelled or rescheduled (see the
+    ``appointment_time_released`` signal). Matching entries are found with
+    one indexed query on doctor, date and preferred time window, ordered by
+    priority; the best ones are marked notified in one UPDATE. When the
+    released time belongs to a slot, each freed place is held for the
+    entry it was offered to for ``hold_minutes``, and other patients
+    cannot book into held places until the hold lapses. Offer emails are
+    queued in the email outbox in the same transaction, so cancelling
+    never waits on the mail server.
+    """
+    
+    def __init__(self, hold_minutes=None):
+        if hold_minutes is None:
+            hold_minutes = getattr(settings, 'WAITING_LIST_HOLD_MINUTES', 15)
+        self.hold = timedelta(minutes=hold_minutes)
+    
+    @staticmethod
+    def matching_entries(doctor_id, date, start_time):
+        """Active, not yet notified entries whose preferred window covers ``start_time``"""
+        return WaitingList.objects.filter(
+            Q(preferred_time_start__isnull=True) | Q(preferred_time_start__lte=start_time),
+            Q(preferred_time_end__isnull=True) | Q(preferred_time_end__gte=start_time),
+            doctor_id=doctor_id,
+            preferred_date=date,
+            notified=False,
+            is_active=True
+        ).order_by('priority', 'created_at')
+    
+    @staticmethod
+    def live_holds(slot_id, now=None):
+        """Patient IDs currently holding a place in a slot"""
+        return list(
+            WaitingList.objects.filter(
+                offered_slot_id=slot_id,
+                offer_expires_at__gt=now or timezone.now(),
+                is_active=True
+            ).values_list('patient_id', flat=True)
+        )
+    
+    def open_places(self, slot_id, now):
+        """Places in a slot that are neither booked nor held"""
+        slot = TimeSlot.objects.filter(pk=slot_id, is_available=True).values_list(
+            'max_appointments', 'current_appointments'
+        ).first()
+        if slot is None:
+            return 0
+        return slot[0] - slot[1] - len(self.live_holds(slot_id, now))
+    
+    def offer_released_time(self, doctor_id, date, start_time, time_slot_id=None):
+        """Offer released time to the highest-priority matching entries; returns them"""
+        now = timezone.now()
+        places = self.open_places(time_slot_id, now) if time_slot_id else 1
+        if places <= 0:
+            return []
+        
+        with transaction.atomic():
+            ids = list(
+                self.matching_entries(doctor_id, date, start_time)
+                .select_for_update(skip_locked=True).values_list('pk', flat=True)[:places]
+            )
+            if not ids:
+                return []
+            WaitingList.objects.filter(pk__in=ids, notified=False).update(
+                notified=True,
+                offered_slot_id=time_slot_id,
+                offered_at=now,
+                offer_expires_at=now + self.hold if time_slot_id else None,
+                updated_at=now
             )
+            
+            entries = list(
+                WaitingList.objects.filter(pk__in=ids, offered_at=now)
+                .select_related('patient__user', 'doctor').order_by('priority', 'created_at')
+            )
+            self.send_offers(entries, date, start_time)
+        return entries
+    
+    def reoffer_expired_holds(self):
+        """Pass places whose hold lapsed on to the next entries; returns the new offers"""
+        now = timezone.now()
+        expired = WaitingList.objects.filter(offer_expires_at__lte=now, is_active=True)
+        slots = list(
+            TimeSlot.objects.filter(pk__in=expired.values('offered_slot_id'))
+            .values_list('pk', 'doctor_id', 'date', 'start_time')
+        )
+        expired.update(offer_expires_at=None, updated_at=now)
         
-        # 2 hours before - SMS
-        reminder_2h = appointment_datetime - timedelta(hours=2)
-        if reminder_2h > timezone.now():
-            reminders.append(
-                AppointmentReminder.objects.create(
-                    appointment=appointment,
-                    reminder_type='sms',
-                    scheduled_for=reminder_2h
-                )
+        offers = []
+        for slot_id, doctor_id, date, start_time in slots:
+            offers.extend(self.offer_released_time(doctor_id, date, start_time, slot_id))
+        return offers
+    
+    def send_offers(self, entries, date, start_time):
+        """Queue an offer email for every offered patient in one outbox INSERT"""
+        from accounts.models import EmailOutbox
+        from umoor_sehhat.notifications import NotificationService
+        
+        emails = []
+        for entry in entries:
+            patient_user = entry.patient.user
+            if not patient_user or not patient_user.email:
+                continue
+            if entry.offer_expires_at:
+                hold_note = f"This time is held for you until {entry.offer_expires_at:%I:%M %p}. Please book it before then."
+            else:
+                hold_note = 'Please book soon, as other patients are also waiting for this time.'
+            body = WAITING_LIST_OFFER_EMAIL_BODY.format(
+                patient_name=patient_user.get_full_name() or 'Patient',
+                doctor_name=entry.doctor.get_full_name(),
+                date=date.strftime('%B %d, %Y'),
+                time=start_time.strftime('%I:%M %p'),
+                hold_note=hold_note
             )
+            emails.append(EmailOutbox(
+                recipient=patient_user,
+                to_emails=[patient_user.email],
+                subject=f'Appointment available - {date}',
+                body_text=body,
+                kind='waiting_list_offer'
+            ))
+        
+        NotificationService.deliver(emails)
         
-        return reminders
+        for entry in entries:
+            logger.info(f"Offered {date} {start_time} with doctor {entry.doctor_id} to waiting list entry {entry.pk}")
 
 
 class WaitingListManager:
@@ -411,31 +953,19 @@ class WaitingListManager:
     @staticmethod
     def check_and_notify_waiting_list(doctor, date, time_slot=None):
         """Check waiting list and notify patients when slots become available"""
-        from .models import WaitingList
-        
-        # Get active waiting list entries for this doctor and date
         waiting_entries = WaitingList.objects.filter(
             doctor=doctor,
             preferred_date=date,
             is_active=True,
             notified=False
-        ).order_by('priority', 'created_at')
-        
-        notified_count = 0
+        )
+        if time_slot:
+            waiting_entries = WaitingListMatcher.matching_entries(doctor.pk, date, time_slot.start_time)
         
-        for entry in waiting_entries:
-            # Check if the time preference matches
-            if time_slot:
-                if entry.preferred_time_start and entry.preferred_time_end:
-                    if not (entry.preferred_time_start <= time_slot.start_time <= entry.preferred_time_end):
-                        continue
-            
-            # Here you would implement the actual notification
-            # For now, we'll just mark as notified
-            entry.notified = True
-            entry.save()
-            notified_count += 1
-            
-            logger.info(f"Notified waiting list patient {entry.patient} for doctor {doctor} on {date}")
+        notified_count = WaitingList.objects.filter(pk__in=list(waiting_entries.values_list('pk', flat=True))).update(
+            notified=True,
+            updated_at=timezone.now()
+        )
         
-        return notified_count
\ No newline at end of file
+        logger.info(f"Notified {notified_count} waiting list patients for doctor {doctor} on {date}")
+        return notified_count
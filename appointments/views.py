@@ -1,7 +1,12 @@
-from rest_framework import generics, viewsets, status
+from rest_framework import generics, viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, PermissionDenied
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Count, Sum
 from django.utils import timezone
@@ -18,8 +23,10 @@ from .serializers import (
     AppointmentRescheduleSerializer, TimeSlotSerializer,
     AppointmentLogSerializer, AppointmentReminderSerializer,
     WaitingListSerializer, DoctorAvailabilitySerializer,
-    BulkTimeSlotSerializer
+    BulkTimeSlotSerializer, SlotSearchSerializer, CalendarFeedSerializer
 )
+from .ical import AppointmentFeed
+from .utils import AppointmentScheduler, ReminderPolicy
 from doctordirectory.models import Doctor, Patient
 from accounts.permissions import IsDoctor, IsPatient, IsOwnerOrReadOnly
 
@@ -161,7 +168,11 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         return queryset.select_related('doctor', 'patient', 'service').order_by('-appointment_date', '-appointment_time')
     
     def perform_create(self, serializer):
-        appointment = serializer.save(booked_by=self.request.user)
+        # The slot may have filled up since it was offered
+        try:
+            appointment = serializer.save(booked_by=self.request.user)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'time_slot': e.messages})
         
         # Create appointment log
         AppointmentLog.objects.create(
@@ -174,26 +185,16 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         # Schedule default reminders
         self._schedule_default_reminders(appointment)
     
+    def perform_update(self, serializer):
+        # Re-activating an appointment has to take its slot's capacity back
+        try:
+            serializer.save()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'status': e.messages})
+    
     def _schedule_default_reminders(self, appointment):
         """Schedule default reminders for the appointment"""
-        appointment_datetime = datetime.combine(
-            appointment.appointment_date,
-            appointment.appointment_time
-        )
-        
-        # 24 hours before
-        AppointmentReminder.objects.create(
-            appointment=appointment,
-            reminder_type='email',
-            scheduled_for=appointment_datetime - timedelta(hours=24)
-        )
-        
-        # 2 hours before
-        AppointmentReminder.objects.create(
-            appointment=appointment,
-            reminder_type='sms',
-            scheduled_for=appointment_datetime - timedelta(hours=2)
-        )
+        ReminderPolicy().schedule([appointment])
     
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
@@ -450,6 +451,105 @@ class DoctorAvailabilityView(generics.GenericAPIView):
         })
 
 
+class EarliestSlotSearchView(generics.GenericAPIView):
+    """Find the earliest bookable slots across all matching doctors"""
+    serializer_class = SlotSearchSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = dict(serializer.validated_data)
+        
+        slots = AppointmentScheduler.find_earliest_slots(**params)
+        
+        results = [
+            {
+                'slot_id': slot.id,
+                'doctor_id': slot.doctor_id,
+                'doctor_name': slot.doctor.get_full_name(),
+                'specialty': slot.doctor.specialty,
+                'moze_id': slot.doctor.assigned_moze_id,
+                'date': slot.date,
+                'start_time': slot.start_time,
+                'end_time': slot.end_time,
+                'available_count': slot.max_appointments - slot.booked_count
+            }
+            for slot in slots
+        ]
+        
+        return Response({
+            'results': results,
+            'count': len(results)
+        })
+
+
+class CalendarFeedView(generics.GenericAPIView):
+    """
+    iCalendar feed of a doctor's or patient's appointments.
+    
+    Responses carry an ETag built from one aggregate over the feed's
+    appointments; clients sending it back in If-None-Match get 304 while
+    nothing has changed.
+    """
+    serializer_class = CalendarFeedSerializer
+    permission_classes = [IsAuthenticated]
+    owner_type = None
+    owner_model = None
+    
+    def get_owner_user_id(self, pk):
+        """User ID of the feed's owner, cached so revalidation stays at one query"""
+        key = f'appointments:ical-owner:{self.owner_type}:{pk}'
+        owner = cache.get(key)
+        if owner is None:
+            owner = self.owner_model.objects.filter(pk=pk).values_list('user_id', flat=True).first()
+            if owner is None and not self.owner_model.objects.filter(pk=pk).exists():
+                raise NotFound(f'{self.owner_type.title()} not found')
+            # Owners without a user are stored as 0 so they are cached too
+            owner = owner or 0
+            cache.set(key, owner, 60 * 60)
+        return owner
+    
+    def get(self, request, pk):
+        owner_user_id = self.get_owner_user_id(pk)
+        if not request.user.is_admin and owner_user_id != request.user.pk:
+            raise PermissionDenied('You can only subscribe to your own calendar')
+        
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        feed = AppointmentFeed(self.owner_type, pk, **serializer.validated_data)
+        
+        etag = feed.etag()
+        headers = {
+            'ETag': quote_etag(etag),
+            'Cache-Control': 'private, no-cache',
+        }
+        # If-None-Match uses weak comparison, so W/ tags added by compression still match
+        client_etags = {tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))}
+        if headers['ETag'] in client_etags or '*' in client_etags:
+            return HttpResponseNotModified(headers=headers)
+        
+        body = feed.cached_body(etag)
+        if body is not None:
+            response = HttpResponse(body, content_type='text/calendar; charset=utf-8', headers=headers)
+        else:
+            response = StreamingHttpResponse(feed.stream(etag), content_type='text/calendar; charset=utf-8', headers=headers)
+        response['Content-Disposition'] = f'inline; filename="{self.owner_type}-{pk}.ics"'
+        return response
+
+
+class DoctorCalendarFeedView(CalendarFeedView):
+    """iCalendar feed of a doctor's appointments"""
+    owner_type = 'doctor'
+    owner_model = Doctor
+
+
+class PatientCalendarFeedView(CalendarFeedView):
+    """iCalendar feed of a patient's appointments"""
+    owner_type = 'patient'
+    owner_model = Patient
+
+
 class AppointmentReminderViewSet(viewsets.ModelViewSet):
     """ViewSet for managing appointment reminders"""
     queryset = AppointmentReminder.objects.all()
@@ -21,6 +21,9 @@ from .models import (
 )
 from .forms import PetitionForm, PetitionCommentForm, PetitionFilterForm
 from accounts.models import User
+from umoor_sehhat.exports import (
+    Column, ExportSource, StreamingExport, choice_column, date_column, export_format, name_column
+)
 
 
 @login_required
@@ -622,10 +625,7 @@ def petition_analytics(request):
 
 @login_required
 def export_petitions(request):
-    """Export petitions to CSV"""
-    import csv
-    from django.http import HttpResponse
-    
+    """Export petitions to CSV, or to Excel with ``?format=xlsx``"""
     user = request.user
     
     # Check permissions
@@ -641,29 +641,18 @@ def export_petitions(request):
             Q(moze__aamil=user) | Q(moze__moze_coordinator=user)
         )
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="petitions.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'ID', 'Title', 'Category', 'Priority', 'Status', 'Created By', 
-        'Moze', 'Created At', 'Description'
-    ])
-    
-    for petition in petitions.select_related('created_by', 'category', 'moze'):
-        writer.writerow([
-            petition.id,
-            petition.title,
-            petition.category.name if petition.category else '',
-            petition.get_priority_display(),
-            petition.get_status_display(),
-            petition.created_by.get_full_name(),
-            petition.moze.name if petition.moze else '',
-            petition.created_at.strftime('%Y-%m-%d %H:%M'),
-            petition.description[:100] + '...' if len(petition.description) > 100 else petition.description
-        ])
-    
-    return response
+    columns = [
+        Column('ID', 'id'),
+        Column('Title', 'title'),
+        Column('Category', 'category__name', format=lambda name: name or ''),
+        choice_column('Priority', 'priority', Petition._meta.get_field('priority')),
+        choice_column('Status', 'status', Petition._meta.get_field('status')),
+        name_column('Created By', 'created_by'),
+        Column('Moze', 'moze__name', format=lambda name: name or ''),
+        date_column('Created At', 'created_at'),
+        Column('Description', 'description', format=lambda text: text[:100] + '...' if len(text) > 100 else text),
+    ]
+    return StreamingExport('petitions', [ExportSource(petitions, columns)]).response(export_format(request))
 
 
 @login_required
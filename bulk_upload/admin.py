@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.http import HttpResponseRedirect
-from .models import BulkUploadSession, BulkUploadRecord, UploadTemplate
+from .models import BulkUploadSession, BulkUploadRecord, UploadTemplate, ChunkedUpload
 
 @admin.register(BulkUploadSession)
 class BulkUploadSessionAdmin(admin.ModelAdmin):
@@ -100,3 +100,11 @@ class UploadTemplateAdmin(admin.ModelAdmin):
     list_filter = ['upload_type', 'is_active']
     search_fields = ['name', 'description']
     ordering = ['upload_type', 'name']
+
+@admin.register(ChunkedUpload)
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = ['original_filename', 'upload_type', 'uploaded_by', 'status', 'offset', 'total_size', 'created_at']
+    list_filter = ['status', 'upload_type', 'created_at']
+    search_fields = ['original_filename', 'uploaded_by__username']
+    readonly_fields = ['upload_id', 'offset', 'total_size', 'file_path', 'session', 'created_at', 'updated_at']
+    ordering = ['-created_at']
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bulk_upload.services import ChunkedUploadService
+
+
+class Command(BaseCommand):
+    help = 'Delete resumable uploads abandoned before completion, with their partial files'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Delete uploads not touched for this many hours (default: 24)'
+        )
+    
+    def handle(self, *args, **options):
+        if options['hours'] < 1:
+            raise CommandError('--hours must be positive')
+        
+        deleted = ChunkedUploadService.discard_stale_uploads(options['hours'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} abandoned uploads')
+        )
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bulk_upload', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkuploadsession',
+            name='created_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkuploadsession',
+            name='unchanged_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkuploadsession',
+            name='updated_rows',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
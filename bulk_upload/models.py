@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 import json
+import uuid
 
 
 class BulkUploadSession(models.Model):
@@ -38,6 +39,10 @@ class BulkUploadSession(models.Model):
     original_filename = models.CharField(max_length=255)
     file_path = models.CharField(max_length=500, blank=True, null=True)
     file_size = models.PositiveIntegerField(help_text='File size in bytes')
+    content_hash = models.CharField(
+        max_length=64, blank=True, null=True, db_index=True,
+        help_text='SHA-256 of the uploaded file, used to detect re-uploads'
+    )
     
     # Processing status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -50,6 +55,11 @@ class BulkUploadSession(models.Model):
     failed_rows = models.PositiveIntegerField(default=0)
     skipped_rows = models.PositiveIntegerField(default=0)
     
+    # Upsert results (successful_rows = created_rows + updated_rows)
+    created_rows = models.PositiveIntegerField(default=0)
+    updated_rows = models.PositiveIntegerField(default=0)
+    unchanged_rows = models.PositiveIntegerField(default=0)
+    
     # Processing details
     validation_errors = models.JSONField(default=dict, blank=True)
     processing_log = models.JSONField(default=list, blank=True)
@@ -213,3 +223,49 @@ class UploadTemplate(models.Model):
             if required_col not in headers:
                 missing_headers.append(required_col)
         return missing_headers
+
+
+class ChunkedUpload(models.Model):
+    """A resumable upload assembled from byte-range chunks before it becomes a session"""
+    
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+    
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chunked_uploads'
+    )
+    upload_type = models.CharField(max_length=20, choices=BulkUploadSession.UPLOAD_TYPE_CHOICES)
+    original_filename = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=500)
+    total_size = models.PositiveBigIntegerField(help_text='Expected file size in bytes')
+    offset = models.PositiveBigIntegerField(default=0, help_text='Bytes received so far')
+    options = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    session = models.ForeignKey(
+        BulkUploadSession,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='chunked_uploads'
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Chunked Upload'
+        verbose_name_plural = 'Chunked Uploads'
+    
+    def __str__(self):
+        return f"{self.original_filename} ({self.offset}/{self.total_size} bytes)"
+    
+    @property
+    def is_complete(self):
+        return self.offset >= self.total_size
@@ -0,0 +1,280 @@
+"""
+Compiled upload schemas
+
+An ``UploadTemplate`` describes its columns and validation rules as JSON.
+Interpreting that JSON for every cell is wasteful, so each template is
+compiled once into a ``CompiledSchema``: the rules become typed converter
+functions and the header mapping is resolved once per file. Rows are then
+coerced column by column.
+
+Compiled schemas are cached per template version (primary key plus
+``updated_at``), so editing a template in the admin recompiles it.
+"""
+import difflib
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .models import UploadTemplate
+
+TRUE_VALUES = frozenset(['true', '1', 'yes', 'y', 't'])
+FALSE_VALUES = frozenset(['false', '0', 'no', 'n', 'f'])
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+PHONE_PATTERN = re.compile(r'^\+?[\d\s\-()]{6,20}$')
+HEADER_CLEANUP = re.compile(r'[^a-z0-9]+')
+
+# Minimum difflib ratio for a header to be matched to a template column
+FUZZY_HEADER_CUTOFF = 0.8
+
+DATE_FORMATS = {
+    'YYYY-MM-DD': '%Y-%m-%d',
+    'DD/MM/YYYY': '%d/%m/%Y',
+    'MM/DD/YYYY': '%m/%d/%Y',
+}
+
+_SCHEMA_CACHE: Dict[Tuple[int, Any], 'CompiledSchema'] = {}
+
+
+def normalize_header(header: str) -> str:
+    """Lower-case a header and collapse punctuation/whitespace to underscores"""
+    return HEADER_CLEANUP.sub('_', str(header).strip().lower()).strip('_')
+
+
+def _string_converter(rule: Dict[str, Any]) -> Callable[[str], str]:
+    pattern = re.compile(rule['pattern']) if rule.get('pattern') else None
+    length = rule.get('length')
+    max_length = rule.get('max_length')
+    
+    def convert(value):
+        if length is not None and len(value) != length:
+            raise ValueError(f'must be exactly {length} characters')
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f'must be at most {max_length} characters')
+        if pattern is not None and not pattern.match(value):
+            raise ValueError('has an invalid format')
+        return value
+    return convert
+
+
+def _email_converter(rule: Dict[str, Any]) -> Callable[[str], str]:
+    def convert(value):
+        value = value.lower()
+        if not EMAIL_PATTERN.match(value):
+            raise ValueError('is not a valid email address')
+        return value
+    return convert
+
+
+def _phone_converter(rule: Dict[str, Any]) -> Callable[[str], str]:
+    def convert(value):
+        if not PHONE_PATTERN.match(value):
+            raise ValueError('is not a valid phone number')
+        return value
+    return convert
+
+
+def _date_converter(rule: Dict[str, Any]) -> Callable[[str], date]:
+    date_format = DATE_FORMATS.get(rule.get('format', 'YYYY-MM-DD'), '%Y-%m-%d')
+    
+    def convert(value):
+        if date_format == '%Y-%m-%d':
+            try:
+                return date.fromisoformat(value[:10])
+            except ValueError:
+                raise ValueError('must be a date in YYYY-MM-DD format')
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            raise ValueError(f"must be a date in {rule.get('format')} format")
+    return convert
+
+
+def _integer_converter(rule: Dict[str, Any]) -> Callable[[str], int]:
+    minimum = rule.get('min')
+    maximum = rule.get('max')
+    
+    def convert(value):
+        try:
+            number = int(float(value)) if '.' in value else int(value)
+        except ValueError:
+            raise ValueError('must be a whole number')
+        if minimum is not None and number < minimum:
+            raise ValueError(f'must be at least {minimum}')
+        if maximum is not None and number > maximum:
+            raise ValueError(f'must be at most {maximum}')
+        return number
+    return convert
+
+
+def _decimal_converter(rule: Dict[str, Any]) -> Callable[[str], Decimal]:
+    minimum = Decimal(str(rule['min'])) if rule.get('min') is not None else None
+    maximum = Decimal(str(rule['max'])) if rule.get('max') is not None else None
+    
+    def convert(value):
+        try:
+            number = Decimal(value)
+        except InvalidOperation:
+            raise ValueError('must be a number')
+        if minimum is not None and number < minimum:
+            raise ValueError(f'must be at least {minimum}')
+        if maximum is not None and number > maximum:
+            raise ValueError(f'must be at most {maximum}')
+        return number
+    return convert
+
+
+def _boolean_converter(rule: Dict[str, Any]) -> Callable[[str], bool]:
+    def convert(value):
+        lowered = value.lower()
+        if lowered in TRUE_VALUES:
+            return True
+        if lowered in FALSE_VALUES:
+            return False
+        raise ValueError('must be true or false')
+    return convert
+
+
+def _choice_converter(rule: Dict[str, Any]) -> Callable[[str], str]:
+    choices = frozenset(rule.get('choices', []))
+    lowered_choices = {choice.lower(): choice for choice in choices}
+    
+    def convert(value):
+        if value in choices:
+            return value
+        match = lowered_choices.get(value.lower())
+        if match is None:
+            raise ValueError(f"must be one of: {', '.join(sorted(choices))}")
+        return match
+    return convert
+
+
+CONVERTER_FACTORIES = {
+    'string': _string_converter,
+    'email': _email_converter,
+    'phone': _phone_converter,
+    'date': _date_converter,
+    'integer': _integer_converter,
+    'decimal': _decimal_converter,
+    'boolean': _boolean_converter,
+    'choice': _choice_converter,
+}
+
+
+class HeaderBinding:
+    """Header-to-field mapping for one file, resolved once"""
+    
+    def __init__(self, mapping: Dict[str, str], missing_required: List[str], unknown_headers: List[str]):
+        self.mapping = mapping
+        self.missing_required = missing_required
+        self.unknown_headers = unknown_headers
+    
+    def remap(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Rename row keys from file headers to template fields"""
+        items = list(self.mapping.items())
+        remapped = []
+        for row in rows:
+            new_row = {field: row.get(header, '') for header, field in items}
+            for key, value in row.items():
+                if key not in self.mapping:
+                    new_row.setdefault(key, value)
+            remapped.append(new_row)
+        return remapped
+
+
+class CompiledSchema:
+    """An upload template compiled into a column index and typed converters"""
+    
+    def __init__(self, template: UploadTemplate):
+        self.upload_type = template.upload_type
+        self.required_columns = list(template.required_columns)
+        self.columns = template.get_all_columns()
+        
+        mappings = template.column_mappings or {}
+        self.column_fields = {column: mappings.get(column, column) for column in self.columns}
+        self.normalized_columns = {normalize_header(column): column for column in self.columns}
+        
+        rules = template.validation_rules or {}
+        self.converters = {}
+        for column, rule in rules.items():
+            factory = CONVERTER_FACTORIES.get(rule.get('type'))
+            if factory and column in self.column_fields:
+                self.converters[self.column_fields[column]] = factory(rule)
+    
+    def bind(self, headers: List[str]) -> HeaderBinding:
+        """
+        Resolve file headers to template fields.
+        
+        Headers are matched exactly, then after normalisation ("First Name"
+        -> first_name), then fuzzily against the remaining template columns.
+        """
+        mapping = {}
+        unknown = []
+        unmatched_columns = dict(self.normalized_columns)
+        
+        pending = []
+        for header in headers:
+            if header == '_row_number':
+                continue
+            normalized = normalize_header(header)
+            column = unmatched_columns.pop(normalized, None)
+            if column is None:
+                pending.append((header, normalized))
+            else:
+                mapping[header] = self.column_fields[column]
+        
+        for header, normalized in pending:
+            close = difflib.get_close_matches(normalized, list(unmatched_columns), n=1, cutoff=FUZZY_HEADER_CUTOFF)
+            if close:
+                column = unmatched_columns.pop(close[0])
+                mapping[header] = self.column_fields[column]
+            else:
+                unknown.append(header)
+        
+        bound_fields = set(mapping.values())
+        missing = [column for column in self.required_columns if self.column_fields[column] not in bound_fields]
+        return HeaderBinding(mapping, missing, unknown)
+    
+    def coerce(self, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[int, List[str]]]:
+        """
+        Convert rows column by column.
+        
+        Blank cells are left as empty strings so callers can apply their own
+        defaults. Returns the typed rows (new dicts) and a mapping of row
+        index to validation error messages.
+        """
+        typed_rows = [dict(row) for row in rows]
+        errors: Dict[int, List[str]] = {}
+        
+        for field, convert in self.converters.items():
+            for index, row in enumerate(typed_rows):
+                value = row.get(field)
+                if value is None or value == '' or not isinstance(value, str):
+                    continue
+                try:
+                    row[field] = convert(value.strip())
+                except ValueError as e:
+                    errors.setdefault(index, []).append(f'{field} {e}')
+        
+        return typed_rows, errors
+
+
+def compile_schema(template: UploadTemplate) -> CompiledSchema:
+    """Return the compiled schema for a template, compiling it once per version"""
+    key = (template.pk, template.updated_at)
+    schema = _SCHEMA_CACHE.get(key)
+    if schema is None:
+        # Drop compiled versions of the same template that are now stale
+        for stale_key in [k for k in _SCHEMA_CACHE if k[0] == template.pk]:
+            del _SCHEMA_CACHE[stale_key]
+        schema = _SCHEMA_CACHE[key] = CompiledSchema(template)
+    return schema
+
+
+def get_upload_schema(upload_type: str) -> Optional[CompiledSchema]:
+    """Compiled schema of the active template for an upload type, if any"""
+    template = UploadTemplate.objects.filter(upload_type=upload_type, is_active=True).first()
+    if template is None:
+        return None
+    return compile_schema(template)
@@ -2,9 +2,12 @@
 Bulk Upload Services for processing Excel/CSV files
 """
 import csv
+import hashlib
 import json
+import os
+import tempfile
 from typing import Dict, List, Any, Tuple, Optional
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from decimal import Decimal
 import re
 
@@ -14,7 +17,8 @@ from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.utils import timezone
 
-from .models import BulkUploadSession, BulkUploadRecord, UploadTemplate
+from .models import BulkUploadSession, BulkUploadRecord, UploadTemplate, ChunkedUpload
+from .schema import get_upload_schema
 from accounts.models import User
 from accounts.services import MockITSService
 from students.models import Student
@@ -127,21 +131,147 @@ class FileProcessor:
         return data
 
 
+UPSERT_CHUNK_SIZE = 1000
+
+
+def _parse_bool(value) -> bool:
+    """Accept booleans coerced by the upload schema as well as raw 'true' strings"""
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() == 'true'
+
+
+class UserUpserter:
+    """
+    Create-or-update users keyed by ITS ID.
+    
+    Each chunk of rows is matched against existing users with a single
+    query, diffed field by field and written back with one ``bulk_update``
+    restricted to the columns that actually changed. Unchanged rows cause
+    no writes at all. Rows for unknown ITS IDs are handed to ``create_user``.
+    """
+    
+    UPDATABLE_FIELDS = [
+        'first_name', 'last_name', 'email', 'role', 'mobile_number', 'phone_number',
+        'arabic_full_name', 'occupation', 'qualification', 'idara', 'category',
+    ]
+    
+    def __init__(self, create_user, fields: Optional[List[str]] = None, dry_run: bool = False):
+        self.create_user = create_user
+        self.fields = fields or self.UPDATABLE_FIELDS
+        self.dry_run = dry_run
+        self.valid_roles = {choice[0] for choice in User.ROLE_CHOICES}
+    
+    def _clean_row(self, row: Dict[str, Any]) -> Dict[str, str]:
+        """Normalise the updatable values present in a row (blank cells are ignored)"""
+        values = {}
+        for field in self.fields:
+            value = str(row.get(field) or '').strip()
+            if value:
+                values[field] = value.lower() if field == 'email' else value
+        return values
+    
+    def upsert_chunk(self, rows: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], str, Any]]:
+        """
+        Upsert a chunk of rows.
+        
+        Returns a list of ``(row, action, detail)`` tuples where action is one
+        of ``created``, ``updated``, ``unchanged`` or ``failed``. ``detail`` is
+        the user for created rows, the list of changed fields for updated
+        rows and the error message for failed rows.
+        """
+        results = []
+        keyed_rows = []
+        for row in rows:
+            its_id = str(row.get('its_id') or '').strip()
+            if not its_id:
+                results.append((row, 'failed', 'Missing required field: its_id'))
+                continue
+            values = self._clean_row(row)
+            if 'role' in values and values['role'] not in self.valid_roles:
+                results.append((row, 'failed', f"Invalid role: {values['role']}"))
+                continue
+            keyed_rows.append((row, its_id, values))
+        
+        existing = User.objects.in_bulk([its_id for _, its_id, _ in keyed_rows], field_name='its_id')
+        
+        # Email is unique, so look up the owners of every incoming address at once
+        email_owners = dict(
+            User.objects.filter(
+                email__in=[values['email'] for _, _, values in keyed_rows if 'email' in values]
+            ).values_list('email', 'its_id')
+        )
+        
+        to_update = []
+        changed_fields = set()
+        for row, its_id, values in keyed_rows:
+            user = existing.get(its_id)
+            email = values.get('email')
+            if email and email_owners.get(email, its_id) != its_id:
+                results.append((row, 'failed', f"User with email {email} already exists"))
+                continue
+            
+            if user is None:
+                if self.dry_run:
+                    results.append((row, 'created', None))
+                    continue
+                try:
+                    with transaction.atomic():
+                        created = self.create_user(row)
+                    results.append((row, 'created', created))
+                except Exception as e:
+                    results.append((row, 'failed', str(e)))
+                continue
+            
+            changes = [
+                field for field, value in values.items()
+                if (getattr(user, field) or '') != value
+            ]
+            if not changes:
+                results.append((row, 'unchanged', None))
+                continue
+            
+            for field in changes:
+                setattr(user, field, values[field])
+            to_update.append(user)
+            changed_fields.update(changes)
+            results.append((row, 'updated', changes))
+        
+        if to_update and not self.dry_run:
+            # bulk_update skips auto_now, so bump updated_at explicitly
+            now = timezone.now()
+            for user in to_update:
+                user.updated_at = now
+            User.objects.bulk_update(to_update, sorted(changed_fields) + ['updated_at'])
+        
+        return results
+
+
 class DataProcessor:
     """Process and validate data for different entity types"""
     
+    UPSERT_TYPES = ['users']
+    
     def __init__(self, upload_session: BulkUploadSession):
         self.session = upload_session
         self.upload_type = upload_session.upload_type
+        self.mode = (upload_session.options or {}).get('mode', 'create')
     
     def process_data(self, data: List[Dict[str, Any]]) -> None:
         """Process all data rows"""
+        data, typed_data, row_errors = self._apply_schema(data)
+        
+        if self.mode == 'upsert':
+            return self.upsert_data(data)
+        
         self.session.total_rows = len(data)
         self.session.status = 'processing'
         self.session.save()
         
-        for row_data in data:
+        for index, row_data in enumerate(data):
             row_number = row_data.pop('_row_number', 0)
+            typed_row = typed_data[index]
+            typed_row.pop('_row_number', None)
             
             # Create record for tracking
             record = BulkUploadRecord.objects.create(
@@ -150,17 +280,103 @@ class DataProcessor:
                 raw_data=row_data
             )
             
+            if index in row_errors:
+                record.mark_failed('Validation failed', row_errors[index])
+                self.session.add_log_entry('error', f"Row {row_number}: {'; '.join(row_errors[index])}", row_number)
+                continue
+            
             try:
                 # Process based on upload type
-                created_object = self._process_single_row(row_data, record)
+                created_object = self._process_single_row(typed_row, record)
                 record.mark_success(created_object)
-                
+            
             except Exception as e:
                 record.mark_failed(str(e))
                 self.session.add_log_entry('error', f"Row {row_number}: {str(e)}", row_number)
         
         self.session.mark_completed()
     
+    def _apply_schema(self, data: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[int, List[str]]]:
+        """
+        Map file headers onto template fields and coerce values column-wise.
+        
+        Returns the remapped raw rows (JSON-safe, stored on the records), the
+        typed rows handed to the create methods and per-row validation errors.
+        """
+        schema = get_upload_schema(self.upload_type)
+        if schema is None or not data:
+            return data, data, {}
+        
+        binding = schema.bind(list(data[0].keys()))
+        if binding.missing_required:
+            self.session.add_log_entry(
+                'warning', f"Missing template columns: {', '.join(binding.missing_required)}"
+            )
+        
+        rows = binding.remap(data)
+        typed_rows, row_errors = schema.coerce(rows)
+        return rows, typed_rows, row_errors
+    
+    def upsert_data(self, data: List[Dict[str, Any]], chunk_size: int = UPSERT_CHUNK_SIZE) -> None:
+        """
+        Create new rows and update changed ones, keyed by ITS ID.
+        
+        Tracking records are only written for created, updated and failed
+        rows, so re-importing an unchanged sheet leaves the data untouched.
+        """
+        if self.upload_type not in self.UPSERT_TYPES:
+            raise ValueError(f"Upsert mode is not supported for upload type: {self.upload_type}")
+        
+        self.session.total_rows = len(data)
+        self.session.status = 'processing'
+        self.session.save()
+        
+        upserter = UserUpserter(create_user=lambda row: self._create_user(row, None))
+        counter_fields = [
+            'successful_rows', 'failed_rows', 'skipped_rows',
+            'created_rows', 'updated_rows', 'unchanged_rows',
+        ]
+        
+        for start in range(0, len(data), chunk_size):
+            chunk = data[start:start + chunk_size]
+            records = []
+            
+            for row_data, action, detail in upserter.upsert_chunk(chunk):
+                row_number = row_data.pop('_row_number', 0)
+                if action == 'unchanged':
+                    self.session.unchanged_rows += 1
+                    self.session.skipped_rows += 1
+                    continue
+                
+                record = BulkUploadRecord(session=self.session, row_number=row_number, raw_data=row_data)
+                if action == 'failed':
+                    record.status = 'failed'
+                    record.error_message = detail
+                    self.session.failed_rows += 1
+                else:
+                    record.status = 'success'
+                    record.processed_data = {'action': action}
+                    if action == 'created':
+                        if detail is not None:
+                            record.created_object_type = detail.__class__.__name__
+                            record.created_object_id = detail.pk
+                        self.session.created_rows += 1
+                    else:
+                        record.processed_data['changed_fields'] = detail
+                        self.session.updated_rows += 1
+                    self.session.successful_rows += 1
+                records.append(record)
+            
+            BulkUploadRecord.objects.bulk_create(records)
+            self.session.save(update_fields=counter_fields)
+        
+        self.session.add_log_entry(
+            'info',
+            f"Upsert finished: {self.session.created_rows} created, "
+            f"{self.session.updated_rows} updated, {self.session.unchanged_rows} unchanged"
+        )
+        self.session.mark_completed()
+    
     def _process_single_row(self, row_data: Dict[str, Any], record: BulkUploadRecord) -> Any:
         """Process a single row based on upload type"""
         if self.upload_type == 'users':
@@ -211,7 +427,7 @@ class DataProcessor:
                 its_id=its_id,
                 role=row_data['role'],
                 is_active=True,
-                password=f"temp_{its_id}"  # Temporary password
+                password=None  # Unusable until activated via accounts.provisioning
             )
             
             # Add additional ITS data if available
@@ -284,13 +500,15 @@ class DataProcessor:
             )
             
             # Add expected graduation date if provided
-            if row_data.get('expected_graduation'):
+            grad_date = row_data.get('expected_graduation')
+            if isinstance(grad_date, str) and grad_date:
                 try:
-                    grad_date = datetime.strptime(row_data['expected_graduation'], '%Y-%m-%d').date()
-                    student.expected_graduation = grad_date
-                    student.save()
+                    grad_date = datetime.strptime(grad_date, '%Y-%m-%d').date()
                 except ValueError:
-                    pass
+                    grad_date = None
+            if grad_date:
+                student.expected_graduation = grad_date
+                student.save()
         
         return student
     
@@ -327,7 +545,7 @@ class DataProcessor:
                 license_number=row_data.get('license_number', f'LIC{its_id}'),
                 experience_years=int(row_data.get('experience_years', 0)),
                 consultation_fee=Decimal(row_data.get('consultation_fee', '500.00')),
-                is_available=row_data.get('is_available', 'true').lower() == 'true'
+                is_available=_parse_bool(row_data.get('is_available', 'true'))
             )
             
             # Add optional fields
@@ -407,7 +625,7 @@ class DataProcessor:
                 capacity=int(row_data.get('capacity', 100)),
                 contact_phone=row_data.get('contact_phone', ''),
                 contact_email=row_data.get('contact_email', ''),
-                is_active=row_data.get('is_active', 'true').lower() == 'true'
+                is_active=_parse_bool(row_data.get('is_active', 'true'))
             )
             
             # Add coordinator if specified
@@ -423,11 +641,28 @@ class DataProcessor:
         return moze
 
 
+HASH_READ_SIZE = 1024 * 1024
+CHUNK_COPY_SIZE = 64 * 1024
+
+
+def compute_file_hash(file_path: str, read_size: int = HASH_READ_SIZE) -> str:
+    """Stream a file through SHA-256 without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(read_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 class BulkUploadService:
     """Main service for handling bulk uploads"""
     
+    # Sessions whose results can be reused for an identical file
+    REUSABLE_STATUSES = ['completed', 'partially_completed']
+    
     @staticmethod
-    def create_upload_session(user, upload_type: str, file_path: str, filename: str, file_size: int, options: Dict = None) -> BulkUploadSession:
+    def create_upload_session(user, upload_type: str, file_path: str, filename: str, file_size: int,
+                              options: Dict = None, content_hash: str = None) -> BulkUploadSession:
         """Create a new bulk upload session"""
         return BulkUploadSession.objects.create(
             upload_type=upload_type,
@@ -435,9 +670,56 @@ class BulkUploadService:
             original_filename=filename,
             file_path=file_path,
             file_size=file_size,
+            content_hash=content_hash,
             options=options or {}
         )
     
+    @staticmethod
+    def find_duplicate_session(user, upload_type: str, content_hash: str,
+                               options: Dict = None) -> Optional[BulkUploadSession]:
+        """Return the user's latest finished session for an identical file, type and mode"""
+        mode = (options or {}).get('mode', 'create')
+        candidates = BulkUploadSession.objects.filter(
+            uploaded_by=user,
+            upload_type=upload_type,
+            content_hash=content_hash,
+            status__in=BulkUploadService.REUSABLE_STATUSES
+        ).order_by('-started_at')
+        for candidate in candidates:
+            if (candidate.options or {}).get('mode', 'create') == mode:
+                return candidate
+        return None
+    
+    @staticmethod
+    def create_or_reuse_session(user, upload_type: str, file_path: str, filename: str, file_size: int,
+                                options: Dict = None) -> Tuple[BulkUploadSession, bool]:
+        """
+        Hash a stored upload and short-circuit to a previous result for identical content.
+        
+        Returns ``(session, reused)``. When an identical file was already
+        processed the temporary file is removed and the earlier session is
+        returned instead of creating a new one.
+        """
+        content_hash = compute_file_hash(file_path)
+        duplicate = BulkUploadService.find_duplicate_session(user, upload_type, content_hash, options)
+        if duplicate:
+            try:
+                os.unlink(file_path)
+            except OSError:
+                pass
+            return duplicate, True
+        
+        session = BulkUploadService.create_upload_session(
+            user=user,
+            upload_type=upload_type,
+            file_path=file_path,
+            filename=filename,
+            file_size=file_size,
+            options=options,
+            content_hash=content_hash
+        )
+        return session, False
+    
     @staticmethod
     def process_upload(session: BulkUploadSession) -> None:
         """Process an upload session"""
@@ -449,10 +731,14 @@ class BulkUploadService:
             # Process the data
             data_processor = DataProcessor(session)
             data_processor.process_data(data)
-            
+        
         except Exception as e:
             session.mark_failed(str(e))
             raise
+        
+        finally:
+            # An assembled chunked upload is not needed once processed
+            ChunkedUploadService.discard_file(session.file_path)
     
     @staticmethod
     def get_upload_templates() -> Dict[str, UploadTemplate]:
@@ -465,9 +751,137 @@ class BulkUploadService:
     @staticmethod
     def validate_file_headers(upload_type: str, headers: List[str]) -> Tuple[bool, List[str]]:
         """Validate file headers against template requirements"""
+        schema = get_upload_schema(upload_type)
+        if schema is None:
+            return True, []  # No template validation
+        
+        # Headers are matched the same way as during processing (case, spacing, near misses)
+        missing_headers = schema.bind(headers).missing_required
+        return len(missing_headers) == 0, missing_headers
+
+
+class ChunkedUploadService:
+    """Assemble resumable uploads from byte-range chunks"""
+    
+    CHUNK_DIR = os.path.join(tempfile.gettempdir(), 'bulk_upload_chunks')
+    
+    @staticmethod
+    def start_upload(user, upload_type: str, filename: str, total_size: int, options: Dict = None) -> ChunkedUpload:
+        """Create an empty temporary file and the upload record tracking it"""
+        os.makedirs(ChunkedUploadService.CHUNK_DIR, exist_ok=True)
+        extension = filename.split('.')[-1].lower()
+        temp_fd, temp_file_path = tempfile.mkstemp(
+            suffix=f'.{extension}',
+            prefix=f'bulk_upload_{user.id}_',
+            dir=ChunkedUploadService.CHUNK_DIR
+        )
+        os.close(temp_fd)
+        
+        return ChunkedUpload.objects.create(
+            uploaded_by=user,
+            upload_type=upload_type,
+            original_filename=filename,
+            file_path=temp_file_path,
+            total_size=total_size,
+            options=options or {}
+        )
+    
+    @staticmethod
+    def append_chunk(upload: ChunkedUpload, start: int, stream, length: int) -> ChunkedUpload:
+        """
+        Append ``length`` bytes read from ``stream`` at byte ``start``.
+        
+        The upload row is locked so concurrent retries of the same range
+        cannot interleave. Raises ValueError when ``start`` does not match the
+        bytes already received; the caller should resume from ``upload.offset``.
+        """
+        with transaction.atomic():
+            upload = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+            if upload.status != 'uploading':
+                raise ValueError('Upload is already complete')
+            if start != upload.offset:
+                raise ValueError(f'Expected chunk starting at byte {upload.offset}, got {start}')
+            if upload.offset + length > upload.total_size:
+                raise ValueError('Chunk extends past the declared file size')
+            
+            written = 0
+            with open(upload.file_path, 'r+b') as file:
+                file.seek(upload.offset)
+                file.truncate()
+                while written < length:
+                    block = stream.read(min(CHUNK_COPY_SIZE, length - written))
+                    if not block:
+                        break
+                    file.write(block)
+                    written += len(block)
+            
+            if written != length:
+                raise ValueError(f'Chunk truncated: expected {length} bytes, received {written}')
+            
+            upload.offset += written
+            upload.save(update_fields=['offset', 'updated_at'])
+        return upload
+    
+    @staticmethod
+    def complete_upload(upload: ChunkedUpload) -> Tuple[BulkUploadSession, bool]:
+        """
+        Turn a fully received upload into a session, reusing results for identical files.
+        
+        The upload row stays locked until its status is updated, so of
+        concurrent calls only the first hashes the file and creates a
+        session; the others return that session. An assembled file that
+        cannot be read is deleted and the upload marked failed.
+        """
+        with transaction.atomic():
+            upload = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+            if upload.status == 'complete' and upload.session_id:
+                return upload.session, False
+            if upload.status != 'uploading':
+                raise ValueError('This upload can no longer be completed, please upload the file again')
+            if not upload.is_complete:
+                raise ValueError(f'Upload incomplete: {upload.offset} of {upload.total_size} bytes received')
+            
+            try:
+                session, reused = BulkUploadService.create_or_reuse_session(
+                    user=upload.uploaded_by,
+                    upload_type=upload.upload_type,
+                    file_path=upload.file_path,
+                    filename=upload.original_filename,
+                    file_size=upload.total_size,
+                    options=upload.options
+                )
+            except OSError as e:
+                ChunkedUploadService.discard_file(upload.file_path)
+                upload.status = 'failed'
+                upload.save(update_fields=['status', 'updated_at'])
+                error = e
+            else:
+                upload.status = 'complete'
+                upload.session = session
+                upload.save(update_fields=['status', 'session', 'updated_at'])
+                return session, reused
+        
+        raise ValueError(f'Upload could not be read: {error}')
+    
+    @staticmethod
+    def discard_file(file_path: str) -> None:
+        """Delete an assembled upload file; files outside ``CHUNK_DIR`` are left alone"""
+        if not file_path or os.path.dirname(os.path.abspath(file_path)) != os.path.abspath(ChunkedUploadService.CHUNK_DIR):
+            return
         try:
-            template = UploadTemplate.objects.get(upload_type=upload_type, is_active=True)
-            missing_headers = template.validate_headers(headers)
-            return len(missing_headers) == 0, missing_headers
-        except UploadTemplate.DoesNotExist:
-            return True, []  # No template validation
\ No newline at end of file
+            os.unlink(file_path)
+        except OSError:
+            pass  # Already deleted
+    
+    @staticmethod
+    def discard_stale_uploads(max_age_hours: int) -> int:
+        """Delete uploads abandoned mid-transfer for ``max_age_hours`` and their files; returns how many"""
+        stale = ChunkedUpload.objects.exclude(status='complete').filter(
+            updated_at__lt=timezone.now() - timedelta(hours=max_age_hours)
+        )
+        count = 0
+        for upload in stale.iterator():
+            ChunkedUploadService.discard_file(upload.file_path)
+            upload.delete()
+            count += 1
+        return count
@@ -0,0 +1,131 @@
+"""
+Tests for compiled upload schemas
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from bulk_upload.models import BulkUploadSession, BulkUploadRecord, UploadTemplate
+from bulk_upload.schema import compile_schema, get_upload_schema
+from bulk_upload.services import BulkUploadService, DataProcessor
+
+User = get_user_model()
+
+
+class CompiledSchemaTest(TestCase):
+    """Test header binding, typed coercion and schema caching"""
+    
+    def setUp(self):
+        self.template = UploadTemplate.objects.create(
+            upload_type='doctors',
+            name='Doctors Template',
+            description='Doctors',
+            required_columns=['its_id', 'first_name', 'last_name', 'specialization'],
+            optional_columns=['email', 'experience_years', 'consultation_fee', 'is_available', 'joined_on'],
+            column_mappings={'its_id': 'its_id', 'joined_on': 'joined_on'},
+            validation_rules={
+                'its_id': {'type': 'string', 'length': 8, 'pattern': r'^\d{8}$'},
+                'email': {'type': 'email'},
+                'experience_years': {'type': 'integer', 'min': 0, 'max': 50},
+                'consultation_fee': {'type': 'decimal', 'min': 0},
+                'is_available': {'type': 'boolean'},
+                'joined_on': {'type': 'date', 'format': 'YYYY-MM-DD'},
+            }
+        )
+    
+    def test_bind_matches_headers_loosely(self):
+        schema = compile_schema(self.template)
+        binding = schema.bind(['ITS ID', 'First Name', 'last-name', 'Specialisation', 'Notes'])
+        
+        self.assertEqual(binding.mapping['ITS ID'], 'its_id')
+        self.assertEqual(binding.mapping['First Name'], 'first_name')
+        self.assertEqual(binding.mapping['last-name'], 'last_name')
+        self.assertEqual(binding.mapping['Specialisation'], 'specialization')
+        self.assertEqual(binding.unknown_headers, ['Notes'])
+        self.assertEqual(binding.missing_required, [])
+    
+    def test_bind_reports_missing_required_columns(self):
+        binding = compile_schema(self.template).bind(['its_id', 'first_name'])
+        self.assertEqual(binding.missing_required, ['last_name', 'specialization'])
+    
+    def test_coerce_converts_columns_and_collects_errors(self):
+        schema = compile_schema(self.template)
+        rows = [
+            {'its_id': '50000001', 'experience_years': '12', 'consultation_fee': '750.50',
+             'is_available': 'Yes', 'joined_on': '2024-01-15', 'email': 'Dr@Example.com'},
+            {'its_id': '123', 'experience_years': 'ten', 'consultation_fee': '',
+             'is_available': 'maybe', 'joined_on': '15/01/2024', 'email': ''},
+        ]
+        typed, errors = schema.coerce(rows)
+        
+        self.assertEqual(typed[0]['experience_years'], 12)
+        self.assertEqual(typed[0]['consultation_fee'], Decimal('750.50'))
+        self.assertIs(typed[0]['is_available'], True)
+        self.assertEqual(typed[0]['joined_on'], date(2024, 1, 15))
+        self.assertEqual(typed[0]['email'], 'dr@example.com')
+        self.assertNotIn(0, errors)
+        
+        # Blank cells are left for the caller's defaults
+        self.assertEqual(typed[1]['consultation_fee'], '')
+        self.assertEqual(len(errors[1]), 4)
+        # Source rows are not modified
+        self.assertEqual(rows[0]['experience_years'], '12')
+    
+    def test_schema_cached_per_template_version(self):
+        first = get_upload_schema('doctors')
+        self.assertIs(get_upload_schema('doctors'), first)
+        
+        self.template.optional_columns = self.template.optional_columns + ['clinic_address']
+        self.template.save()
+        second = get_upload_schema('doctors')
+        self.assertIsNot(second, first)
+        self.assertIn('clinic_address', second.columns)
+    
+    def test_validate_file_headers_uses_schema(self):
+        valid, missing = BulkUploadService.validate_file_headers(
+            'doctors', ['ITS ID', 'First Name', 'Last Name', 'Specialization']
+        )
+        self.assertTrue(valid)
+        self.assertEqual(missing, [])
+        self.assertEqual(BulkUploadService.validate_file_headers('moze', ['name']), (True, []))
+    
+    def test_data_processor_applies_schema(self):
+        UploadTemplate.objects.create(
+            upload_type='users',
+            name='Users Template',
+            description='Users',
+            required_columns=['its_id', 'first_name', 'last_name', 'email', 'role'],
+            optional_columns=['mobile_number'],
+            validation_rules={
+                'its_id': {'type': 'string', 'length': 8, 'pattern': r'^\d{8}$'},
+                'email': {'type': 'email'},
+                'role': {'type': 'choice', 'choices': ['doctor', 'student']},
+            }
+        )
+        admin = User.objects.create_user(
+            username='admin', email='admin@test.com', password='test123', role='badri_mahal_admin'
+        )
+        session = BulkUploadSession.objects.create(
+            upload_type='users', uploaded_by=admin, original_filename='users.csv', file_size=100
+        )
+        rows = [
+            {'_row_number': 2, 'ITS ID': '50000011', 'First Name': 'Ali', 'Last Name': 'Hasan',
+             'E-mail': 'Ali@Test.com', 'Role': 'Doctor'},
+            {'_row_number': 3, 'ITS ID': '5000', 'First Name': 'Bad', 'Last Name': 'Row',
+             'E-mail': 'bad@test.com', 'Role': 'student'},
+        ]
+        DataProcessor(session).process_data(rows)
+        
+        session.refresh_from_db()
+        self.assertEqual(session.successful_rows, 1)
+        self.assertEqual(session.failed_rows, 1)
+        
+        user = User.objects.get(its_id='50000011')
+        self.assertEqual(user.email, 'ali@test.com')
+        self.assertEqual(user.role, 'doctor')
+        
+        failed = BulkUploadRecord.objects.get(session=session, row_number=3)
+        self.assertEqual(failed.validation_errors, ['its_id must be exactly 8 characters'])
+        self.assertEqual(failed.raw_data['its_id'], '5000')
@@ -0,0 +1,103 @@
+"""
+Tests for bulk upload services
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from bulk_upload.models import BulkUploadSession, BulkUploadRecord
+from bulk_upload.services import DataProcessor
+
+User = get_user_model()
+
+
+class UpsertModeTest(TestCase):
+    """Test the ITS-keyed upsert mode of DataProcessor"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='test123',
+            role='badri_mahal_admin'
+        )
+        self.existing = User.objects.create_user(
+            username='50000001',
+            email='existing@test.com',
+            first_name='Existing',
+            last_name='User',
+            its_id='50000001',
+            role='student'
+        )
+    
+    def _session(self):
+        return BulkUploadSession.objects.create(
+            upload_type='users',
+            uploaded_by=self.admin,
+            original_filename='users.csv',
+            file_size=100,
+            options={'mode': 'upsert'}
+        )
+    
+    def _rows(self, **overrides):
+        rows = [
+            {'_row_number': 2, 'its_id': '50000001', 'first_name': 'Existing', 'last_name': 'User',
+             'email': 'existing@test.com', 'role': 'student'},
+            {'_row_number': 3, 'its_id': '50000002', 'first_name': 'New', 'last_name': 'Person',
+             'email': 'new@test.com', 'role': 'doctor'},
+        ]
+        rows[0].update(overrides)
+        return rows
+    
+    def test_upsert_creates_and_updates(self):
+        session = self._session()
+        DataProcessor(session).process_data(self._rows(last_name='Corrected', mobile_number='5551234'))
+        
+        session.refresh_from_db()
+        self.assertEqual(session.created_rows, 1)
+        self.assertEqual(session.updated_rows, 1)
+        self.assertEqual(session.unchanged_rows, 0)
+        self.assertEqual(session.status, 'completed')
+        
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.last_name, 'Corrected')
+        self.assertEqual(self.existing.mobile_number, '5551234')
+        self.assertTrue(User.objects.filter(its_id='50000002').exists())
+        
+        updated_record = BulkUploadRecord.objects.get(session=session, row_number=2)
+        self.assertEqual(sorted(updated_record.processed_data['changed_fields']), ['last_name', 'mobile_number'])
+    
+    def test_unchanged_reimport_does_not_write_users(self):
+        DataProcessor(self._session()).process_data(self._rows())
+        
+        session = self._session()
+        with CaptureQueriesContext(connection) as queries:
+            DataProcessor(session).process_data(self._rows())
+        
+        user_writes = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith(('INSERT', 'UPDATE')) and '"accounts_user"' in q['sql'].split('SET')[0]
+        ]
+        self.assertEqual(user_writes, [])
+        
+        session.refresh_from_db()
+        self.assertEqual(session.unchanged_rows, 2)
+        self.assertEqual(session.created_rows + session.updated_rows, 0)
+        self.assertFalse(session.records.exists())
+    
+    def test_upsert_rejects_email_owned_by_other_user(self):
+        User.objects.create_user(username='other', email='taken@test.com', its_id='50000009')
+        session = self._session()
+        DataProcessor(session).process_data(self._rows(email='taken@test.com'))
+        
+        session.refresh_from_db()
+        self.assertEqual(session.failed_rows, 1)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.email, 'existing@test.com')
+    
+    def test_upsert_not_supported_for_other_types(self):
+        session = self._session()
+        session.upload_type = 'moze'
+        with self.assertRaises(ValueError):
+            DataProcessor(session).process_data([])
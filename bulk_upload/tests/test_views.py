@@ -0,0 +1,194 @@
+"""
+Tests for bulk upload views
+"""
+from datetime import timedelta
+import os
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from bulk_upload.models import BulkUploadSession, ChunkedUpload
+from bulk_upload.services import BulkUploadService, ChunkedUploadService, compute_file_hash
+
+User = get_user_model()
+
+CSV_CONTENT = (
+    b"its_id,first_name,last_name,email,role\n"
+    b"50000001,Test,User,test1@example.com,student\n"
+    b"50000002,Other,User,test2@example.com,doctor\n"
+)
+
+
+class UploadDeduplicationTest(TestCase):
+    """Test content-hash deduplication of uploaded files"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='test123',
+            role='badri_mahal_admin'
+        )
+        self.client.force_login(self.admin)
+    
+    def upload(self, **extra):
+        data = {
+            'upload_type': 'users',
+            'file': SimpleUploadedFile('users.csv', CSV_CONTENT, content_type='text/csv'),
+        }
+        data.update(extra)
+        return self.client.post(reverse('bulk_upload:create'), data)
+    
+    def test_upload_records_content_hash(self):
+        self.upload()
+        session = BulkUploadSession.objects.get()
+        self.assertEqual(session.content_hash, compute_file_hash(session.file_path))
+        self.assertEqual(session.file_size, len(CSV_CONTENT))
+    
+    def test_identical_file_reuses_finished_session(self):
+        self.upload()
+        first = BulkUploadSession.objects.get()
+        first.status = 'completed'
+        first.save()
+        
+        response = self.upload()
+        self.assertRedirects(response, reverse('bulk_upload:detail', kwargs={'pk': first.pk}), fetch_redirect_response=False)
+        self.assertEqual(BulkUploadSession.objects.count(), 1)
+    
+    def test_force_and_different_mode_create_new_sessions(self):
+        self.upload()
+        BulkUploadSession.objects.update(status='completed')
+        
+        self.upload(force='1')
+        self.upload(mode='upsert')
+        self.assertEqual(BulkUploadSession.objects.count(), 3)
+    
+    def test_other_users_sessions_are_not_reused(self):
+        self.upload()
+        BulkUploadSession.objects.update(status='completed')
+        
+        other_admin = User.objects.create_user(username='other_admin', password='test123', role='badri_mahal_admin')
+        self.client.force_login(other_admin)
+        self.upload()
+        
+        self.assertEqual(BulkUploadSession.objects.filter(uploaded_by=other_admin).count(), 1)
+
+
+class ChunkedUploadTest(TestCase):
+    """Test resumable byte-range uploads"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin',
+            email='admin@test.com',
+            password='test123',
+            role='badri_mahal_admin'
+        )
+        self.client.force_login(self.admin)
+    
+    def start(self):
+        response = self.client.post(reverse('bulk_upload:chunked_start'), {
+            'upload_type': 'users',
+            'filename': 'users.csv',
+            'total_size': len(CSV_CONTENT),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()['upload_id']
+    
+    def send(self, upload_id, start, end):
+        return self.client.put(
+            reverse('bulk_upload:chunked_chunk', kwargs={'upload_id': upload_id}),
+            CSV_CONTENT[start:end + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(CSV_CONTENT)}'
+        )
+    
+    def test_chunks_assemble_file_and_resume(self):
+        upload_id = self.start()
+        self.assertEqual(self.send(upload_id, 0, 39).json()['offset'], 40)
+        
+        # A retried or out-of-order range is rejected with the offset to resume from
+        response = self.send(upload_id, 60, 79)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 40)
+        
+        progress = self.client.get(reverse('bulk_upload:chunked_chunk', kwargs={'upload_id': upload_id}))
+        self.assertEqual(progress.json()['offset'], 40)
+        
+        self.send(upload_id, 40, len(CSV_CONTENT) - 1)
+        response = self.client.post(reverse('bulk_upload:chunked_complete', kwargs={'upload_id': upload_id}))
+        self.assertFalse(response.json()['duplicate'])
+        
+        session = BulkUploadSession.objects.get(pk=response.json()['session_id'])
+        with open(session.file_path, 'rb') as file:
+            self.assertEqual(file.read(), CSV_CONTENT)
+    
+    def test_incomplete_upload_cannot_complete(self):
+        upload_id = self.start()
+        self.send(upload_id, 0, 9)
+        response = self.client.post(reverse('bulk_upload:chunked_complete', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(BulkUploadSession.objects.exists())
+    
+    def test_completed_duplicate_short_circuits(self):
+        for _ in range(2):
+            upload_id = self.start()
+            self.send(upload_id, 0, len(CSV_CONTENT) - 1)
+            response = self.client.post(reverse('bulk_upload:chunked_complete', kwargs={'upload_id': upload_id}))
+            BulkUploadSession.objects.update(status='completed')
+        
+        self.assertTrue(response.json()['duplicate'])
+        self.assertEqual(BulkUploadSession.objects.count(), 1)
+        self.assertEqual(ChunkedUpload.objects.filter(status='complete').count(), 2)
+    
+    def complete_upload(self):
+        upload_id = self.start()
+        self.send(upload_id, 0, len(CSV_CONTENT) - 1)
+        return ChunkedUpload.objects.get(upload_id=upload_id)
+    
+    def test_repeated_complete_creates_one_session(self):
+        upload = self.complete_upload()
+        
+        # Both calls hold the upload as it was before either completed it
+        first, _ = ChunkedUploadService.complete_upload(upload)
+        second, reused = ChunkedUploadService.complete_upload(upload)
+        
+        self.assertEqual(second, first)
+        self.assertFalse(reused)
+        self.assertEqual(BulkUploadSession.objects.count(), 1)
+    
+    def test_unreadable_file_is_discarded(self):
+        upload = self.complete_upload()
+        
+        with mock.patch('bulk_upload.services.compute_file_hash', side_effect=OSError('disk error')):
+            with self.assertRaises(ValueError):
+                ChunkedUploadService.complete_upload(upload)
+        
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'failed')
+        self.assertFalse(os.path.exists(upload.file_path))
+        with self.assertRaises(ValueError):
+            ChunkedUploadService.complete_upload(upload)
+    
+    def test_assembled_file_is_removed_after_processing(self):
+        session, _ = ChunkedUploadService.complete_upload(self.complete_upload())
+        
+        BulkUploadService.process_upload(session)
+        
+        self.assertFalse(os.path.exists(session.file_path))
+    
+    def test_abandoned_uploads_are_cleaned_up(self):
+        stale = ChunkedUpload.objects.get(upload_id=self.start())
+        ChunkedUpload.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=30))
+        recent = ChunkedUpload.objects.get(upload_id=self.start())
+        
+        call_command('cleanup_chunked_uploads', stdout=mock.MagicMock())
+        
+        self.assertEqual(list(ChunkedUpload.objects.all()), [recent])
+        self.assertFalse(os.path.exists(stale.file_path))
+        self.assertTrue(os.path.exists(recent.file_path))
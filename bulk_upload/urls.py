@@ -10,6 +10,11 @@ urlpatterns = [
     path('<int:pk>/', views.BulkUploadDetailView.as_view(), name='detail'),
     path('<int:pk>/delete/', views.bulk_upload_delete, name='delete'),
     
+    # Resumable chunked uploads
+    path('chunked/start/', views.chunked_upload_start, name='chunked_start'),
+    path('chunked/<uuid:upload_id>/', views.chunked_upload_chunk, name='chunked_chunk'),
+    path('chunked/<uuid:upload_id>/complete/', views.chunked_upload_complete, name='chunked_complete'),
+    
     # Processing and preview
     path('<int:pk>/process/', views.bulk_upload_process, name='process'),
     path('<int:pk>/preview/', views.bulk_upload_preview, name='preview'),
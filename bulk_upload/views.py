@@ -14,8 +14,8 @@ from django.db.models import Q
 from django.conf import settings
 import json
 
-from .models import BulkUploadSession, BulkUploadRecord, UploadTemplate
-from .services import BulkUploadService, FileProcessor
+from .models import BulkUploadSession, BulkUploadRecord, UploadTemplate, ChunkedUpload
+from .services import BulkUploadService, ChunkedUploadService, DataProcessor, FileProcessor
 from accounts.models import User
 
 
@@ -120,6 +120,7 @@ def bulk_upload_create(request):
     if request.method == 'POST':
         upload_type = request.POST.get('upload_type')
         uploaded_file = request.FILES.get('file')
+        mode = request.POST.get('mode', 'create')
         
         if not upload_type or not uploaded_file:
             messages.error(request, "Please select an upload type and file.")
@@ -132,33 +133,53 @@ def bulk_upload_create(request):
             messages.error(request, f"File type '{file_extension}' not supported. Please use: {', '.join(allowed_extensions)}")
             return render(request, 'bulk_upload/upload_create.html', get_upload_context())
         
+        if mode not in ('create', 'upsert'):
+            messages.error(request, f"Unknown upload mode '{mode}'.")
+            return render(request, 'bulk_upload/upload_create.html', get_upload_context())
+        
+        if mode == 'upsert' and upload_type not in DataProcessor.UPSERT_TYPES:
+            messages.error(request, "Update-existing mode is only available for user uploads.")
+            return render(request, 'bulk_upload/upload_create.html', get_upload_context())
+        
         # Save file temporarily
         try:
-            file_content = uploaded_file.read()
-            
-            # Create a proper temporary file path
-            import tempfile
-            
             # Create temporary file
             temp_fd, temp_file_path = tempfile.mkstemp(
                 suffix=f'.{file_extension}',
                 prefix=f'bulk_upload_{request.user.id}_'
             )
             
-            # Write file content to temporary file
+            # Stream file content to temporary file
             with os.fdopen(temp_fd, 'wb') as temp_file:
-                temp_file.write(file_content)
+                for chunk in uploaded_file.chunks():
+                    temp_file.write(chunk)
             
-            # Create upload session
-            session = BulkUploadService.create_upload_session(
-                user=request.user,
-                upload_type=upload_type,
-                file_path=temp_file_path,
-                filename=uploaded_file.name,
-                file_size=len(file_content)
-            )
+            options = {'mode': mode}
+            if request.POST.get('force'):
+                session = BulkUploadService.create_upload_session(
+                    user=request.user,
+                    upload_type=upload_type,
+                    file_path=temp_file_path,
+                    filename=uploaded_file.name,
+                    file_size=uploaded_file.size,
+                    options=options
+                )
+                reused = False
+            else:
+                # Identical files short-circuit to the earlier result
+                session, reused = BulkUploadService.create_or_reuse_session(
+                    user=request.user,
+                    upload_type=upload_type,
+                    file_path=temp_file_path,
+                    filename=uploaded_file.name,
+                    file_size=uploaded_file.size,
+                    options=options
+                )
             
-            messages.success(request, f"File uploaded successfully. Upload session #{session.id} created.")
+            if reused:
+                messages.info(request, f"This file was already processed in upload session #{session.id}. Showing the previous result.")
+            else:
+                messages.success(request, f"File uploaded successfully. Upload session #{session.id} created.")
             return redirect('bulk_upload:detail', pk=session.id)
             
         except Exception as e:
@@ -168,6 +189,117 @@ def bulk_upload_create(request):
     return render(request, 'bulk_upload/upload_create.html', get_upload_context())
 
 
+def _parse_content_range(header):
+    """Parse 'bytes start-end/total' into (start, end, total)"""
+    units, _, byte_range = header.partition(' ')
+    span, _, total = byte_range.partition('/')
+    start, _, end = span.partition('-')
+    if units != 'bytes':
+        raise ValueError('Content-Range must be expressed in bytes')
+    return int(start), int(end), int(total)
+
+
+def _chunked_upload_state(upload):
+    return {
+        'upload_id': str(upload.upload_id),
+        'offset': upload.offset,
+        'total_size': upload.total_size,
+        'status': upload.status,
+    }
+
+
+@login_required
+@require_http_methods(["POST"])
+def chunked_upload_start(request):
+    """Begin a resumable upload; the client then sends byte ranges"""
+    if not (request.user.is_superuser or request.user.role == 'badri_mahal_admin'):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    upload_type = request.POST.get('upload_type')
+    filename = request.POST.get('filename', '')
+    mode = request.POST.get('mode', 'create')
+    
+    valid_types = [choice[0] for choice in BulkUploadSession.UPLOAD_TYPE_CHOICES]
+    if upload_type not in valid_types or not filename:
+        return JsonResponse({'error': 'upload_type and filename are required'}, status=400)
+    
+    allowed_extensions = ['xlsx', 'xls', 'csv']
+    if filename.split('.')[-1].lower() not in allowed_extensions:
+        return JsonResponse({'error': f"Please use: {', '.join(allowed_extensions)}"}, status=400)
+    
+    if mode not in ('create', 'upsert'):
+        return JsonResponse({'error': f"Unknown upload mode '{mode}'"}, status=400)
+    
+    try:
+        total_size = int(request.POST.get('total_size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'total_size must be an integer'}, status=400)
+    if total_size <= 0:
+        return JsonResponse({'error': 'total_size must be positive'}, status=400)
+    
+    upload = ChunkedUploadService.start_upload(
+        user=request.user,
+        upload_type=upload_type,
+        filename=filename,
+        total_size=total_size,
+        options={'mode': mode}
+    )
+    return JsonResponse(_chunked_upload_state(upload), status=201)
+
+
+@login_required
+@require_http_methods(["GET", "PUT", "POST"])
+def chunked_upload_chunk(request, upload_id):
+    """
+    Report progress (GET) or append a byte range (PUT/POST).
+    
+    Chunks carry a ``Content-Range: bytes start-end/total`` header and the raw
+    bytes as the request body. A range that does not start at the current
+    offset is rejected with 409 and the offset to resume from.
+    """
+    upload = get_object_or_404(ChunkedUpload, upload_id=upload_id, uploaded_by=request.user)
+    
+    if request.method == 'GET':
+        return JsonResponse(_chunked_upload_state(upload))
+    
+    try:
+        start, end, total = _parse_content_range(request.META.get('HTTP_CONTENT_RANGE', ''))
+    except ValueError:
+        return JsonResponse({'error': 'A valid Content-Range header is required'}, status=400)
+    
+    if total != upload.total_size or end < start:
+        return JsonResponse({'error': 'Content-Range does not match this upload'}, status=400)
+    
+    try:
+        upload = ChunkedUploadService.append_chunk(upload, start, request, end - start + 1)
+    except ValueError as e:
+        upload.refresh_from_db()
+        return JsonResponse({'error': str(e), **_chunked_upload_state(upload)}, status=409)
+    
+    return JsonResponse(_chunked_upload_state(upload))
+
+
+@login_required
+@require_http_methods(["POST"])
+def chunked_upload_complete(request, upload_id):
+    """Finish a resumable upload and create (or reuse) its session"""
+    upload = get_object_or_404(ChunkedUpload, upload_id=upload_id, uploaded_by=request.user)
+    
+    if upload.status == 'complete' and upload.session_id:
+        return JsonResponse({'session_id': upload.session_id, 'duplicate': False})
+    
+    try:
+        session, reused = ChunkedUploadService.complete_upload(upload)
+    except ValueError as e:
+        return JsonResponse({'error': str(e), **_chunked_upload_state(upload)}, status=409)
+    
+    return JsonResponse({
+        'session_id': session.id,
+        'duplicate': reused,
+        'status': session.status,
+    })
+
+
 @login_required
 @require_http_methods(["POST"])
 def bulk_upload_process(request, pk):
@@ -192,6 +324,9 @@ def bulk_upload_process(request, pk):
                 'successful': session.successful_rows,
                 'failed': session.failed_rows,
                 'skipped': session.skipped_rows,
+                'created': session.created_rows,
+                'updated': session.updated_rows,
+                'unchanged': session.unchanged_rows,
                 'success_rate': session.get_success_rate()
             }
         })
@@ -330,6 +465,9 @@ def bulk_upload_api_status(request, pk):
         'successful_rows': session.successful_rows,
         'failed_rows': session.failed_rows,
         'skipped_rows': session.skipped_rows,
+        'created_rows': session.created_rows,
+        'updated_rows': session.updated_rows,
+        'unchanged_rows': session.unchanged_rows,
         'success_rate': session.get_success_rate(),
         'completed_at': session.completed_at.isoformat() if session.completed_at else None,
         'processing_log': session.processing_log[-10:] if session.processing_log else []  # Last 10 entries
@@ -50,6 +50,7 @@ print_status "Creating necessary directories..."
 mkdir -p logs
 mkdir -p staticfiles
 mkdir -p media
+mkdir -p private/pdf_cache
 mkdir -p /var/log/umoor_sehhat 2>/dev/null || print_warning "Could not create /var/log/umoor_sehhat (may need sudo)"
 
 # Install/upgrade dependencies
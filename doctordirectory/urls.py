@@ -25,6 +25,7 @@ urlpatterns = [
     
     # Schedule management (only existing views)
     path('schedule/', views.schedule_management, name='schedule_management'),
+    path('schedule/export/', views.export_schedule_pdfs, name='export_schedule_pdfs'),
     
     # Analytics (only existing views)
     path('analytics/', views.doctor_analytics, name='analytics'),
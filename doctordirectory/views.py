@@ -19,7 +19,9 @@ from .forms import (
     DoctorForm, DoctorScheduleForm, AppointmentForm
 )
 from accounts.models import User
+from appointments.models import AppointmentRecord
 from mahalshifa.models import Doctor as MahalShifaDoctor, MedicalRecord
+from umoor_sehhat.pdf_batch import PDFBatchExporter, batch_export_id, doctor_schedule_documents
 
 
 class DoctorAccessMixin(UserPassesTestMixin):
@@ -83,45 +85,29 @@ def dashboard(request):
         appointments__appointment_date__gte=month_start
     ).distinct().count()
     
-    # Doctor-specific statistics
+    # Doctor-specific statistics from the read model in one query. They
+    # count the doctor's appointments in every app (appointments,
+    # doctordirectory and mahalshifa), not only doctordirectory's
     if doctor_profile:
-        # For mahalshifa doctors, we need to check if they have corresponding doctordirectory records
-        try:
-            # Try to get the corresponding doctordirectory doctor
-            doctordirectory_doctor = Doctor.objects.get(user=user)
-            total_patients = Patient.objects.filter(appointments__doctor=doctordirectory_doctor).distinct().count()
-            total_appointments = Appointment.objects.filter(doctor=doctordirectory_doctor).count()
-            today_appointments = Appointment.objects.filter(
-                doctor=doctordirectory_doctor,
-                appointment_date=timezone.now().date()
-            ).count()
-            pending_appointments = Appointment.objects.filter(
-                doctor=doctordirectory_doctor,
-                status='scheduled'
-            ).count()
-            weekly_doctor_appointments = Appointment.objects.filter(
-                doctor=doctordirectory_doctor,
-                appointment_date__gte=week_start
-            ).count()
-            monthly_doctor_appointments = Appointment.objects.filter(
-                doctor=doctordirectory_doctor,
-                appointment_date__gte=month_start
-            ).count()
-        except Doctor.DoesNotExist:
-            # If no doctordirectory doctor exists, show 0 stats
-            total_patients = 0
-            total_appointments = 0
-            today_appointments = 0
-            pending_appointments = 0
-            weekly_doctor_appointments = 0
-            monthly_doctor_appointments = 0
+        doctor_stats = AppointmentRecord.objects.filter(doctor_user=user).aggregate(
+            total_patients=Count('patient_user', distinct=True),
+            total_appointments=Count('pk'),
+            today_appointments=Count('pk', filter=Q(appointment_date=timezone.now().date())),
+            pending_appointments=Count('pk', filter=Q(status='scheduled')),
+            weekly_doctor_appointments=Count('pk', filter=Q(appointment_date__gte=week_start)),
+            monthly_doctor_appointments=Count('pk', filter=Q(appointment_date__gte=month_start))
+        )
     else:
-        total_patients = 0
-        total_appointments = 0
-        today_appointments = 0
-        pending_appointments = 0
-        weekly_doctor_appointments = 0
-        monthly_doctor_appointments = 0
+        doctor_stats = dict.fromkeys([
+            'total_patients', 'total_appointments', 'today_appointments',
+            'pending_appointments', 'weekly_doctor_appointments', 'monthly_doctor_appointments'
+        ], 0)
+    total_patients = doctor_stats['total_patients']
+    total_appointments = doctor_stats['total_appointments']
+    today_appointments = doctor_stats['today_appointments']
+    pending_appointments = doctor_stats['pending_appointments']
+    weekly_doctor_appointments = doctor_stats['weekly_doctor_appointments']
+    monthly_doctor_appointments = doctor_stats['monthly_doctor_appointments']
     
     # Get recent appointments
     if doctor_profile:
@@ -1100,3 +1086,23 @@ class DoctorDetailView(LoginRequiredMixin, DetailView):
         })
         
         return context
+
+
+@login_required
+def export_schedule_pdfs(request):
+    """Download every doctor's schedule for a day (``?date=YYYY-MM-DD``, default today) as a ZIP of PDFs"""
+    if not request.user.is_admin:
+        messages.error(request, "You don't have permission to export doctor schedules.")
+        return redirect('doctordirectory:dashboard')
+    
+    schedule_date = timezone.now().date()
+    if request.GET.get('date'):
+        try:
+            schedule_date = datetime.strptime(request.GET['date'], '%Y-%m-%d').date()
+        except ValueError:
+            messages.error(request, 'Invalid date. Use the YYYY-MM-DD format.')
+            return redirect('doctordirectory:dashboard')
+    
+    documents, total = doctor_schedule_documents(schedule_date)
+    exporter = PDFBatchExporter(documents, total, export_id=batch_export_id(request))
+    return exporter.response(f"doctor_schedules_{schedule_date.strftime('%Y%m%d')}.zip")
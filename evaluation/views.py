@@ -20,6 +20,9 @@ from .models import (
 )
 from accounts.models import User
 from moze.models import Moze
+from umoor_sehhat.exports import (
+    Column, ExportSource, StreamingExport, choice_column, date_column, export_format, name_column
+)
 
 
 @login_required
@@ -575,9 +578,7 @@ def evaluation_analytics(request):
 
 @login_required
 def export_evaluations(request):
-    """Export evaluation data to CSV"""
-    import csv
-    
+    """Export evaluation data to CSV, or to Excel with ``?format=xlsx``"""
     user = request.user
     
     # Check permissions
@@ -593,28 +594,17 @@ def export_evaluations(request):
             Q(form__created_by=user) | Q(form__target_role="moze_coordinator")
         )
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="evaluations.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Submission ID', 'Form Title', 'Evaluation Type', 'Evaluator', 
-        'Evaluatee', 'Total Score', 'Submitted At', 'Is Complete'
-    ])
-    
-    for submission in submissions.select_related('form', 'evaluator', 'target_user'):
-        writer.writerow([
-            submission.id,
-            submission.form.title,
-            submission.form.get_evaluation_type_display(),
-            submission.evaluator.get_full_name(),
-            submission.target_user.get_full_name() if submission.target_user else 'N/A',
-            submission.total_score,
-            submission.submitted_at.strftime('%Y-%m-%d %H:%M') if submission.submitted_at else 'N/A',
-            'Yes' if submission.is_complete else 'No'
-        ])
-    
-    return response
+    columns = [
+        Column('Submission ID', 'id'),
+        Column('Form Title', 'form__title'),
+        choice_column('Evaluation Type', 'form__evaluation_type', EvaluationForm._meta.get_field('evaluation_type')),
+        name_column('Evaluator', 'evaluator'),
+        name_column('Evaluatee', 'target_user', default='N/A'),
+        Column('Total Score', 'total_score'),
+        date_column('Submitted At', 'submitted_at', default='N/A'),
+        Column('Is Complete', 'is_complete', format=lambda value: 'Yes' if value else 'No'),
+    ]
+    return StreamingExport('evaluations', [ExportSource(submissions, columns)]).response(export_format(request))
 
 
 @login_required
@@ -302,6 +302,7 @@ class Prescription(models.Model):
     dispensed_by = models.CharField(max_length=100, blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-prescription_date']
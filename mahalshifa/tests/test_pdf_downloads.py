@@ -0,0 +1,167 @@
+"""
+Tests for cached medical record and prescription PDF downloads
+"""
+from datetime import date
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from mahalshifa.models import Department, Doctor, Hospital, MedicalRecord, Patient, Prescription
+from moze.models import Moze
+from umoor_sehhat.pdf_generator import HTMLToPDFGenerator
+from umoor_sehhat.pdf_render import PDFRenderService, document_key
+
+MEDIA_ROOT = tempfile.mkdtemp()
+PDF_CACHE_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PDF_CACHE_ROOT=PDF_CACHE_ROOT)
+class PDFDownloadTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(PDF_CACHE_ROOT, ignore_errors=True)
+    
+    def setUp(self):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(PDF_CACHE_ROOT, ignore_errors=True)
+        self.doctor_user = User.objects.create_user(
+            username='doctor', role='doctor', first_name='Ali', last_name='Shah'
+        )
+        self.other_doctor_user = User.objects.create_user(username='other_doctor', role='doctor')
+        moze = Moze.objects.create(name='Saifee Moze', location='Mumbai', aamil=self.other_doctor_user)
+        hospital = Hospital.objects.create(name='Saifee Hospital', address='Mumbai', phone='123', email='h@test.com')
+        department = Department.objects.create(hospital=hospital, name='General')
+        self.doctor = Doctor.objects.create(
+            user=self.doctor_user, license_number='LIC1', specialization='General', qualification='MBBS',
+            hospital=hospital, department=department
+        )
+        patient = Patient.objects.create(
+            its_id='12345678', first_name='Zahra', last_name='Ali', date_of_birth=date(1990, 1, 1), gender='female',
+            phone_number='123', address='Mumbai', emergency_contact_name='Hussain',
+            emergency_contact_phone='456', emergency_contact_relationship='spouse', registered_moze=moze
+        )
+        self.record = MedicalRecord.objects.create(
+            patient=patient, doctor=self.doctor, moze=moze, chief_complaint='Headache',
+            vital_signs={'pulse': 72}, diagnosis='Migraine', treatment_plan='Rest and fluids'
+        )
+        self.prescription = Prescription.objects.create(
+            medical_record=self.record, patient=patient, doctor=self.doctor, medication_name='Paracetamol',
+            dosage='500mg', frequency='Twice daily', duration='5 days', quantity='10', instructions='After meals'
+        )
+        self.client.force_login(self.doctor_user)
+        self.url = reverse('mahalshifa:medical_record_pdf', args=[self.record.pk])
+    
+    def cached_files(self, kind='medical_record'):
+        storage = FileSystemStorage(location=PDF_CACHE_ROOT)
+        directory = f'{kind}/{self.record.pk if kind == "medical_record" else self.prescription.pk}'
+        return storage.listdir(directory)[1] if storage.exists(directory) else []
+    
+    def download(self, url=None, **headers):
+        with mock.patch.object(
+            HTMLToPDFGenerator, 'html_renderer', wraps=HTMLToPDFGenerator.html_renderer
+        ) as renderer:
+            response = self.client.get(url or self.url, headers=headers)
+        return response, renderer.call_count
+    
+    def test_repeat_downloads_are_served_from_storage(self):
+        first, rendered = self.download()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(rendered, 1)
+        self.assertTrue(b''.join(first.streaming_content).startswith(b'%PDF'))
+        self.assertIn('medical_record_', first['Content-Disposition'])
+        
+        second, rendered = self.download()
+        self.assertEqual(rendered, 0)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertTrue(b''.join(second.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(len(self.cached_files()), 1)
+        # Nothing is written to the publicly served media tree
+        self.assertFalse(os.path.exists(MEDIA_ROOT))
+    
+    def test_changed_record_is_rendered_again_and_old_version_removed(self):
+        first, _ = self.download()
+        self.record.diagnosis = 'Tension headache'
+        self.record.save()
+        
+        second, rendered = self.download()
+        
+        self.assertEqual(rendered, 1)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.cached_files(), [f'{document_key("medical_record", self.record, self.record.patient)}.pdf'])
+    
+    def test_unchanged_pdf_is_not_modified(self):
+        first, _ = self.download()
+        
+        response, rendered = self.download(If_None_Match=first['ETag'])
+        
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(rendered, 0)
+    
+    def test_prescription_pdf(self):
+        url = reverse('mahalshifa:prescription_pdf', args=[self.prescription.pk])
+        
+        self.assertEqual(self.download(url)[1], 1)
+        response, rendered = self.download(url)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(rendered, 0)
+        self.assertIn(f'prescription_{self.prescription.pk}.pdf', response['Content-Disposition'])
+    
+    def test_records_of_other_doctors_are_not_found(self):
+        self.client.force_login(self.other_doctor_user)
+        
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse('mahalshifa:prescription_pdf', args=[self.prescription.pk])).status_code, 404
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PDF_CACHE_ROOT=PDF_CACHE_ROOT)
+class PDFRenderServiceTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner')
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.prepared = []
+    
+    def prepare(self):
+        self.prepared.append(1)
+        
+        def render(dest):
+            self.started.set()
+            self.release.wait(5)
+            dest.write(b'%PDF-1.4 test')
+        return render
+    
+    def test_slow_render_returns_202_and_is_shared(self):
+        service = PDFRenderService(wait_seconds=0.01)
+        
+        response = service.response(None, 'test', [self.user], 'test.pdf', self.prepare)
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(self.started.wait(5))
+        self.assertEqual(service.response(None, 'test', [self.user], 'test.pdf', self.prepare).status_code, 202)
+        
+        self.release.set()
+        response = PDFRenderService(wait_seconds=5).response(None, 'test', [self.user], 'test.pdf', self.prepare)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 test')
+        self.assertEqual(len(self.prepared), 1)
+    
+    def test_failed_render_returns_none(self):
+        def prepare():
+            def render(dest):
+                raise ValueError('bad template')
+            return render
+        
+        self.assertIsNone(PDFRenderService().response(None, 'broken', [self.user], 'broken.pdf', prepare))
@@ -43,6 +43,8 @@ urlpatterns = [
     path('medical-records/<int:pk>/', views.MedicalRecordDetailView.as_view(), name='medical_record_detail'),
     path('medical-records/<int:pk>/edit/', views.MedicalRecordUpdateView.as_view(), name='medical_record_update'),
     path('medical-records/<int:pk>/delete/', views.MedicalRecordDeleteView.as_view(), name='medical_record_delete'),
+    path('medical-records/<int:pk>/pdf/', views.medical_record_pdf, name='medical_record_pdf'),
+    path('prescriptions/<int:pk>/pdf/', views.prescription_pdf, name='prescription_pdf'),
     
     # Analytics and reports
     path('analytics/', views.medical_analytics, name='analytics'),
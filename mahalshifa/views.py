@@ -11,11 +11,12 @@ from django.core.paginator import Paginator
 from django.db import transaction
 from django.db.models.functions import TruncDate, TruncMonth
 import json
-import csv
 from datetime import datetime, timedelta, date, time
 from decimal import Decimal
 
 from moze.models import Moze
+from umoor_sehhat.pdf_generator import HTMLToPDFGenerator
+from umoor_sehhat.exports import Column, ExportSource, StreamingExport, export_format, name_column
 from accounts.permissions import can_user_access, get_patient_data_for_user, get_medical_records_for_user
 from araz.models import Petition
 
@@ -939,7 +940,7 @@ def inventory_management(request):
 
 @login_required
 def export_medical_data(request):
-    """Export medical data to CSV"""
+    """Export appointments and medical records to CSV, or to Excel with ``?format=xlsx``"""
     if not (request.user.is_admin or request.user.is_aamil or request.user.is_moze_coordinator):
         messages.error(request, 'You do not have permission to export data.')
         return redirect('mahalshifa:dashboard')
@@ -959,40 +960,32 @@ def export_medical_data(request):
         patients = Patient.objects.none()
         medical_records = MedicalRecord.objects.none()
     
-    # Create CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="medical_data_export.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Data Type', 'ID', 'Patient Name', 'Doctor Name', 'Date', 'Status', 'Notes'
-    ])
-    
-    # Export appointments
-    for appointment in appointments.select_related('patient', 'doctor__user'):
-        writer.writerow([
-            'Appointment',
-            appointment.id,
-            appointment.patient.get_full_name(),
-            appointment.doctor.user.get_full_name(),
-            appointment.appointment_date,
-            appointment.status,
-            appointment.reason
-        ])
-    
-    # Export medical records
-    for record in medical_records.select_related('patient', 'doctor__user'):
-        writer.writerow([
-            'Medical Record',
-            record.id,
-            record.patient.get_full_name(),
-            record.doctor.user.get_full_name(),
-            record.consultation_date.date(),
-            'Completed',
-            record.diagnosis
-        ])
-    
-    return response
+    patient_name = Column(
+        'Patient Name', 'patient__arabic_name', 'patient__first_name', 'patient__last_name',
+        format=lambda arabic_name, first_name, last_name: arabic_name or f"{first_name} {last_name}"
+    )
+    appointment_columns = [
+        Column('Data Type', format=lambda: 'Appointment'),
+        Column('ID', 'id'),
+        patient_name,
+        name_column('Doctor Name', 'doctor__user'),
+        Column('Date', 'appointment_date'),
+        Column('Status', 'status'),
+        Column('Notes', 'reason'),
+    ]
+    record_columns = [
+        Column('Data Type', format=lambda: 'Medical Record'),
+        Column('ID', 'id'),
+        patient_name,
+        name_column('Doctor Name', 'doctor__user'),
+        Column('Date', 'consultation_date', format=lambda value: value.date()),
+        Column('Status', format=lambda: 'Completed'),
+        Column('Notes', 'diagnosis'),
+    ]
+    return StreamingExport('medical_data_export', [
+        ExportSource(appointments, appointment_columns),
+        ExportSource(medical_records, record_columns),
+    ]).response(export_format(request))
 
 # Hospital CRUD Views
 class HospitalCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
@@ -1212,15 +1205,19 @@ class MedicalRecordDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'medical_record'
     
     def get_queryset(self):
-        user = self.request.user
-        if user.is_admin:
-            return MedicalRecord.objects.all()
-        elif user.is_aamil or user.is_moze_coordinator:
-            return MedicalRecord.objects.filter(moze__aamil=user)
-        elif user.is_doctor:
-            return MedicalRecord.objects.filter(doctor__user=user)
-        else:
-            return MedicalRecord.objects.filter(patient__user_account=user)
+        return medical_records_visible_to(self.request.user)
+
+
+def medical_records_visible_to(user):
+    """Medical records a user may view or download"""
+    if user.is_admin:
+        return MedicalRecord.objects.all()
+    elif user.is_aamil or user.is_moze_coordinator:
+        return MedicalRecord.objects.filter(moze__aamil=user)
+    elif user.is_doctor:
+        return MedicalRecord.objects.filter(doctor__user=user)
+    else:
+        return MedicalRecord.objects.filter(patient__user_account=user)
 
 
 class MedicalRecordUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
@@ -1254,3 +1251,34 @@ class MedicalRecordDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteVie
     def delete(self, request, *args, **kwargs):
         messages.success(request, 'Medical record deleted successfully!')
         return super().delete(request, *args, **kwargs)
+
+
+@login_required
+def medical_record_pdf(request, pk):
+    """Download a medical record as PDF"""
+    medical_record = get_object_or_404(
+        medical_records_visible_to(request.user).select_related('patient', 'doctor__user', 'moze'), pk=pk
+    )
+    
+    response = HTMLToPDFGenerator.generate_medical_record_pdf(medical_record, request)
+    if response is None:
+        messages.error(request, 'The medical record PDF could not be generated. Please try again later.')
+        return redirect('mahalshifa:medical_record_detail', pk=pk)
+    return response
+
+
+@login_required
+def prescription_pdf(request, pk):
+    """Download a prescription as PDF"""
+    prescription = get_object_or_404(
+        Prescription.objects.select_related('patient', 'doctor__user', 'doctor__hospital').filter(
+            medical_record__in=medical_records_visible_to(request.user)
+        ),
+        pk=pk
+    )
+    
+    response = HTMLToPDFGenerator.generate_prescription_pdf(prescription, request)
+    if response is None:
+        messages.error(request, 'The prescription PDF could not be generated. Please try again later.')
+        return redirect('mahalshifa:medical_record_detail', pk=prescription.medical_record_id)
+    return response
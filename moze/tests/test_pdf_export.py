@@ -0,0 +1,120 @@
+"""
+Tests for the batch PDF exports of moze reports and doctor schedules
+"""
+from datetime import date, time
+import io
+import zipfile
+
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from doctordirectory.models import Appointment, Doctor, Patient
+from moze.models import Moze, MozeComment
+from umoor_sehhat.pdf_batch import PDFBatchExporter, get_progress, moze_report_documents
+
+
+def read_zip(response):
+    return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+
+class PDFBatchExportTest(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', role='badri_mahal_admin')
+        self.aamil = User.objects.create_user(username='aamil', role='aamil', first_name='Hussain')
+        self.mozes = [
+            Moze.objects.create(name=f'Moze {index}', location='Mumbai', aamil=self.aamil) for index in range(3)
+        ]
+        Moze.objects.create(name='Closed Moze', location='Pune', aamil=self.aamil, is_active=False)
+        self.mozes[0].team_members.add(self.aamil, User.objects.create_user(username='student', role='student'))
+        for index in range(12):
+            MozeComment.objects.create(moze=self.mozes[0], author=self.aamil, content=f'Comment {index}')
+        self.client.force_login(self.admin)
+    
+    def test_moze_reports_are_streamed_as_zip(self):
+        response = self.client.get(reverse('moze:export_report_pdfs'), {'export_id': 'moze-export-1'})
+        
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = read_zip(response)
+        self.assertEqual(sorted(archive.namelist()), sorted(f'moze_report_{moze.pk}.pdf' for moze in self.mozes))
+        for name in archive.namelist():
+            self.assertTrue(archive.read(name).startswith(b'%PDF'))
+        self.assertEqual(
+            get_progress('moze-export-1'), {'status': 'finished', 'done': 3, 'failed': 0, 'total': 3}
+        )
+    
+    def test_progress_endpoint(self):
+        b''.join(self.client.get(
+            reverse('moze:export_report_pdfs'), {'export_id': 'moze-export-2'}
+        ).streaming_content)
+        
+        response = self.client.get(reverse('pdf_export_progress', args=['moze-export-2']))
+        
+        self.assertEqual(response.json()['done'], 3)
+        self.assertEqual(self.client.get(reverse('pdf_export_progress', args=['unknown'])).status_code, 404)
+    
+    def test_report_inputs_are_loaded_per_chunk(self):
+        documents, total = moze_report_documents(chunk_size=2)
+        
+        # Mozes and their recent comments per chunk of two, then an empty chunk
+        with self.assertNumQueries(5):
+            documents = list(documents)
+        
+        self.assertEqual(total, 3)
+        _, _, (moze, stats, comments) = documents[0]
+        self.assertEqual(stats, {'total_members': 2, 'aamils': 1, 'coordinators': 0, 'doctors': 0, 'students': 1})
+        self.assertEqual([comment.content for comment in comments], [f'Comment {index}' for index in range(11, 1, -1)])
+    
+    def test_documents_are_pulled_as_the_archive_is_written(self):
+        pulled = []
+        
+        def documents():
+            for index in range(20):
+                pulled.append(index)
+                yield f'report_{index}.pdf', 'moze_report', (self.mozes[0], {}, [])
+        
+        stream = PDFBatchExporter(documents(), 20, max_in_flight=2).stream()
+        next(stream)
+        next(stream)
+        
+        self.assertLessEqual(len(pulled), 4)
+        stream.close()
+    
+    def test_exports_share_one_worker_pool(self):
+        first = PDFBatchExporter([], 0)
+        b''.join(first.stream())
+        
+        self.assertIs(PDFBatchExporter([], 0).executor, first.executor)
+    
+    def test_failed_documents_are_listed(self):
+        documents = [
+            ('good.pdf', 'moze_report', (self.mozes[0], {}, [])),
+            ('bad.pdf', 'moze_report', (None, {}, [])),
+        ]
+        
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(PDFBatchExporter(documents, 2).stream())))
+        
+        self.assertEqual(archive.namelist(), ['good.pdf', 'errors.txt'])
+        self.assertIn('bad.pdf', archive.read('errors.txt').decode())
+    
+    def test_doctor_schedules(self):
+        doctor_user = User.objects.create_user(username='doctor', role='doctor', first_name='Ali')
+        doctor = Doctor.objects.create(name='Ali Shah', user=doctor_user, specialty='Cardiology')
+        Doctor.objects.create(name='Idle Doctor')
+        patient = Patient.objects.create(date_of_birth=date(1990, 1, 1), gender='female')
+        for hour in [9, 10]:
+            Appointment.objects.create(
+                doctor=doctor, patient=patient, appointment_date=date(2024, 5, 1), appointment_time=time(hour)
+            )
+        
+        response = self.client.get(reverse('doctordirectory:export_schedule_pdfs'), {'date': '2024-05-01'})
+        
+        self.assertEqual(read_zip(response).namelist(), [f'schedule_2024-05-01_doctor_{doctor.pk}.pdf'])
+    
+    def test_admins_only(self):
+        self.client.force_login(self.aamil)
+        
+        self.assertEqual(self.client.get(reverse('moze:export_report_pdfs')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('doctordirectory:export_schedule_pdfs')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('pdf_export_progress', args=['x'])).status_code, 403)
@@ -20,4 +20,5 @@ urlpatterns = [
     
     # Analytics and reports
     path('analytics/', views.moze_analytics, name='analytics'),
+    path('reports/export/', views.export_report_pdfs, name='export_report_pdfs'),
 ]
\ No newline at end of file
@@ -21,6 +21,7 @@ from mahalshifa.models import Patient, Appointment, MedicalRecord, Doctor as Mah
 from surveys.models import Survey, SurveyResponse
 from evaluation.models import EvaluationForm, EvaluationSubmission, Evaluation
 from araz.models import Petition
+from umoor_sehhat.pdf_batch import PDFBatchExporter, batch_export_id, moze_report_documents
 
 
 class MozeAccessMixin(UserPassesTestMixin):
@@ -482,3 +483,15 @@ def moze_analytics(request):
     }
     
     return render(request, 'moze/moze_analytics.html', context)
+
+
+@login_required
+def export_report_pdfs(request):
+    """Download the report of every active moze as a ZIP of PDFs"""
+    if not request.user.is_admin:
+        messages.error(request, "You don't have permission to export moze reports.")
+        return redirect('moze:dashboard')
+    
+    documents, total = moze_report_documents()
+    exporter = PDFBatchExporter(documents, total, export_id=batch_export_id(request))
+    return exporter.response(f"moze_reports_{timezone.now().strftime('%Y%m%d')}.zip")
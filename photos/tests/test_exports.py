@@ -0,0 +1,53 @@
+"""
+Tests for the streamed album export
+"""
+import csv
+import io
+
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from moze.models import Moze
+from photos.models import Photo, PhotoAlbum, PhotoComment, PhotoLike, PhotoTag
+
+
+def read_csv(response):
+    return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+
+class AlbumExportTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', role='aamil', first_name='Hussain')
+        moze = Moze.objects.create(name='Saifee Moze', location='Mumbai', aamil=self.owner)
+        self.album = PhotoAlbum.objects.create(name='Camp', moze=moze, created_by=self.owner)
+        # bulk_create skips Photo.save(), which reads the size from the file
+        self.photo, _ = Photo.objects.bulk_create([
+            Photo(
+                image='photos/camp.jpg', title='Camp', subject_tag='event', moze=moze, uploaded_by=self.owner,
+                file_size=2048
+            ),
+            Photo(image='photos/other.jpg', subject_tag='event', moze=moze, uploaded_by=self.owner),
+        ])
+        self.album.photos.set(Photo.objects.all())
+        self.photo.tags.add(PhotoTag.objects.create(name='medical'), PhotoTag.objects.create(name='camp'))
+        for index in range(2):
+            PhotoComment.objects.create(photo=self.photo, author=self.owner, content=f'Comment {index}')
+        PhotoLike.objects.create(photo=self.photo, user=self.owner)
+        self.client.force_login(self.owner)
+    
+    def test_related_values_are_loaded_per_chunk(self):
+        response = self.client.get(reverse('photos:export_album', args=[self.album.pk]))
+        
+        # The photos, then their tags, comment and like counts
+        with self.assertNumQueries(4):
+            rows = read_csv(response)
+        
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="album_Camp_data.csv"')
+        row = next(row for row in rows[1:] if row[0] == str(self.photo.pk))
+        self.assertEqual(row[4], 'Hussain')
+        self.assertEqual(row[6:10], ['camp, medical', '2', '1', '2048'])
+        self.assertEqual(row[10], 'http://testserver/media/photos/camp.jpg')
+        other = next(row for row in rows[1:] if row[0] != str(self.photo.pk))
+        self.assertEqual(other[6:10], ['', '0', '0', '0'])
@@ -0,0 +1,117 @@
+"""
+Tests for photo gallery PDFs built from downscaled image renditions
+"""
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from accounts.models import User
+from moze.models import Moze
+from photos.models import Photo, PhotoAlbum
+from umoor_sehhat.pdf_generator import PDFGenerator
+from umoor_sehhat.pdf_images import RENDITION_DIR, ImageRenditionCache
+
+MEDIA_ROOT = tempfile.mkdtemp()
+PDF_CACHE_ROOT = tempfile.mkdtemp()
+
+
+def jpeg(width=2000, height=1500):
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 40).convert('RGB').save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PDF_CACHE_ROOT=PDF_CACHE_ROOT)
+class PhotoGalleryPDFTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(PDF_CACHE_ROOT, ignore_errors=True)
+    
+    def setUp(self):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(PDF_CACHE_ROOT, ignore_errors=True)
+        self.owner = User.objects.create_user(username='owner', role='aamil')
+        self.other = User.objects.create_user(username='other', role='doctor')
+        moze = Moze.objects.create(name='Saifee Moze', location='Mumbai', aamil=self.owner)
+        self.album = PhotoAlbum.objects.create(name='Camp & clinic', moze=moze, created_by=self.owner)
+        images = [jpeg() for index in range(8)]
+        self.photos = [
+            Photo.objects.create(
+                image=SimpleUploadedFile(f'photo{index}.jpg', images[index], content_type='image/jpeg'),
+                title=f'Photo {index}', subject_tag='event', moze=moze, uploaded_by=self.owner
+            )
+            for index in range(8)
+        ]
+        self.album.photos.set(self.photos)
+        self.source_size = sum(len(image) for image in images)
+        self.renditions = ImageRenditionCache(dpi=100)
+    
+    def build(self, **kwargs):
+        return PDFGenerator.create_photo_gallery_pdf(
+            self.album, self.album.photos.order_by('pk'), renditions=self.renditions, **kwargs
+        ).getvalue()
+    
+    def test_rendition_is_downscaled_and_cached(self):
+        photo = self.photos[0]
+        
+        with mock.patch.object(ImageRenditionCache, '_downscale', wraps=self.renditions._downscale) as downscale:
+            name = self.renditions.get(photo, 180, 144)
+            self.assertEqual(self.renditions.get(photo, 180, 144), name)
+        
+        self.assertEqual(downscale.call_count, 1)
+        # Renditions of private photos stay out of the public media tree
+        self.assertTrue(os.path.exists(os.path.join(PDF_CACHE_ROOT, name)))
+        self.assertFalse(os.path.exists(os.path.join(MEDIA_ROOT, RENDITION_DIR)))
+        with self.renditions.storage.open(name) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (250, 188))
+    
+    def test_rendition_of_changed_photo_replaces_the_old_one(self):
+        photo = self.photos[0]
+        old = self.renditions.get(photo, 180, 144)
+        photo.title = 'Renamed'
+        photo.save()
+        
+        new = self.renditions.get(photo, 180, 144)
+        
+        self.assertNotEqual(new, old)
+        self.assertFalse(self.renditions.storage.exists(old))
+    
+    def test_gallery_embeds_renditions(self):
+        pdf = self.build()
+        
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertEqual(pdf.count(b'/Subtype /Image'), 8)
+        self.assertLess(len(pdf), self.source_size)
+    
+    def test_output_size_is_capped(self):
+        sizes = [self.renditions.storage.size(self.renditions.get(photo, 180, 144)) for photo in self.photos[:3]]
+        
+        pdf = self.build(max_bytes=sum(size * 5 // 4 for size in sizes))
+        
+        self.assertEqual(pdf.count(b'/Subtype /Image'), 3)
+    
+    def test_album_pdf_download(self):
+        self.client.force_login(self.owner)
+        url = reverse('photos:album_pdf', args=[self.album.pk])
+        
+        response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertIn(f'album_{self.album.pk}.pdf', response['Content-Disposition'])
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+    
+    def test_private_albums_of_others_are_not_found(self):
+        self.client.force_login(self.other)
+        
+        self.assertEqual(self.client.get(reverse('photos:album_pdf', args=[self.album.pk])).status_code, 404)
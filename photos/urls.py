@@ -28,6 +28,7 @@ urlpatterns = [
     
     # Bulk operations (only existing views)
     path('albums/<int:album_id>/export/', views.export_album_data, name='export_album'),
+    path('albums/<int:album_id>/pdf/', views.album_pdf, name='album_pdf'),
     path('bulk-delete/', views.bulk_delete_photos, name='bulk_delete_photos'),
     
     # Slideshow functionality
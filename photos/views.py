@@ -17,6 +17,8 @@ from datetime import datetime, timedelta
 from .models import PhotoAlbum, Photo, PhotoTag, PhotoComment, PhotoLike
 from accounts.models import User
 from moze.models import Moze
+from umoor_sehhat.exports import Column, ExportSource, StreamingExport, date_column, export_format, name_column
+from umoor_sehhat.pdf_generator import PDFGenerator
 
 
 @login_required
@@ -173,6 +175,20 @@ class PhotoAlbumListView(LoginRequiredMixin, ListView):
         return context
 
 
+def albums_visible_to(user):
+    """Albums ``user`` may open"""
+    if user.role == 'admin':
+        return PhotoAlbum.objects.all()
+    elif user.role == 'aamil' or user.role == 'moze_coordinator':
+        return PhotoAlbum.objects.filter(
+            Q(moze__aamil=user) | Q(moze__moze_coordinator=user) | Q(created_by=user)
+        )
+    else:
+        return PhotoAlbum.objects.filter(
+            Q(is_public=True) | Q(created_by=user)
+        )
+
+
 class PhotoAlbumDetailView(LoginRequiredMixin, DetailView):
     """Detailed view of a photo album"""
     model = PhotoAlbum
@@ -180,17 +196,7 @@ class PhotoAlbumDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'album'
     
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'admin':
-            return PhotoAlbum.objects.all()
-        elif user.role == 'aamil' or user.role == 'moze_coordinator':
-            return PhotoAlbum.objects.filter(
-                Q(moze__aamil=user) | Q(moze__moze_coordinator=user) | Q(created_by=user)
-            )
-        else:
-            return PhotoAlbum.objects.filter(
-                Q(is_public=True) | Q(created_by=user)
-            )
+        return albums_visible_to(self.request.user)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -614,9 +620,7 @@ def user_photos(request, user_id=None):
 
 @login_required
 def export_album_data(request, album_id):
-    """Export album data including photo metadata"""
-    import csv
-    
+    """Export album photo metadata to CSV, or to Excel with ``?format=xlsx``"""
     album = get_object_or_404(PhotoAlbum, id=album_id)
     user = request.user
     
@@ -632,32 +636,48 @@ def export_album_data(request, album_id):
         messages.error(request, "You don't have permission to export this album data.")
         return redirect('photos:album_detail', pk=album_id)
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="album_{album.name}_data.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Photo ID', 'Title', 'Description', 'Subject Tag', 'Uploaded By', 'Upload Date',
-        'Tags', 'Comments Count', 'Likes Count', 'File Size', 'Image URL'
-    ])
-    
-    for photo in album.photos.select_related('uploaded_by').prefetch_related('tags', 'comments', 'likes'):
-        tags = ', '.join([tag.name for tag in photo.tags.all()])
-        
-        writer.writerow([
-            photo.id,
-            photo.title,
-            photo.description,
-            photo.subject_tag,
-            photo.uploaded_by.get_full_name(),
-            photo.created_at.strftime('%Y-%m-%d %H:%M'),
-            tags,
-            photo.comments.count(),
-            photo.likes.count(),
-            photo.image.size if photo.image else 0,
-            request.build_absolute_uri(photo.image.url) if photo.image else ''
-        ])
+    def tag_names(pks):
+        names = {}
+        for photo_id, name in Photo.tags.through.objects.filter(photo_id__in=pks).order_by(
+            'phototag__name'
+        ).values_list('photo_id', 'phototag__name'):
+            names.setdefault(photo_id, []).append(name)
+        return {photo_id: ', '.join(tags) for photo_id, tags in names.items()}
+    
+    def counts(model):
+        return lambda pks: dict(model.objects.filter(photo_id__in=pks).values_list('photo_id').annotate(Count('id')))
+    
+    storage = Photo._meta.get_field('image').storage
+    columns = [
+        Column('Photo ID', 'id'),
+        Column('Title', 'title'),
+        Column('Description', 'description'),
+        Column('Subject Tag', 'subject_tag'),
+        name_column('Uploaded By', 'uploaded_by'),
+        date_column('Upload Date', 'created_at'),
+        Column('Tags', 'tags', format=lambda tags: tags or ''),
+        Column('Comments Count', 'comments_count', format=lambda count: count or 0),
+        Column('Likes Count', 'likes_count', format=lambda count: count or 0),
+        Column('File Size', 'file_size', format=lambda size: size or 0),
+        Column('Image URL', 'image', format=lambda name: request.build_absolute_uri(storage.url(name)) if name else ''),
+    ]
+    source = ExportSource(album.photos.all(), columns, related={
+        'tags': tag_names,
+        'comments_count': counts(PhotoComment),
+        'likes_count': counts(PhotoLike),
+    })
+    return StreamingExport(f'album_{album.name}_data', [source]).response(export_format(request))
+
+
+@login_required
+def album_pdf(request, album_id):
+    """Download an album as a photo gallery PDF"""
+    album = get_object_or_404(albums_visible_to(request.user), id=album_id)
     
+    response = PDFGenerator.generate_photo_gallery_pdf(album, request)
+    if response is None:
+        messages.error(request, 'The album PDF could not be generated. Please try again later.')
+        return redirect('photos:album_detail', pk=album_id)
     return response
 
 
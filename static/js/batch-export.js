@@ -0,0 +1,35 @@
+/**
+ * Batch PDF exports: links marked with data-batch-export="<status element id>"
+ * start the ZIP download with a fresh export id and poll its progress.
+ * An optional data-date-input names a date input whose value is sent as ?date=.
+ */
+document.querySelectorAll('[data-batch-export]').forEach(function (link) {
+    link.addEventListener('click', function (event) {
+        event.preventDefault();
+        var exportId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+        var status = document.getElementById(link.dataset.batchExport);
+        var url = link.href + (link.href.indexOf('?') === -1 ? '?' : '&') + 'export_id=' + exportId;
+        if (link.dataset.dateInput) {
+            var dateInput = document.getElementById(link.dataset.dateInput);
+            if (dateInput && dateInput.value) {
+                url += '&date=' + encodeURIComponent(dateInput.value);
+            }
+        }
+        window.location.href = url;
+
+        var timer = setInterval(function () {
+            fetch('/exports/' + exportId + '/progress/').then(function (response) {
+                return response.ok ? response.json() : null;
+            }).then(function (progress) {
+                if (!progress) {
+                    return;
+                }
+                status.textContent = progress.done + ' / ' + progress.total +
+                    (progress.failed ? ' (' + progress.failed + ' failed)' : '');
+                if (progress.status !== 'running') {
+                    clearInterval(timer);
+                }
+            });
+        }, 1000);
+    });
+});
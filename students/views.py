@@ -5,7 +5,7 @@ from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy
 from django.http import JsonResponse, HttpResponse
-from django.db.models import Q, Count, Avg, Sum
+from django.db.models import Q, Count, Avg, Sum, OuterRef, Subquery
 from django.utils import timezone
 from django.core.paginator import Paginator
 from django.db import transaction
@@ -22,6 +22,9 @@ from .models import (
 )
 from accounts.models import User
 from moze.models import Moze
+from umoor_sehhat.exports import (
+    Column, ExportSource, StreamingExport, choice_column, date_column, export_format, name_column
+)
 
 
 @login_required
@@ -658,9 +661,7 @@ def student_analytics(request):
 
 @login_required
 def export_student_data(request):
-    """Export student data to CSV"""
-    import csv
-    
+    """Export students or enrollments to CSV, or to Excel with ``?format=xlsx``"""
     user = request.user
     
     # Check permissions
@@ -680,51 +681,34 @@ def export_student_data(request):
         )
         enrollments = Enrollment.objects.filter(student__in=students)
     
-    response = HttpResponse(content_type='text/csv')
+    if data_type == 'enrollments':
+        average_grade = Grade.objects.filter(
+            student=OuterRef('student'), assignment__course=OuterRef('course')
+        ).values('student').annotate(avg=Avg('points')).values('avg')
+        columns = [
+            name_column('Student', 'student__user'),
+            Column('Course', 'course__name'),
+            Column('Enrollment Date', 'enrolled_date'),
+            choice_column('Status', 'status', Enrollment._meta.get_field('status')),
+            Column('Grade', 'average_grade', format=lambda avg: f"{avg:.2f}" if avg else 'N/A'),
+        ]
+        source = ExportSource(enrollments.annotate(average_grade=Subquery(average_grade)), columns)
+    else:
+        data_type = 'students'
+        columns = [
+            Column('Student ID', 'student_id'),
+            name_column('Name', 'user'),
+            Column('ITS ID', 'user__its_id'),
+            Column('Email', 'user__email'),
+            Column('Phone', 'user__phone_number'),
+            choice_column('Year of Study', 'academic_level', Student._meta.get_field('academic_level')),
+            Column('Moze', format=lambda: ''),  # Moze field removed from Student model
+            Column('Active', 'enrollment_status', format=lambda status: 'Yes' if status == 'active' else 'No'),
+            date_column('Enrollment Date', 'enrollment_date', '%Y-%m-%d'),
+        ]
+        source = ExportSource(students, columns)
     
-    if data_type == 'students':
-        response['Content-Disposition'] = 'attachment; filename="students.csv"'
-        writer = csv.writer(response)
-        writer.writerow([
-            'Student ID', 'Name', 'ITS ID', 'Email', 'Phone', 
-            'Year of Study', 'Moze', 'Active', 'Enrollment Date'
-        ])
-        
-        for student in students.select_related('user'):
-            writer.writerow([
-                student.student_id,
-                student.user.get_full_name(),
-                student.user.its_id,
-                student.user.email,
-                student.user.phone_number,
-                student.get_academic_level_display(),
-                '',  # Moze field removed from Student model
-                'Yes' if student.enrollment_status == 'active' else 'No',
-                student.enrollment_date.strftime('%Y-%m-%d')
-            ])
-    
-    elif data_type == 'enrollments':
-        response['Content-Disposition'] = 'attachment; filename="enrollments.csv"'
-        writer = csv.writer(response)
-        writer.writerow([
-            'Student', 'Course', 'Enrollment Date', 'Status', 'Grade'
-        ])
-        
-        for enrollment in enrollments.select_related('student__user', 'course'):
-            avg_grade = Grade.objects.filter(
-                student=enrollment.student,
-                assignment__course=enrollment.course
-            ).aggregate(avg=Avg('points'))['avg']
-            
-            writer.writerow([
-                enrollment.student.user.get_full_name(),
-                enrollment.course.name,
-                enrollment.enrolled_date,
-                enrollment.get_status_display(),
-                f"{avg_grade:.2f}" if avg_grade else 'N/A'
-            ])
-    
-    return response
+    return StreamingExport(data_type, [source]).response(export_format(request))
 
 
 class StudentDetailView(LoginRequiredMixin, DetailView):
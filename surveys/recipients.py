@@ -0,0 +1,121 @@
+"""
+Set-based resolution of who should be invited to or reminded about a survey.
+
+Eligibility (target role, no response yet, under the reminder cap, not
+reminded too recently) is decided by a single query per survey; the
+``SurveyReminder`` rows are then created and advanced in bulk per batch.
+"""
+from datetime import timedelta
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, F, FilteredRelation, OuterRef, Q
+from django.utils import timezone
+
+from .models import SurveyReminder, SurveyResponse
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+RECIPIENT_BATCH_SIZE = 2000
+# Fields the invitation and reminder templates use, get_full_name() included
+USER_FIELDS = ['id', 'username', 'email', 'first_name', 'last_name', 'arabic_full_name']
+
+
+class SurveyRecipientResolver:
+    """
+    Invitation and reminder recipients of one survey.
+    
+    ``min_interval`` is the shortest time between two emails about the
+    survey to the same user; the number of reminders is capped by each
+    user's ``SurveyReminder.max_reminders``.
+    """
+    
+    def __init__(self, survey, batch_size=RECIPIENT_BATCH_SIZE, min_interval=timedelta(days=1)):
+        self.survey = survey
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+    
+    def targeted_users(self):
+        """Active users with an email address in the survey's audience who have not responded"""
+        users = User.objects.filter(is_active=True).exclude(email__isnull=True).exclude(email='')
+        if self.survey.target_role != 'all':
+            users = users.filter(role=self.survey.target_role)
+        return users.exclude(
+            Exists(SurveyResponse.objects.filter(survey=self.survey, respondent=OuterRef('pk')))
+        )
+    
+    def _with_reminder(self):
+        return self.targeted_users().annotate(
+            reminder=FilteredRelation('surveyreminder', condition=Q(surveyreminder__survey=self.survey))
+        )
+    
+    def invitation_recipients(self):
+        """Targeted users who have not been contacted about the survey yet"""
+        return self._with_reminder().filter(reminder__isnull=True)
+    
+    def reminder_recipients(self, now=None):
+        """
+        Targeted users who are due a reminder, as ``(user id, reminder id)``
+        rows; the reminder id is None for users never contacted
+        """
+        now = now or timezone.now()
+        return self._with_reminder().filter(
+            Q(reminder__isnull=True) | Q(
+                Q(reminder__last_reminder_sent__isnull=True) | Q(reminder__last_reminder_sent__lte=now - self.min_interval),
+                reminder__is_active=True,
+                reminder__has_responded=False,
+                reminder__reminder_count__lt=F('reminder__max_reminders'),
+            )
+        ).order_by('pk').values_list('pk', 'reminder__pk')
+    
+    def sync_responded(self):
+        """Mark the reminders of users who have since responded; returns the number updated"""
+        return SurveyReminder.objects.filter(survey=self.survey, has_responded=False).filter(
+            Exists(SurveyResponse.objects.filter(survey=self.survey, respondent=OuterRef('user_id')))
+        ).update(has_responded=True)
+    
+    def _batches(self, rows):
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            users = User.objects.only(*USER_FIELDS).in_bulk([row[0] for row in batch])
+            yield [(users[user_id], reminder_id) for user_id, reminder_id in batch if user_id in users]
+    
+    def send_invitations(self, now=None):
+        """Invite every targeted user not contacted yet; returns the number of emails queued"""
+        from umoor_sehhat.notifications import NotificationService
+        
+        now = now or timezone.now()
+        rows = list(self.invitation_recipients().order_by('pk').values_list('pk', 'reminder__pk'))
+        queued = 0
+        for batch in self._batches(rows):
+            users = [user for user, _ in batch]
+            queued += NotificationService.send_survey_invitation(self.survey, users) or 0
+            SurveyReminder.objects.bulk_create([
+                SurveyReminder(survey=self.survey, user=user, reminder_count=0, last_reminder_sent=now)
+                for user in users
+            ])
+        
+        logger.info(f"Invited {queued} users to survey {self.survey.pk}")
+        return queued
+    
+    def send_reminders(self, now=None):
+        """Remind every user due a reminder; returns the number of emails queued"""
+        from umoor_sehhat.notifications import NotificationService
+        
+        now = now or timezone.now()
+        self.sync_responded()
+        rows = list(self.reminder_recipients(now))
+        queued = 0
+        for batch in self._batches(rows):
+            queued += NotificationService.send_survey_reminder(self.survey, [user for user, _ in batch]) or 0
+            SurveyReminder.objects.bulk_create([
+                SurveyReminder(survey=self.survey, user=user, reminder_count=1, last_reminder_sent=now)
+                for user, reminder_id in batch if reminder_id is None
+            ])
+            SurveyReminder.objects.filter(
+                pk__in=[reminder_id for _, reminder_id in batch if reminder_id is not None]
+            ).update(reminder_count=F('reminder_count') + 1, last_reminder_sent=now)
+        
+        logger.info(f"Reminded {queued} users about survey {self.survey.pk}")
+        return queued
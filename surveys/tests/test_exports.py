@@ -0,0 +1,55 @@
+"""
+Tests for streamed survey result exports
+"""
+import csv
+import io
+
+from django.test import TestCase
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from accounts.models import User
+from surveys.models import Survey, SurveyResponse
+
+
+def read_csv(response):
+    return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+
+class SurveyResultsExportTest(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', role='badri_mahal_admin')
+        self.doctor = User.objects.create_user(username='doctor', role='doctor', first_name='Ali')
+        self.survey = Survey.objects.create(
+            title='Clinic feedback',
+            target_role='all',
+            questions=[
+                {'id': 1, 'type': 'text', 'question': 'Any comments?'},
+                {'id': 2, 'type': 'checkbox', 'question': 'Services used'},
+            ],
+            created_by=self.admin
+        )
+        SurveyResponse.objects.create(
+            survey=self.survey, respondent=self.doctor, answers={'1': 'Fine', '2': ['OPD', 'Pharmacy']}
+        )
+        SurveyResponse.objects.create(survey=self.survey, answers={'2': ['Lab']})
+        self.url = reverse('surveys:export_results', args=[self.survey.pk])
+        self.client.force_login(self.admin)
+    
+    def test_csv(self):
+        rows = read_csv(self.client.get(self.url))
+        
+        self.assertEqual(rows[0][4:], ['Q1: Any comments?', 'Q2: Services used'])
+        self.assertEqual(
+            sorted(row[1:3] + row[4:] for row in rows[1:]),
+            [['Ali', 'Doctor', 'Fine', 'OPD, Pharmacy'], ['Anonymous', 'Anonymous', '', 'Lab']]
+        )
+    
+    def test_xlsx(self):
+        response = self.client.get(self.url, {'format': 'xlsx'})
+        
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="survey_{self.survey.pk}_results.xlsx"')
+        rows = list(load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True).active.values)
+        self.assertEqual(len(rows), 3)
+        self.assertIn('OPD, Pharmacy', [row[5] for row in rows])
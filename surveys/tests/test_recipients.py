@@ -0,0 +1,132 @@
+"""
+Tests for survey invitation and reminder recipient resolution
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import EmailOutbox
+from surveys.models import Survey, SurveyReminder, SurveyResponse
+from surveys.recipients import SurveyRecipientResolver
+from umoor_sehhat.notifications import ScheduledNotifications
+
+User = get_user_model()
+
+
+class SurveyRecipientResolverTest(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.admin = User.objects.create_user(username='admin', email='admin@test.com', role='badri_mahal_admin')
+        self.doctors = [
+            User.objects.create_user(username=f'doctor{index}', email=f'doctor{index}@test.com', role='doctor')
+            for index in range(4)
+        ]
+        User.objects.create_user(username='student', email='student@test.com', role='student')
+        User.objects.create_user(username='no_email', email='', role='doctor')
+        User.objects.create_user(username='inactive', email='inactive@test.com', role='doctor', is_active=False)
+        self.survey = Survey.objects.create(
+            title='Clinic feedback',
+            target_role='doctor',
+            questions=[{'id': 1, 'type': 'text', 'question': 'Any comments?'}],
+            created_by=self.admin,
+            end_date=self.now + timedelta(days=2)
+        )
+        self.resolver = SurveyRecipientResolver(self.survey)
+    
+    def respond(self, user):
+        SurveyResponse.objects.create(survey=self.survey, respondent=user, answers={'1': 'Fine'})
+    
+    def recipients(self, now=None):
+        return sorted(user_id for user_id, _ in self.resolver.reminder_recipients(now or self.now))
+    
+    def test_targets_role_without_respondents(self):
+        self.respond(self.doctors[0])
+        
+        self.assertEqual(self.recipients(), [user.pk for user in self.doctors[1:]])
+    
+    def test_all_roles(self):
+        self.survey.target_role = 'all'
+        
+        self.assertEqual(len(self.recipients()), 6)
+    
+    def test_resolved_in_one_query(self):
+        SurveyReminder.objects.create(survey=self.survey, user=self.doctors[0], reminder_count=3)
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.recipients()), 3)
+    
+    def test_capped_recent_and_inactive_reminders_are_excluded(self):
+        SurveyReminder.objects.create(survey=self.survey, user=self.doctors[0], reminder_count=3)
+        SurveyReminder.objects.create(
+            survey=self.survey, user=self.doctors[1], reminder_count=1, last_reminder_sent=self.now - timedelta(hours=2)
+        )
+        SurveyReminder.objects.create(survey=self.survey, user=self.doctors[2], is_active=False)
+        due = SurveyReminder.objects.create(
+            survey=self.survey, user=self.doctors[3], reminder_count=2, last_reminder_sent=self.now - timedelta(days=2)
+        )
+        
+        self.assertEqual(list(self.resolver.reminder_recipients(self.now)), [(self.doctors[3].pk, due.pk)])
+    
+    def test_send_reminders_creates_and_advances_reminders(self):
+        existing = SurveyReminder.objects.create(
+            survey=self.survey, user=self.doctors[0], reminder_count=1, last_reminder_sent=self.now - timedelta(days=2)
+        )
+        self.respond(self.doctors[1])
+        
+        self.assertEqual(self.resolver.send_reminders(self.now), 3)
+        
+        existing.refresh_from_db()
+        self.assertEqual((existing.reminder_count, existing.last_reminder_sent), (2, self.now))
+        self.assertEqual(
+            set(SurveyReminder.objects.filter(reminder_count=1).values_list('user__username', flat=True)),
+            {'doctor2', 'doctor3'}
+        )
+        self.assertEqual(EmailOutbox.objects.filter(kind='survey_reminder').count(), 3)
+        
+        # Nobody is due again within the minimum interval
+        self.assertEqual(self.resolver.send_reminders(self.now + timedelta(hours=1)), 0)
+    
+    def test_reminders_stop_at_the_cap(self):
+        sent = [self.resolver.send_reminders(self.now + timedelta(days=day)) for day in range(5)]
+        
+        self.assertEqual(sent, [4, 4, 4, 0, 0])
+    
+    def test_respondents_reminders_are_marked(self):
+        reminder = SurveyReminder.objects.create(survey=self.survey, user=self.doctors[0], reminder_count=1)
+        self.respond(self.doctors[0])
+        
+        self.resolver.send_reminders(self.now)
+        
+        reminder.refresh_from_db()
+        self.assertTrue(reminder.has_responded)
+        self.assertEqual(reminder.reminder_count, 1)
+    
+    def test_batches(self):
+        resolver = SurveyRecipientResolver(self.survey, batch_size=3)
+        
+        self.assertEqual(resolver.send_reminders(self.now), 4)
+        self.assertEqual(SurveyReminder.objects.count(), 4)
+    
+    def test_invitations_go_to_users_not_contacted(self):
+        SurveyReminder.objects.create(survey=self.survey, user=self.doctors[0], reminder_count=1)
+        
+        self.assertEqual(self.resolver.send_invitations(self.now), 3)
+        self.assertEqual(self.resolver.send_invitations(self.now), 0)
+        
+        self.assertEqual(SurveyReminder.objects.filter(reminder_count=0, last_reminder_sent=self.now).count(), 3)
+        self.assertEqual(EmailOutbox.objects.filter(kind='survey_invitation').count(), 3)
+        # The invitation counts towards the minimum interval, not the cap
+        self.assertEqual(self.resolver.send_reminders(self.now + timedelta(days=1)), 4)
+    
+    def test_scheduled_reminders_only_cover_surveys_ending_soon(self):
+        Survey.objects.create(
+            title='Later', target_role='doctor', questions=[], created_by=self.admin,
+            end_date=self.now + timedelta(days=10)
+        )
+        
+        self.assertEqual(ScheduledNotifications.send_survey_reminders(), 4)
+        self.assertEqual(set(SurveyReminder.objects.values_list('survey_id', flat=True)), {self.survey.pk})
+        self.assertEqual(ScheduledNotifications.send_survey_invitations(), 4)
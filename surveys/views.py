@@ -11,12 +11,15 @@ from django.utils import timezone
 from datetime import datetime, timedelta
 from django.core.mail import send_mail
 from django.conf import settings
+from functools import partial
 import json
-import csv
 
 from .models import Survey, SurveyResponse, SurveyReminder, SurveyAnalytics
 from .forms import SurveyForm, SurveyResponseForm, SurveyReminderForm
 from accounts.models import User
+from umoor_sehhat.exports import (
+    Column, ExportSource, StreamingExport, choice_column, date_column, export_format, name_column
+)
 
 
 class SurveyAccessMixin(UserPassesTestMixin):
@@ -492,7 +495,7 @@ def survey_analytics(request, pk):
 
 @login_required
 def export_survey_results(request, pk):
-    """Export survey results as CSV"""
+    """Export survey results as CSV, or as Excel with ``?format=xlsx``"""
     survey = get_object_or_404(Survey, pk=pk)
     user = request.user
     
@@ -501,37 +504,29 @@ def export_survey_results(request, pk):
         messages.error(request, "You don't have permission to export survey results.")
         return redirect('surveys:detail', pk=pk)
     
-    # Create CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="survey_{survey.id}_results.csv"'
-    
-    writer = csv.writer(response)
-    
-    # Header row
-    header = ['Response ID', 'User', 'Role', 'Completed At']
+    columns = [
+        Column('Response ID', 'id'),
+        name_column('User', 'respondent', default='Anonymous'),
+        choice_column('Role', 'respondent__role', User._meta.get_field('role'), default='Anonymous'),
+        date_column('Completed At', 'created_at'),
+    ]
     for question in survey.questions:
-        header.append(f"Q{question['id']}: {question['question']}")
-    writer.writerow(header)
-    
-    # Data rows
-    for survey_response in survey.responses.select_related('respondent'):
-        row = [
-            survey_response.id,
-            survey_response.respondent.get_full_name() if survey_response.respondent else 'Anonymous',
-            survey_response.respondent.get_role_display() if survey_response.respondent else 'Anonymous',
-            survey_response.created_at.strftime('%Y-%m-%d %H:%M')
-        ]
-        
-        for question in survey.questions:
-            question_id = str(question['id'])
-            response_value = survey_response.answers.get(question_id, '')
-            if isinstance(response_value, list):
-                response_value = ', '.join(response_value)
-            row.append(response_value)
-        
-        writer.writerow(row)
-    
-    return response
+        columns.append(Column(
+            f"Q{question['id']}: {question['question']}", 'answers',
+            format=partial(survey_answer, str(question['id']))
+        ))
+    
+    return StreamingExport(
+        f'survey_{survey.id}_results', [ExportSource(survey.responses.all(), columns)]
+    ).response(export_format(request))
+
+
+def survey_answer(question_id, answers):
+    """Export cell for the answer to one question"""
+    answer = (answers or {}).get(question_id, '')
+    if isinstance(answer, list):
+        answer = ', '.join(answer)
+    return answer
 
 
 def analyze_question_responses(question, responses):
@@ -0,0 +1,202 @@
+"""
+Render one email template for many recipients.
+
+The template is compiled once per process. Its top-level nodes that do not
+use any recipient field are rendered (and tag-stripped) once per batch, so
+each recipient only renders the nodes that mention them; recipients whose
+fields resolve to the same values share a single body.
+"""
+from functools import lru_cache
+import re
+
+from django.template import Context, Variable, VariableDoesNotExist
+from django.template.base import FilterExpression, Node, TextNode, VariableNode
+from django.template.defaulttags import (
+    AutoEscapeControlNode, CommentNode, FilterNode, ForNode, IfNode, LoadNode, SpacelessNode, WithNode
+)
+from django.template.loader import get_template
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.template.smartif import TokenBase
+from django.utils.html import strip_tags
+
+# Tags that never change the context outside their own scope, so the
+# shared parts of a template can be rendered once without them
+PURE_NODES = (
+    TextNode, VariableNode, IfNode, ForNode, WithNode, CommentNode, SpacelessNode, AutoEscapeControlNode,
+    FilterNode, LoadNode,
+)
+# Stands in for personal output while the shared text is tag-stripped
+MARKER_START = '\ue000'
+MARKER = MARKER_START + '{}\ue001'
+MARKER_RE = re.compile('\ue000(\\d+)\ue001')
+# Personal output containing these may change how tags are stripped
+TEXT_UNSAFE = re.compile('[<>&]')
+
+
+@lru_cache(maxsize=64)
+def get_email_template(template_name):
+    """Compiled ``emails/<template_name>.html``, cached for the life of the process"""
+    return get_template(f'emails/{template_name}.html').template
+
+
+def _collect_variables(value, variables, seen):
+    if id(value) in seen:
+        return True
+    seen.add(id(value))
+    
+    if isinstance(value, (ExtendsNode, IncludeNode)):
+        # Parent and included templates are only known at render time
+        return False
+    if isinstance(value, FilterExpression):
+        if isinstance(value.var, Variable):
+            variables.append(value.var)
+        for _, args in value.filters:
+            variables.extend(arg for lookup, arg in args if lookup)
+        return True
+    if isinstance(value, Variable):
+        variables.append(value)
+        return True
+    if isinstance(value, dict):
+        return all(_collect_variables(item, variables, seen) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return all(_collect_variables(item, variables, seen) for item in value)
+    if isinstance(value, (Node, TokenBase)):
+        # Template nodes and {% if %} conditions
+        return all(_collect_variables(item, variables, seen) for item in vars(value).values())
+    return True
+
+
+def node_variables(node):
+    """
+    Every variable ``node`` can resolve, or None when that is only known
+    at render time (``{% extends %}`` or ``{% include %}``)
+    """
+    variables = []
+    if not _collect_variables(node, variables, set()):
+        return None
+    return tuple(variables)
+
+
+def _is_personal(variable, personal_keys):
+    return bool(variable.lookups) and variable.lookups[0] in personal_keys
+
+
+@lru_cache(maxsize=64)
+def template_layout(template_name, personal_keys):
+    """
+    Split a template's top-level nodes into shared and personal ones.
+    
+    Returns ``(personal_variables, node_is_personal)``: the variables
+    starting with one of ``personal_keys`` (None if unknown) and, when the
+    template only uses ``PURE_NODES``, one flag per top-level node (else
+    None, and every recipient gets a full render).
+    """
+    nodelist = get_email_template(template_name).nodelist
+    
+    variables = node_variables(nodelist)
+    if variables is None:
+        return None, None
+    personal_variables = tuple(variable for variable in variables if _is_personal(variable, personal_keys))
+    
+    if not all(isinstance(node, PURE_NODES) for node in nodelist.get_nodes_by_type(Node)):
+        return personal_variables, None
+    node_is_personal = tuple(
+        any(_is_personal(variable, personal_keys) for variable in node_variables(node))
+        for node in nodelist
+    )
+    return personal_variables, node_is_personal
+
+
+class BulkTemplateRenderer:
+    """
+    Render ``template_name`` for many recipients sharing ``shared_context``.
+    
+    ``render(personal_context)`` only renders the top-level nodes that use
+    one of ``personal_keys``; the rest of the HTML and of its tag-stripped
+    text is built once, on the first call. Recipients whose personal
+    variables resolve to equal values get the body rendered for the first
+    of them, so e.g. every "Dear Ali Shah" invitation is rendered once.
+    """
+    
+    def __init__(self, template_name, shared_context, personal_keys=('user',)):
+        self.template = get_email_template(template_name)
+        self.variables, self.node_is_personal = template_layout(template_name, frozenset(personal_keys))
+        self.context = Context(shared_context)
+        self.personal_nodes = None
+        self.html_parts = None
+        self.text_parts = None
+        self.bodies = {}
+        self.rendered = 0
+    
+    def _render_nodes(self, nodes, personal_context):
+        with self.context.push(personal_context):
+            with self.context.render_context.push_state(self.template):
+                with self.context.bind_template(self.template):
+                    return [node.render_annotated(self.context) for node in nodes]
+    
+    def _build_layout(self, personal_context):
+        nodelist = self.template.nodelist
+        shared = self._render_nodes(
+            [node for node, personal in zip(nodelist, self.node_is_personal) if not personal], personal_context
+        )
+        if any(MARKER_START in part for part in shared):
+            self.node_is_personal = None
+            return
+        
+        self.personal_nodes = [node for node, personal in zip(nodelist, self.node_is_personal) if personal]
+        shared = iter(shared)
+        index = iter(range(len(self.personal_nodes)))
+        self.html_parts = [next(index) if personal else next(shared) for personal in self.node_is_personal]
+        skeleton = strip_tags(''.join(
+            MARKER.format(part) if isinstance(part, int) else part for part in self.html_parts
+        ))
+        self.text_parts = [
+            int(part) if position % 2 else part for position, part in enumerate(MARKER_RE.split(skeleton))
+        ]
+    
+    def body_key(self, personal_context):
+        if self.variables is None:
+            return None
+        
+        values = [tuple(sorted(personal_context))]
+        with self.context.push(personal_context):
+            for variable in self.variables:
+                if variable.lookups[0] not in personal_context:
+                    continue
+                try:
+                    values.append(variable.resolve(self.context))
+                except VariableDoesNotExist:
+                    values.append(None)
+        key = tuple(values)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+    
+    def render(self, personal_context):
+        """Return ``(html, text)`` for one recipient"""
+        key = self.body_key(personal_context)
+        if key is not None and key in self.bodies:
+            return self.bodies[key]
+        
+        if self.node_is_personal is not None and self.html_parts is None:
+            self._build_layout(personal_context)
+        
+        if self.html_parts is None:
+            with self.context.push(personal_context):
+                html = self.template.render(self.context)
+            text = strip_tags(html)
+        else:
+            values = self._render_nodes(self.personal_nodes, personal_context)
+            html = ''.join(values[part] if isinstance(part, int) else part for part in self.html_parts)
+            if any(TEXT_UNSAFE.search(value) for value in values):
+                text = strip_tags(html)
+            else:
+                text = ''.join(values[part] if isinstance(part, int) else part for part in self.text_parts)
+        
+        body = (html, text)
+        self.rendered += 1
+        if key is not None:
+            self.bodies[key] = body
+        return body
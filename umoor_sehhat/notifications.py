@@ -1,15 +1,43 @@
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import send_mail, EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
+from itertools import groupby
 import logging
+import uuid
+
+from .bulk_templates import BulkTemplateRenderer
+from .scheduler import jobs
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Email kinds (template names) that users on an hourly or daily
+# notification frequency receive as one digest per window
+DIGEST_KINDS = {
+    'moze_comment_notification': 'Moze comments',
+    'dua_araz_completion': 'Araz updates',
+    'survey_reminder': 'Survey reminders',
+}
+
+
+def digest_window_end(frequency, now=None):
+    """When the current hourly or daily digest window closes"""
+    now = timezone.localtime(now or timezone.now())
+    if frequency == 'hourly':
+        return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    
+    # Daily digests go out at NOTIFICATION_DIGEST_HOUR local time
+    send_at = now.replace(
+        hour=getattr(settings, 'NOTIFICATION_DIGEST_HOUR', 8), minute=0, second=0, microsecond=0
+    )
+    return send_at if send_at > now else send_at + timedelta(days=1)
+
 
 class NotificationService:
     """Service for sending various types of notifications"""
@@ -19,6 +47,9 @@ class NotificationService:
         """
         Send HTML email notification
         
+        The email is rendered now and written to the outbox, so callers do
+        not wait on SMTP; set EMAIL_OUTBOX_ENABLED = False to send at once.
+        
         Args:
             to_emails: List of email addresses or single email
             subject: Email subject
@@ -29,33 +60,156 @@ class NotificationService:
         if isinstance(to_emails, str):
             to_emails = [to_emails]
         
-        if not from_email:
-            from_email = settings.DEFAULT_FROM_EMAIL
-        
         try:
-            # Render HTML content
-            html_content = render_to_string(f'emails/{template_name}.html', context)
-            text_content = strip_tags(html_content)
-            
-            # Create email message
-            msg = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=from_email,
-                to=to_emails
+            email = NotificationService.build_outbox_email(
+                to_emails, subject, template_name, context, from_email
             )
-            msg.attach_alternative(html_content, "text/html")
-            
-            # Send email
-            msg.send()
-            
-            logger.info(f"Email sent successfully to {to_emails}")
-            return True
-            
+            return NotificationService.deliver([email]) == 1
+        
         except Exception as e:
             logger.error(f"Failed to send email to {to_emails}: {str(e)}")
             return False
     
+    @staticmethod
+    def build_outbox_email(to_emails, subject, template_name, context, from_email=None, recipient=None):
+        """Render an HTML email template into an unsaved outbox row"""
+        from accounts.models import EmailOutbox
+        
+        if isinstance(to_emails, str):
+            to_emails = [to_emails]
+        
+        html_content = render_to_string(f'emails/{template_name}.html', context)
+        return EmailOutbox(
+            recipient=recipient,
+            to_emails=list(to_emails),
+            from_email=from_email or '',
+            subject=subject,
+            body_text=strip_tags(html_content),
+            body_html=html_content,
+            kind=template_name
+        )
+    
+    @staticmethod
+    def build_bulk_outbox_emails(users, subject, template_name, context, from_email=None):
+        """
+        Render one template for many users into unsaved outbox rows
+        
+        ``context`` is shared by every user; each render only adds
+        ``user``, and users whose personal fields match share one body
+        (see ``BulkTemplateRenderer``).
+        """
+        from accounts.models import EmailOutbox
+        
+        try:
+            renderer = BulkTemplateRenderer(template_name, context)
+        except Exception as e:
+            logger.error(f"Failed to load email template {template_name}: {str(e)}")
+            return []
+        
+        emails = []
+        for user in users:
+            if not user.email:
+                continue
+            
+            try:
+                html_content, text_content = renderer.render({'user': user})
+            except Exception as e:
+                logger.error(f"Failed to render {template_name} for {user.email}: {str(e)}")
+                continue
+            emails.append(EmailOutbox(
+                recipient=user,
+                to_emails=[user.email],
+                from_email=from_email or '',
+                subject=subject,
+                body_text=text_content,
+                body_html=html_content,
+                kind=template_name
+            ))
+        
+        logger.debug(f"Rendered {renderer.rendered} distinct {template_name} bodies for {len(emails)} emails")
+        return emails
+    
+    @staticmethod
+    def deliver(emails):
+        """
+        Queue outbox emails in one INSERT, or send them over one connection
+        when EMAIL_OUTBOX_ENABLED is False
+        
+        Returns the number of emails queued or sent.
+        """
+        from accounts.models import EmailOutbox
+        
+        if not emails:
+            return 0
+        if getattr(settings, 'EMAIL_OUTBOX_ENABLED', True):
+            NotificationService.hold_for_digest(emails)
+            EmailOutbox.objects.bulk_create(emails)
+            return len(emails)
+        return NotificationService.send_messages([email.to_message() for email in emails])
+    
+    @staticmethod
+    def hold_for_digest(emails):
+        """
+        Hold digest-kind emails of users on an hourly or daily frequency
+        until their window closes
+        """
+        from accounts.models import UserProfile
+        
+        digestible = [email for email in emails if email.kind in DIGEST_KINDS and email.recipient_id]
+        if not digestible:
+            return
+        
+        frequencies = dict(
+            UserProfile.objects.filter(
+                user_id__in={email.recipient_id for email in digestible}
+            ).exclude(notification_frequency='immediate').values_list('user_id', 'notification_frequency')
+        )
+        now = timezone.now()
+        for email in digestible:
+            frequency = frequencies.get(email.recipient_id)
+            if frequency:
+                email.status = 'held'
+                email.next_attempt_at = digest_window_end(frequency, now)
+    
+    @staticmethod
+    def build_email_message(to_emails, subject, template_name, context, from_email=None):
+        """Render an HTML email template into a message without sending it"""
+        if isinstance(to_emails, str):
+            to_emails = [to_emails]
+        
+        # Render HTML content
+        html_content = render_to_string(f'emails/{template_name}.html', context)
+        text_content = strip_tags(html_content)
+        
+        # Create email message
+        msg = EmailMultiAlternatives(
+            subject=subject,
+            body=text_content,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            to=to_emails
+        )
+        msg.attach_alternative(html_content, "text/html")
+        return msg
+    
+    @staticmethod
+    def send_messages(messages, connection=None):
+        """
+        Send prepared messages over a single mail connection
+        
+        Returns the number of messages sent.
+        """
+        if not messages:
+            return 0
+        
+        try:
+            connection = connection or get_connection()
+            sent = connection.send_messages(messages) or 0
+            logger.info(f"Sent {sent}/{len(messages)} emails over one connection")
+            return sent
+        except Exception as e:
+            logger.error(f"Failed to send batch of {len(messages)} emails: {str(e)}")
+            return 0
+    
     @staticmethod
     def send_appointment_confirmation(appointment):
         """Send appointment confirmation email"""
@@ -120,21 +274,29 @@ class NotificationService:
     @staticmethod
     def send_dua_araz_completion_notification(dua_araz):
         """Send notification when Dua Araz is completed"""
-        if not dua_araz.petitioner.email:
+        recipient = dua_araz.patient_user
+        to_email = (recipient.email if recipient else None) or dua_araz.patient_email
+        if not to_email:
             return False
         
         context = {
             'dua_araz': dua_araz,
-            'petitioner': dua_araz.petitioner,
+            'petitioner': recipient,
             'site_name': 'Umoor Sehhat'
         }
         
-        return NotificationService.send_email_notification(
-            to_emails=dua_araz.petitioner.email,
-            subject='Your Dua Araz Request Update',
-            template_name='dua_araz_completion',
-            context=context
-        )
+        try:
+            email = NotificationService.build_outbox_email(
+                to_emails=to_email,
+                subject='Your Dua Araz Request Update',
+                template_name='dua_araz_completion',
+                context=context,
+                recipient=recipient
+            )
+            return NotificationService.deliver([email]) == 1
+        except Exception as e:
+            logger.error(f"Failed to send dua araz notification to {to_email}: {str(e)}")
+            return False
     
     @staticmethod
     def send_survey_invitation(survey, users):
@@ -142,29 +304,16 @@ class NotificationService:
         if not users:
             return False
         
-        successful_sends = 0
-        
-        for user in users:
-            if not user.email:
-                continue
-            
-            context = {
-                'survey': survey,
-                'user': user,
-                'survey_url': f"/surveys/{survey.id}/",
-                'site_name': 'Umoor Sehhat'
-            }
-            
-            success = NotificationService.send_email_notification(
-                to_emails=user.email,
-                subject=f'Survey Invitation: {survey.title}',
-                template_name='survey_invitation',
-                context=context
-            )
-            
-            if success:
-                successful_sends += 1
+        context = {
+            'survey': survey,
+            'survey_url': f"/surveys/{survey.id}/",
+            'site_name': 'Umoor Sehhat'
+        }
+        emails = NotificationService.build_bulk_outbox_emails(
+            users, f'Survey Invitation: {survey.title}', 'survey_invitation', context
+        )
         
+        successful_sends = NotificationService.deliver(emails)
         logger.info(f"Survey invitation sent to {successful_sends}/{len(users)} users")
         return successful_sends
     
@@ -174,35 +323,22 @@ class NotificationService:
         if not users:
             return False
         
-        successful_sends = 0
-        
-        for user in users:
-            if not user.email:
-                continue
-            
-            context = {
-                'survey': survey,
-                'user': user,
-                'survey_url': f"/surveys/{survey.id}/",
-                'days_remaining': (survey.end_date - timezone.now().date()).days,
-                'site_name': 'Umoor Sehhat'
-            }
-            
-            success = NotificationService.send_email_notification(
-                to_emails=user.email,
-                subject=f'Reminder: {survey.title}',
-                template_name='survey_reminder',
-                context=context
-            )
-            
-            if success:
-                successful_sends += 1
+        context = {
+            'survey': survey,
+            'survey_url': f"/surveys/{survey.id}/",
+            'days_remaining': (survey.end_date - timezone.now()).days,
+            'site_name': 'Umoor Sehhat'
+        }
+        emails = NotificationService.build_bulk_outbox_emails(
+            users, f'Reminder: {survey.title}', 'survey_reminder', context
+        )
         
+        successful_sends = NotificationService.deliver(emails)
         logger.info(f"Survey reminder sent to {successful_sends}/{len(users)} users")
         return successful_sends
     
     @staticmethod
-    def send_welcome_email(user, temporary_password=None):
+    def send_welcome_email(user, temporary_password=None, activation_url=None):
         """Send welcome email to new user"""
         if not user.email:
             return False
@@ -210,6 +346,7 @@ class NotificationService:
         context = {
             'user': user,
             'temporary_password': temporary_password,
+            'activation_url': activation_url,
             'login_url': '/accounts/login/',
             'site_name': 'Umoor Sehhat'
         }
@@ -221,6 +358,39 @@ class NotificationService:
             context=context
         )
     
+    @staticmethod
+    def send_welcome_emails(recipients):
+        """
+        Send welcome emails to many new users over one mail connection
+        
+        Args:
+            recipients: Iterable of (user, temporary_password, activation_url) tuples
+        """
+        messages = []
+        for user, temporary_password, activation_url in recipients:
+            if not user.email:
+                continue
+            
+            context = {
+                'user': user,
+                'temporary_password': temporary_password,
+                'activation_url': activation_url,
+                'login_url': '/accounts/login/',
+                'site_name': 'Umoor Sehhat'
+            }
+            
+            try:
+                messages.append(NotificationService.build_email_message(
+                    to_emails=user.email,
+                    subject='Welcome to Umoor Sehhat',
+                    template_name='welcome_email',
+                    context=context
+                ))
+            except Exception as e:
+                logger.error(f"Failed to render welcome email for {user.email}: {str(e)}")
+        
+        return NotificationService.send_messages(messages)
+    
     @staticmethod
     def send_password_reset_notification(user, reset_link):
         """Send password reset notification"""
@@ -275,19 +445,20 @@ class NotificationService:
             'site_name': 'Umoor Sehhat'
         }
         
-        successful_sends = 0
+        emails = []
         for recipient in recipients:
-            success = NotificationService.send_email_notification(
-                to_emails=recipient.email,
-                subject=f'New comment on {moze.name}',
-                template_name='moze_comment_notification',
-                context={**context, 'recipient': recipient}
-            )
-            
-            if success:
-                successful_sends += 1
-        
-        return successful_sends
+            try:
+                emails.append(NotificationService.build_outbox_email(
+                    to_emails=recipient.email,
+                    subject=f'New comment on {moze.name}',
+                    template_name='moze_comment_notification',
+                    context={**context, 'recipient': recipient},
+                    recipient=recipient
+                ))
+            except Exception as e:
+                logger.error(f"Failed to render moze comment notification for {recipient.email}: {str(e)}")
+        
+        return NotificationService.deliver(emails)
     
     @staticmethod
     def send_bulk_notification(users, subject, message, template_name='bulk_notification'):
@@ -295,30 +466,264 @@ class NotificationService:
         if not users:
             return False
         
-        successful_sends = 0
+        context = {
+            'message': message,
+            'site_name': 'Umoor Sehhat'
+        }
+        emails = NotificationService.build_bulk_outbox_emails(users, subject, template_name, context)
         
-        for user in users:
-            if not user.email:
-                continue
+        successful_sends = NotificationService.deliver(emails)
+        logger.info(f"Bulk notification sent to {successful_sends}/{len(users)} users")
+        return successful_sends
+
+
+class NotificationDigestBuilder:
+    """
+    Merge held outbox emails into one digest per recipient and kind.
+    
+    Due groups are found with a single GROUP BY over the outbox and handled
+    ``batch_size`` groups at a time: a group of several emails becomes one
+    pending digest email and its members are marked ``digested``; a group
+    of one is simply released to the drainer. Emails whose recipient has
+    been deleted are released as they are, outside the grouping.
+    """
+    
+    ROW_FIELDS = ['pk', 'recipient_id', 'kind', 'to_emails', 'subject', 'body_text', 'created_at']
+    
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+    
+    def _due(self, now):
+        from accounts.models import EmailOutbox
+        
+        return EmailOutbox.objects.filter(status='held', next_attempt_at__lte=now)
+    
+    def release_orphans(self, now):
+        """Release due emails whose recipient was deleted; returns how many"""
+        return self._due(now).filter(recipient__isnull=True).update(status='pending', next_attempt_at=now)
+    
+    def due_groups(self, now, after=None):
+        """Next ``batch_size`` (recipient, kind) groups with their sizes, ordered by key"""
+        # NULL recipients are left to release_orphans so every key is comparable
+        groups = self._due(now).filter(recipient__isnull=False)
+        if after is not None:
+            recipient_id, kind = after
+            groups = groups.filter(Q(recipient_id__gt=recipient_id) | Q(recipient_id=recipient_id, kind__gt=kind))
+        return list(
+            groups.values('recipient_id', 'kind').annotate(count=Count('pk'))
+            .order_by('recipient_id', 'kind')[:self.batch_size]
+        )
+    
+    def build_batch(self, groups, now):
+        """Digest one batch of groups; returns (digests, released)"""
+        from accounts.models import EmailOutbox
+        
+        wanted = {(group['recipient_id'], group['kind']) for group in groups}
+        with transaction.atomic():
+            rows = (
+                self._due(now)
+                .filter(recipient_id__in={key[0] for key in wanted}, kind__in={key[1] for key in wanted})
+                .select_for_update(skip_locked=True)
+                .order_by('recipient_id', 'kind', 'created_at', 'pk')
+                .values(*self.ROW_FIELDS)
+            )
+            users = User.objects.in_bulk({key[0] for key in wanted})
+            renderers = {}
+            digests = []
+            digested_ids = []
+            released_ids = []
             
-            context = {
-                'user': user,
-                'message': message,
-                'site_name': 'Umoor Sehhat'
-            }
+            for key, items in groupby(rows, key=lambda row: (row['recipient_id'], row['kind'])):
+                if key not in wanted:
+                    continue
+                items = list(items)
+                if len(items) == 1 or key[0] not in users:
+                    released_ids.extend(item['pk'] for item in items)
+                    continue
+                
+                label = DIGEST_KINDS.get(key[1], key[1])
+                if key[1] not in renderers:
+                    renderers[key[1]] = BulkTemplateRenderer(
+                        'notification_digest',
+                        {'label': label, 'site_name': 'Umoor Sehhat'},
+                        personal_keys=('user', 'notifications')
+                    )
+                html_content, text_content = renderers[key[1]].render({'user': users[key[0]], 'notifications': items})
+                digests.append(EmailOutbox(
+                    recipient_id=key[0],
+                    to_emails=items[-1]['to_emails'],
+                    subject=f'{label}: {len(items)} new notifications',
+                    body_text=text_content,
+                    body_html=html_content,
+                    kind='notification_digest'
+                ))
+                digested_ids.extend(item['pk'] for item in items)
             
-            success = NotificationService.send_email_notification(
-                to_emails=user.email,
-                subject=subject,
-                template_name=template_name,
-                context=context
+            EmailOutbox.objects.bulk_create(digests)
+            if digested_ids:
+                EmailOutbox.objects.filter(pk__in=digested_ids).update(status='digested')
+            if released_ids:
+                EmailOutbox.objects.filter(pk__in=released_ids).update(status='pending', next_attempt_at=now)
+        
+        return len(digests), len(released_ids)
+    
+    def run(self, max_batches=None):
+        """Digest every due group; returns (digests, released)"""
+        now = timezone.now()
+        digests = batches = 0
+        released = self.release_orphans(now)
+        after = None
+        while max_batches is None or batches < max_batches:
+            groups = self.due_groups(now, after)
+            if not groups:
+                break
+            batch_digests, batch_released = self.build_batch(groups, now)
+            digests += batch_digests
+            released += batch_released
+            batches += 1
+            after = (groups[-1]['recipient_id'], groups[-1]['kind'])
+        
+        logger.info(f"Built {digests} notification digests and released {released} single notifications")
+        return digests, released
+
+
+class EmailOutboxDrainer:
+    """
+    Deliver queued outbox emails in batches.
+    
+    Several drainers can run at once: a batch is claimed by locking due
+    rows with ``select_for_update(skip_locked=True)`` and stamping them with
+    a claim token in one short transaction. Each batch is sent over a
+    single mail connection. Failed emails are retried with exponential
+    backoff and moved to the dead letters after ``max_attempts``.
+    """
+    
+    UPDATE_FIELDS = ['status', 'attempts', 'next_attempt_at', 'last_error', 'claim_token', 'claimed_at', 'sent_at']
+    
+    def __init__(self, batch_size=100, max_attempts=5, backoff_seconds=60, max_backoff_seconds=6 * 60 * 60,
+                 lease_seconds=300, connection=None):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.connection = connection
+    
+    def _claimable(self, now):
+        from accounts.models import EmailOutbox
+        
+        stale = now - timedelta(seconds=self.lease_seconds)
+        return EmailOutbox.objects.filter(
+            Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', claimed_at__lt=stale)
+        )
+    
+    def claim_batch(self):
+        """Claim up to ``batch_size`` due emails for this worker"""
+        from accounts.models import EmailOutbox
+        
+        now = timezone.now()
+        token = uuid.uuid4().hex
+        
+        with transaction.atomic():
+            ids = list(
+                self._claimable(now).select_for_update(skip_locked=True)
+                .order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:self.batch_size]
             )
-            
-            if success:
-                successful_sends += 1
+            if not ids:
+                return []
+            self._claimable(now).filter(pk__in=ids).update(status='sending', claim_token=token, claimed_at=now)
+            return list(EmailOutbox.objects.filter(claim_token=token, status='sending'))
+    
+    def backoff(self, attempts):
+        """Delay before the next attempt after ``attempts`` failures"""
+        return timedelta(seconds=min(self.backoff_seconds * 2 ** (attempts - 1), self.max_backoff_seconds))
+    
+    def send_batch(self, emails):
+        """Send a claimed batch over one connection, setting each outcome in memory"""
+        now = timezone.now()
+        connection = self.connection or get_connection()
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Could not open mail connection for {len(emails)} outbox emails: {str(e)}")
+            for email in emails:
+                self._failed(email, e, now)
+            return
         
-        logger.info(f"Bulk notification sent to {successful_sends}/{len(users)} users")
-        return successful_sends
+        try:
+            for email in emails:
+                try:
+                    sent = connection.send_messages([email.to_message(connection)])
+                except Exception as e:
+                    self._failed(email, e, now)
+                    continue
+                if sent:
+                    email.status = 'sent'
+                    email.attempts += 1
+                    email.sent_at = now
+                    email.last_error = ''
+                else:
+                    self._failed(email, 'Mail backend did not accept the message', now)
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        
+        for email in emails:
+            email.claim_token = ''
+            email.claimed_at = None
+    
+    def _failed(self, email, error, now):
+        email.attempts += 1
+        email.last_error = str(error)
+        if email.attempts >= self.max_attempts:
+            email.status = 'dead'
+            logger.error(f"Outbox email {email.pk} moved to dead letters after {email.attempts} attempts: {error}")
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = now + self.backoff(email.attempts)
+    
+    def record_batch(self, emails):
+        """
+        Write a sent batch back; returns (sent, failed)
+        
+        Delivered rows share one UPDATE; only failures, each with its own
+        backoff, go through ``bulk_update``.
+        """
+        from accounts.models import EmailOutbox
+        
+        sent = [email for email in emails if email.status == 'sent']
+        failed = [email for email in emails if email.status != 'sent']
+        with transaction.atomic():
+            if sent:
+                EmailOutbox.objects.filter(pk__in=[email.pk for email in sent]).update(
+                    status='sent',
+                    attempts=F('attempts') + 1,
+                    sent_at=sent[0].sent_at,
+                    last_error='',
+                    claim_token='',
+                    claimed_at=None
+                )
+            if failed:
+                EmailOutbox.objects.bulk_update(failed, self.UPDATE_FIELDS)
+        return len(sent), len(failed)
+    
+    def run(self, max_batches=None):
+        """Drain due emails until none are left; returns (sent, failed)"""
+        sent = failed = batches = 0
+        while max_batches is None or batches < max_batches:
+            emails = self.claim_batch()
+            if not emails:
+                break
+            self.send_batch(emails)
+            batch_sent, batch_failed = self.record_batch(emails)
+            sent += batch_sent
+            failed += batch_failed
+            batches += 1
+        
+        logger.info(f"Drained {batches} outbox batches: {sent} sent, {failed} failed")
+        return sent, failed
 
 
 class ScheduledNotifications:
@@ -374,35 +779,44 @@ class ScheduledNotifications:
         logger.info(f"Sent {sent_count} daily schedules to doctors for {tomorrow}")
         return sent_count
     
+    @staticmethod
+    def send_survey_invitations():
+        """Invite users who have not been contacted yet to every open survey"""
+        from surveys.models import Survey
+        from surveys.recipients import SurveyRecipientResolver
+        
+        now = timezone.now()
+        open_surveys = Survey.objects.filter(is_active=True).filter(
+            Q(start_date__isnull=True) | Q(start_date__lte=now),
+            Q(end_date__isnull=True) | Q(end_date__gt=now)
+        )
+        
+        total_sent = 0
+        for survey in open_surveys:
+            total_sent += SurveyRecipientResolver(survey).send_invitations(now)
+        
+        logger.info(f"Sent {total_sent} survey invitations")
+        return total_sent
+    
     @staticmethod
     def send_survey_reminders():
         """Send reminders for active surveys"""
-        from surveys.models import Survey, SurveyResponse
+        from surveys.models import Survey
+        from surveys.recipients import SurveyRecipientResolver
         
-        # Find surveys ending in 3 days
-        reminder_date = timezone.now().date() + timedelta(days=3)
+        # Remind about surveys ending in the next few days
+        now = timezone.now()
+        reminder_days = getattr(settings, 'SURVEY_REMINDER_DAYS', 3)
         
         active_surveys = Survey.objects.filter(
             is_active=True,
-            end_date=reminder_date
-        )
+            end_date__gt=now,
+            end_date__lte=now + timedelta(days=reminder_days)
+        ).filter(Q(start_date__isnull=True) | Q(start_date__lte=now))
         
         total_sent = 0
         for survey in active_surveys:
-            # Get users who haven't responded
-            responded_user_ids = SurveyResponse.objects.filter(
-                survey=survey
-            ).values_list('user_id', flat=True)
-            
-            target_users = User.objects.filter(
-                role__in=survey.target_audience,
-                email__isnull=False,
-                is_active=True
-            ).exclude(id__in=responded_user_ids)
-            
-            if target_users.exists():
-                sent_count = NotificationService.send_survey_reminder(survey, target_users)
-                total_sent += sent_count
+            total_sent += SurveyRecipientResolver(survey).send_reminders(now)
         
         logger.info(f"Sent {total_sent} survey reminders")
         return total_sent
@@ -461,4 +875,28 @@ class ScheduledNotifications:
                 sent_count += 1
         
         logger.info(f"Sent weekly summary to {sent_count} administrators")
-        return sent_count
\ No newline at end of file
+        return sent_count
+    
+    @staticmethod
+    def build_notification_digests():
+        """Merge held notifications whose digest window has closed"""
+        digests, _ = NotificationDigestBuilder().run()
+        return digests
+    
+    @staticmethod
+    def reoffer_waiting_list_holds():
+        """Pass appointment places whose waiting list hold lapsed on to the next entries"""
+        from appointments.utils import WaitingListMatcher
+        
+        offers = WaitingListMatcher().reoffer_expired_holds()
+        logger.info(f"Re-offered lapsed holds to {len(offers)} waiting list entries")
+        return len(offers)
+
+
+jobs.register('daily_appointment_reminders', '0 18 * * *', ScheduledNotifications.send_daily_appointment_reminders)
+jobs.register('doctor_daily_schedules', '0 19 * * *', ScheduledNotifications.send_doctor_daily_schedules)
+jobs.register('survey_invitations', '0 8 * * *', ScheduledNotifications.send_survey_invitations)
+jobs.register('survey_reminders', '0 9 * * *', ScheduledNotifications.send_survey_reminders)
+jobs.register('weekly_summary', '0 7 * * 1', ScheduledNotifications.send_weekly_summary)
+jobs.register('notification_digests', '0 * * * *', ScheduledNotifications.build_notification_digests, grace_seconds=55 * 60)
+jobs.register('waiting_list_holds', '*/5 * * * *', ScheduledNotifications.reoffer_waiting_list_holds, grace_seconds=5 * 60)
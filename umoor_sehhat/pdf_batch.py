@@ -0,0 +1,296 @@
+"""
+Export many PDFs at once as a streamed ZIP.
+
+Documents are read from the database in chunks, rendered in parallel by
+a process pool shared by every export (``PDF_BATCH_WORKERS`` processes,
+however many exports run at once) and written into the ZIP as soon as they are ready, so an
+export of any size keeps at most ``chunk_size`` documents' inputs and
+``max_in_flight`` rendered PDFs in memory. The archive is produced
+incrementally for ``StreamingHttpResponse``; progress is published in the
+cache under the export id.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import io
+import logging
+import re
+import threading
+import uuid
+import zipfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Prefetch, Q, Window
+from django.db.models.functions import RowNumber
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .pdf_generator import PDFGenerator
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CACHE_KEY = 'pdf_batch_progress:{}'
+PROGRESS_TIMEOUT = 60 * 60
+DEFAULT_CHUNK_SIZE = 50
+# Generator methods a worker may be asked to run
+DOCUMENT_RENDERERS = {
+    'doctor_schedule': 'create_doctor_schedule_pdf',
+    'moze_report': 'create_moze_report_pdf',
+}
+
+
+def _init_worker():
+    # Needed when workers are spawned rather than forked
+    import django
+    django.setup()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_batch_executor():
+    """Process-wide worker pool for batch exports, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'PDF_BATCH_WORKERS', 2), initializer=_init_worker
+            )
+        return _executor
+
+
+def _discard_executor(executor):
+    """Drop a pool whose worker died, so the next export starts a new one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def render_document(kind, args):
+    """Render one document in a worker; ``args`` must be fully loaded, as workers never query"""
+    buffer = getattr(PDFGenerator, DOCUMENT_RENDERERS[kind])(*args)
+    try:
+        return buffer.getvalue()
+    finally:
+        buffer.close()
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only file that hands out what ZipFile wrote since the last take()"""
+    
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+EXPORT_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def batch_export_id(request):
+    """The client-chosen ``?export_id=`` to poll progress with, or a new one"""
+    export_id = request.GET.get('export_id', '')
+    return export_id if EXPORT_ID_RE.match(export_id) else uuid.uuid4().hex
+
+
+def set_progress(export_id, **progress):
+    if export_id:
+        cache.set(PROGRESS_CACHE_KEY.format(export_id), progress, PROGRESS_TIMEOUT)
+
+
+def get_progress(export_id):
+    return cache.get(PROGRESS_CACHE_KEY.format(export_id))
+
+
+class PDFBatchExporter:
+    """
+    Render ``documents`` into a ZIP archive.
+    
+    ``documents`` is an iterable of ``(filename, kind, args)`` where
+    ``kind`` is a key of ``DOCUMENT_RENDERERS``; ``total`` is used for
+    progress only. Documents that fail to render are listed in an
+    ``errors.txt`` entry instead of aborting the export.
+    """
+    
+    def __init__(self, documents, total, export_id=None, executor=None, max_in_flight=None):
+        self.documents = documents
+        self.total = total
+        self.export_id = export_id
+        self.executor = executor or get_batch_executor()
+        self.max_in_flight = max_in_flight or getattr(settings, 'PDF_BATCH_WORKERS', 2) * 2
+        self.done = 0
+        self.failed = []
+    
+    def _report(self, status='running'):
+        set_progress(
+            self.export_id, status=status, done=self.done, failed=len(self.failed), total=self.total
+        )
+    
+    def _write(self, archive, filename, future):
+        try:
+            data = future.result()
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to render {filename} for PDF export: {str(e)}")
+            self.failed.append(f'{filename}: {e}')
+        else:
+            entry = zipfile.ZipInfo(filename, date_time=datetime.now().timetuple()[:6])
+            # PDF streams are already compressed
+            archive.writestr(entry, data, compress_type=zipfile.ZIP_STORED)
+        self.done += 1
+        if self.done % 10 == 0 or self.done == self.total:
+            self._report()
+    
+    def stream(self):
+        """Yield the ZIP archive in chunks"""
+        out = _ZipStream()
+        self._report()
+        pending = deque()
+        try:
+            with zipfile.ZipFile(out, 'w') as archive:
+                for filename, kind, args in self.documents:
+                    if len(pending) >= self.max_in_flight:
+                        self._write(archive, *pending.popleft())
+                        yield out.take()
+                    pending.append((filename, self.executor.submit(render_document, kind, args)))
+                
+                while pending:
+                    self._write(archive, *pending.popleft())
+                    yield out.take()
+                
+                if self.failed:
+                    archive.writestr('errors.txt', '\n'.join(self.failed) + '\n')
+            yield out.take()
+            self._report('finished')
+        except GeneratorExit:
+            # The client went away
+            self._report('cancelled')
+            raise
+        except BrokenProcessPool:
+            self._report('failed')
+            _discard_executor(self.executor)
+            raise
+        except Exception:
+            self._report('failed')
+            raise
+        finally:
+            # The pool is shared; only drop this export's queued documents
+            for _, future in pending:
+                future.cancel()
+        
+        logger.info(f"PDF export {self.export_id} finished: {self.done - len(self.failed)} documents, "
+                    f"{len(self.failed)} failed")
+    
+    def response(self, filename):
+        response = StreamingHttpResponse(self.stream(), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if self.export_id:
+            response['X-Export-Id'] = self.export_id
+        return response
+
+
+def _chunks(queryset, chunk_size):
+    """Keyset-paginated model instances, one chunk of pks at a time"""
+    last_pk = None
+    while True:
+        page = queryset.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        page = list(page[:chunk_size])
+        if not page:
+            return
+        yield page
+        last_pk = page[-1].pk
+
+
+def doctor_schedule_documents(schedule_date, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    ``(documents, total)`` for every doctor with appointments on
+    ``schedule_date``
+    """
+    from doctordirectory.models import Appointment, Doctor
+    
+    doctors = Doctor.objects.filter(appointments__appointment_date=schedule_date).distinct()
+    appointments = Appointment.objects.filter(appointment_date=schedule_date).select_related(
+        'patient__user'
+    ).order_by('appointment_time')
+    
+    def documents():
+        for chunk in _chunks(
+            doctors.select_related('user').prefetch_related(
+                Prefetch('appointments', queryset=appointments, to_attr='day_appointments')
+            ),
+            chunk_size
+        ):
+            for doctor in chunk:
+                yield (
+                    f'schedule_{schedule_date:%Y-%m-%d}_doctor_{doctor.pk}.pdf',
+                    'doctor_schedule',
+                    (doctor, schedule_date, doctor.day_appointments)
+                )
+    
+    return documents(), doctors.count()
+
+
+def moze_report_documents(chunk_size=DEFAULT_CHUNK_SIZE, comments_per_moze=10):
+    """``(documents, total)`` for every active moze"""
+    from moze.models import Moze, MozeComment
+    
+    mozes = Moze.objects.filter(is_active=True)
+    
+    def documents():
+        for chunk in _chunks(
+            mozes.select_related('aamil', 'moze_coordinator').annotate(
+                total_members=Count('team_members', distinct=True),
+                aamils=Count('team_members', filter=Q(team_members__role='aamil'), distinct=True),
+                coordinators=Count('team_members', filter=Q(team_members__role='moze_coordinator'), distinct=True),
+                doctors=Count('team_members', filter=Q(team_members__role='doctor'), distinct=True),
+                students=Count('team_members', filter=Q(team_members__role='student'), distinct=True),
+            ),
+            chunk_size
+        ):
+            comments = {}
+            for comment in MozeComment.objects.filter(moze__in=chunk, is_active=True).annotate(
+                position=Window(RowNumber(), partition_by=[F('moze_id')], order_by=F('created_at').desc())
+            ).filter(position__lte=comments_per_moze).select_related('author').order_by('moze_id', 'position'):
+                comments.setdefault(comment.moze_id, []).append(comment)
+            
+            for moze in chunk:
+                stats = {
+                    key: getattr(moze, key)
+                    for key in ['total_members', 'aamils', 'coordinators', 'doctors', 'students']
+                }
+                yield f'moze_report_{moze.pk}.pdf', 'moze_report', (moze, stats, comments.get(moze.pk, []))
+    
+    return documents(), mozes.count()
+
+
+def pdf_export_progress(request, export_id):
+    """Progress of a batch export started with ``?export_id=``"""
+    if not request.user.is_authenticated or not request.user.is_admin:
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    
+    progress = get_progress(export_id)
+    if progress is None:
+        return JsonResponse({'error': 'Unknown export'}, status=404)
+    return JsonResponse(progress)
@@ -1,19 +1,26 @@
-from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
 from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
-from django.http import HttpResponse
+from django.http import FileResponse
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils import timezone
+from django.utils.html import escape
 from xhtml2pdf import pisa
 from io import BytesIO
 import os
 from datetime import datetime, timedelta
 import logging
 
+from .pdf_images import ImageRenditionCache
+from .pdf_layout import (
+    LIST_TABLE_STYLE, MOZE_STATS_TABLE_STYLE, OPTIONS_TABLE_STYLE, SCHEDULE_TABLE_STYLE, STATS_TABLE_STYLE,
+    PagedTable, get_styles, truncate,
+)
+from .pdf_render import PDFRenderError, PDFRenderService
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,24 +34,16 @@ class PDFGenerator:
         doc = SimpleDocTemplate(buffer, pagesize=letter)
         story = []
         
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            textColor=colors.HexColor('#2c5530')
-        )
+        styles = get_styles()
         
         # Header
         title = f"Daily Schedule - {schedule_date.strftime('%B %d, %Y')}"
-        story.append(Paragraph(title, title_style))
+        story.append(Paragraph(title, styles['ScheduleTitle']))
         
         # Doctor info
         doctor_info = f"""
-        <b>Doctor:</b> Dr. {doctor.user.get_full_name()}<br/>
-        <b>Specialty:</b> {doctor.user.specialty or 'General Practice'}<br/>
+        <b>Doctor:</b> Dr. {doctor.get_full_name()}<br/>
+        <b>Specialty:</b> {doctor.specialty or 'General Practice'}<br/>
         <b>License:</b> {doctor.license_number}<br/>
         <b>Generated:</b> {timezone.now().strftime('%Y-%m-%d %H:%M')}
         """
@@ -56,25 +55,16 @@ class PDFGenerator:
             data = [['Time', 'Patient', 'Reason', 'Status', 'Contact']]
             
             for appointment in appointments:
+                patient_user = appointment.patient.user
                 data.append([
                     appointment.appointment_time.strftime('%H:%M'),
-                    appointment.patient.user.get_full_name(),
-                    appointment.reason_for_visit[:30] + '...' if len(appointment.reason_for_visit) > 30 else appointment.reason_for_visit,
+                    str(appointment.patient),
+                    truncate(appointment.reason_for_visit, 30),
                     appointment.get_status_display(),
-                    appointment.patient.user.phone_number or 'N/A'
+                    (patient_user.phone_number if patient_user else None) or 'N/A'
                 ])
             
-            table = Table(data, colWidths=[1*inch, 2*inch, 2.5*inch, 1*inch, 1.5*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5530')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
+            table = Table(data, colWidths=[1*inch, 2*inch, 2.5*inch, 1*inch, 1.5*inch], style=SCHEDULE_TABLE_STYLE)
             
             story.append(table)
             story.append(Spacer(1, 20))
@@ -94,72 +84,127 @@ class PDFGenerator:
         return buffer
     
     @staticmethod
-    def create_photo_gallery_pdf(album, photos):
-        """Generate PDF for photo gallery/album"""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        story = []
+    def create_photo_gallery_pdf(album, photos, output=None, renditions=None, max_bytes=None):
+        """
+        Generate PDF for photo gallery/album
         
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            spaceAfter=30,
-            textColor=colors.HexColor('#2c5530'),
-            alignment=1  # Center alignment
-        )
+        Photos are embedded as cached renditions downscaled to the size
+        they are printed at, read one at a time while the pages are drawn.
+        Photos that would take the PDF past ``PHOTO_PDF_MAX_BYTES`` are
+        left out and mentioned on the last page. Writes to ``output`` if
+        given.
+        """
+        buffer = output if output is not None else BytesIO()
+        renditions = renditions or ImageRenditionCache()
+        if max_bytes is None:
+            max_bytes = getattr(settings, 'PHOTO_PDF_MAX_BYTES', 20 * 1024 * 1024)
+        
+        styles = get_styles()
+        title_style = styles['GalleryTitle']
+        
+        # Two photos per row in 3 inch cells, each a 2.5 x 2 inch image
+        # with its caption underneath
+        page_width, page_height = A4
+        margin = 0.75 * inch
+        cell_width, image_width, image_height = 3 * inch, 2.5 * inch, 2 * inch
+        row_height = image_height + 0.6 * inch
+        photos_per_row = 2
+        left = (page_width - photos_per_row * cell_width) / 2
         
-        # Title
-        story.append(Paragraph(f"Photo Gallery: {album.name}", title_style))
+        if hasattr(photos, 'iterator'):
+            total = photos.count()
+            photos = photos.iterator(chunk_size=100)
+        else:
+            photos = list(photos)
+            total = len(photos)
+        
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setTitle(f"Photo Gallery: {album.name}")
         
-        # Album info
+        # Title and album info on the first page
+        top = page_height - margin
         album_info = f"""
         <b>Created:</b> {album.created_at.strftime('%B %d, %Y')}<br/>
-        <b>Photos:</b> {photos.count()}<br/>
-        <b>Description:</b> {album.description or 'No description available'}
+        <b>Photos:</b> {total}<br/>
+        <b>Description:</b> {escape(album.description or 'No description available')}
+        """
+        for paragraph, space_after in [
+            (Paragraph(f"Photo Gallery: {escape(album.name)}", title_style), title_style.spaceAfter),
+            (Paragraph(album_info, styles['Normal']), 30),
+        ]:
+            _, height = paragraph.wrapOn(pdf, page_width - 2 * margin, page_height)
+            paragraph.drawOn(pdf, margin, top - height)
+            top -= height + space_after
+        
+        # Each rendition is read, drawn and released before the next one;
+        # the page fills from the top and a new one starts when it is full
+        embedded = included = slot = capacity = 0
+        for photo in photos:
+            if not photo.image:
+                continue
+            try:
+                with renditions.storage.open(renditions.get(photo, image_width, image_height), 'rb') as f:
+                    data = f.read()
+            except Exception as e:
+                logger.warning(f"Could not add image {photo.image.name} to PDF: {e}")
+                continue
+            
+            # JPEG data is embedded as is, ASCII85 encoded (5 bytes per 4)
+            embedded += len(data) * 5 // 4
+            if embedded > max_bytes:
+                break
+            
+            if slot == capacity:
+                if capacity:
+                    pdf.showPage()
+                    top = page_height - margin
+                capacity = int((top - margin) // row_height) * photos_per_row
+                slot = 0
+            
+            x = left + (slot % photos_per_row) * cell_width + (cell_width - image_width) / 2
+            y = top - (slot // photos_per_row) * row_height - image_height
+            pdf.drawImage(
+                ImageReader(BytesIO(data)), x, y, image_width, image_height, preserveAspectRatio=True, anchor='c'
+            )
+            del data
+            
+            # Add caption
+            if photo.title:
+                caption = photo.title[:50] + '...' if len(photo.title) > 50 else photo.title
+                caption = Paragraph(f"<i>{escape(caption)}</i>", styles['Italic'])
+                _, height = caption.wrapOn(pdf, image_width, 0.5 * inch)
+                caption.drawOn(pdf, x, y - 4 - height)
+            slot += 1
+            included += 1
+        
+        if included < total:
+            note = Paragraph(
+                f"<i>{total - included} more photo(s) were left out to keep this PDF under "
+                f"{max_bytes // (1024 * 1024)} MB.</i>",
+                styles['Normal']
+            )
+            _, height = note.wrapOn(pdf, page_width - 2 * margin, inch)
+            note.drawOn(pdf, margin, margin - height)
+        
+        pdf.save()
+        if output is None:
+            buffer.seek(0)
+        return buffer
+    
+    @staticmethod
+    def generate_photo_gallery_pdf(album, request=None):
         """
-        story.append(Paragraph(album_info, styles['Normal']))
-        story.append(Spacer(1, 30))
+        Photo gallery PDF response, served from the PDF cache until the
+        album or one of its photos changes
+        """
+        photos = list(album.photos.only('id', 'image', 'title', 'updated_at').order_by('-created_at'))
         
-        # Photos grid
-        photos_per_row = 2
-        current_row = []
-        
-        for i, photo in enumerate(photos):
-            if photo.image and os.path.exists(photo.image.path):
-                try:
-                    img = Image(photo.image.path, width=2.5*inch, height=2*inch)
-                    current_row.append(img)
-                    
-                    # Add caption
-                    if photo.caption:
-                        caption = Paragraph(f"<i>{photo.caption[:50]}...</i>" if len(photo.caption) > 50 else f"<i>{photo.caption}</i>", styles['Italic'])
-                        current_row.append(caption)
-                    
-                    if len(current_row) >= photos_per_row * 2 or i == len(photos) - 1:
-                        # Create table for this row
-                        if len(current_row) == 1:
-                            current_row.append('')  # Fill empty cell
-                        
-                        table = Table([current_row], colWidths=[3*inch, 3*inch])
-                        table.setStyle(TableStyle([
-                            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ]))
-                        
-                        story.append(table)
-                        story.append(Spacer(1, 10))
-                        current_row = []
-                        
-                except Exception as e:
-                    logger.warning(f"Could not add image {photo.image.path} to PDF: {e}")
-                    continue
+        def prepare():
+            return lambda dest: PDFGenerator.create_photo_gallery_pdf(album, photos, output=dest)
         
-        doc.build(story)
-        buffer.seek(0)
-        return buffer
+        return PDFRenderService().response(
+            request, 'photo_gallery', [album, *photos], f'album_{album.id}.pdf', prepare
+        )
     
     @staticmethod
     def create_survey_report_pdf(survey, analytics_data):
@@ -168,18 +213,10 @@ class PDFGenerator:
         doc = SimpleDocTemplate(buffer, pagesize=A4)
         story = []
         
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=20,
-            textColor=colors.HexColor('#2c5530')
-        )
+        styles = get_styles()
         
         # Title
-        story.append(Paragraph(f"Survey Report: {survey.title}", title_style))
+        story.append(Paragraph(f"Survey Report: {survey.title}", styles['ReportTitle']))
         
         # Survey info
         survey_info = f"""
@@ -199,15 +236,7 @@ class PDFGenerator:
             ['Completion Rate', f"{analytics_data.get('completion_rate', 0)}%"],
         ]
         
-        stats_table = Table(stats_data, colWidths=[2*inch, 2*inch])
-        stats_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5530')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        stats_table = Table(stats_data, colWidths=[2*inch, 2*inch], style=STATS_TABLE_STYLE)
         
         story.append(Paragraph("<b>Survey Statistics</b>", styles['Heading2']))
         story.append(stats_table)
@@ -227,14 +256,7 @@ class PDFGenerator:
                 for option in analysis['options']:
                     data.append([option['text'], str(option['count']), f"{option['percentage']}%"])
                 
-                table = Table(data, colWidths=[3*inch, 1*inch, 1*inch])
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
+                table = Table(data, colWidths=[3*inch, 1*inch, 1*inch], style=OPTIONS_TABLE_STYLE)
                 story.append(table)
             
             elif analysis['type'] == 'rating':
@@ -258,18 +280,10 @@ class PDFGenerator:
         doc = SimpleDocTemplate(buffer, pagesize=A4)
         story = []
         
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=20,
-            textColor=colors.HexColor('#2c5530')
-        )
+        styles = get_styles()
         
         # Title
-        story.append(Paragraph(f"Moze Report: {moze.name}", title_style))
+        story.append(Paragraph(f"Moze Report: {moze.name}", styles['ReportTitle']))
         
         # Moze info
         moze_info = f"""
@@ -293,14 +307,7 @@ class PDFGenerator:
             ['Students', str(stats.get('students', 0))],
         ]
         
-        stats_table = Table(stats_data, colWidths=[2.5*inch, 1.5*inch])
-        stats_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5530')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        stats_table = Table(stats_data, colWidths=[2.5*inch, 1.5*inch], style=MOZE_STATS_TABLE_STYLE)
         
         story.append(Paragraph("<b>Team Statistics</b>", styles['Heading2']))
         story.append(stats_table)
@@ -313,7 +320,7 @@ class PDFGenerator:
             for comment in comments[:10]:  # Limit to 10 comments
                 comment_text = f"""
                 <b>{comment.author.get_full_name()}</b> - {comment.created_at.strftime('%Y-%m-%d %H:%M')}<br/>
-                {comment.content[:200]}{'...' if len(comment.content) > 200 else ''}
+                {truncate(comment.content, 200)}
                 """
                 story.append(Paragraph(comment_text, styles['Normal']))
                 story.append(Spacer(1, 10))
@@ -324,56 +331,55 @@ class PDFGenerator:
     
     @staticmethod
     def create_user_report_pdf(users, title="User Report"):
-        """Generate PDF report for users"""
+        """
+        Generate PDF report for users
+        
+        Querysets are read in chunks and the table is laid out one page
+        of fixed-height rows at a time, so reports of many thousands of
+        users stay fast.
+        """
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4)
         story = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=20,
-            textColor=colors.HexColor('#2c5530')
-        )
+        styles = get_styles()
+        
+        if hasattr(users, 'iterator'):
+            total = users.count()
+            users = users.only(
+                'username', 'first_name', 'last_name', 'arabic_full_name', 'role', 'email', 'phone_number',
+                'date_joined'
+            ).iterator(chunk_size=2000)
+        else:
+            total = len(users)
         
         # Title
-        story.append(Paragraph(title, title_style))
+        story.append(Paragraph(title, styles['ReportTitle']))
         
         # Report info
         report_info = f"""
-        <b>Total Users:</b> {users.count()}<br/>
+        <b>Total Users:</b> {total}<br/>
         <b>Generated:</b> {timezone.now().strftime('%Y-%m-%d %H:%M')}
         """
         story.append(Paragraph(report_info, styles['Normal']))
         story.append(Spacer(1, 20))
         
         # Users table
-        data = [['Name', 'Role', 'Email', 'Phone', 'Date Joined']]
-        
-        for user in users:
-            data.append([
+        rows = (
+            [
                 user.get_full_name() or user.username,
                 user.get_role_display(),
                 user.email or 'N/A',
                 user.phone_number or 'N/A',
                 user.date_joined.strftime('%Y-%m-%d')
-            ])
-        
-        table = Table(data, colWidths=[1.5*inch, 1*inch, 2*inch, 1.2*inch, 1*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5530')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(table)
+            ]
+            for user in users
+        )
+        story.append(PagedTable(
+            ['Name', 'Role', 'Email', 'Phone', 'Date Joined'],
+            rows,
+            [1.5*inch, 1*inch, 2*inch, 1.2*inch, 1*inch],
+            LIST_TABLE_STYLE
+        ))
         
         doc.build(story)
         buffer.seek(0)
@@ -382,73 +388,83 @@ class PDFGenerator:
     @staticmethod
     def create_response_with_pdf(buffer, filename):
         """Create HTTP response with PDF attachment"""
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response.write(buffer.getvalue())
-        buffer.close()
-        return response
+        buffer.seek(0)
+        return FileResponse(buffer, as_attachment=True, filename=filename, content_type='application/pdf')
 
 
 class HTMLToPDFGenerator:
     """Alternative PDF generator using xhtml2pdf for complex HTML layouts"""
     
+    @staticmethod
+    def html_renderer(template_name, context):
+        """
+        Render a Django template now and return a callable that converts
+        it to PDF into a binary file (safe to run outside the request thread)
+        """
+        html_string = render_to_string(template_name, context)
+        
+        def render(dest):
+            pisa_status = pisa.CreatePDF(html_string, dest=dest)
+            if pisa_status.err:
+                raise PDFRenderError(f"xhtml2pdf reported {pisa_status.err} errors rendering {template_name}")
+        
+        return render
+    
     @staticmethod
     def generate_from_template(template_name, context, filename):
         """Generate PDF from Django template"""
         try:
-            # Render template to HTML
-            html_string = render_to_string(template_name, context)
-            
-            # Create PDF
             buffer = BytesIO()
-            pisa_status = pisa.CreatePDF(html_string, dest=buffer)
-            
-            if pisa_status.err:
-                logger.error(f"Error generating PDF: {pisa_status.err}")
-                return None
-            
+            HTMLToPDFGenerator.html_renderer(template_name, context)(buffer)
             buffer.seek(0)
-            
-            # Create response
-            response = HttpResponse(content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            response.write(buffer.getvalue())
-            buffer.close()
-            
-            return response
-            
+            return FileResponse(buffer, as_attachment=True, filename=filename, content_type='application/pdf')
+        
         except Exception as e:
             logger.error(f"Failed to generate PDF: {str(e)}")
             return None
     
     @staticmethod
-    def generate_prescription_pdf(prescription):
-        """Generate prescription PDF"""
-        context = {
-            'prescription': prescription,
-            'doctor': prescription.doctor,
-            'patient': prescription.patient,
-            'generated_date': timezone.now(),
-        }
-        
-        return HTMLToPDFGenerator.generate_from_template(
-            'pdf_templates/prescription.html',
-            context,
-            f'prescription_{prescription.id}.pdf'
+    def generate_prescription_pdf(prescription, request=None):
+        """
+        Prescription PDF response, served from the PDF cache until the
+        prescription or its patient changes
+        """
+        def prepare():
+            context = {
+                'prescription': prescription,
+                'doctor': prescription.doctor,
+                'patient': prescription.patient,
+                'generated_date': timezone.now(),
+            }
+            return HTMLToPDFGenerator.html_renderer('pdf_templates/prescription.html', context)
+        
+        return PDFRenderService().response(
+            request,
+            'prescription',
+            [prescription, prescription.patient],
+            f'prescription_{prescription.id}.pdf',
+            prepare
         )
     
     @staticmethod
-    def generate_medical_record_pdf(medical_record):
-        """Generate medical record PDF"""
-        context = {
-            'medical_record': medical_record,
-            'doctor': medical_record.doctor,
-            'patient': medical_record.patient,
-            'generated_date': timezone.now(),
-        }
-        
-        return HTMLToPDFGenerator.generate_from_template(
-            'pdf_templates/medical_record.html',
-            context,
-            f'medical_record_{medical_record.id}.pdf'
-        )
\ No newline at end of file
+    def generate_medical_record_pdf(medical_record, request=None):
+        """
+        Medical record PDF response, served from the PDF cache until the
+        record or its patient changes
+        """
+        def prepare():
+            context = {
+                'medical_record': medical_record,
+                'doctor': medical_record.doctor,
+                'patient': medical_record.patient,
+                'generated_date': timezone.now(),
+            }
+            return HTMLToPDFGenerator.html_renderer('pdf_templates/medical_record.html', context)
+        
+        return PDFRenderService().response(
+            request,
+            'medical_record',
+            [medical_record, medical_record.patient],
+            f'medical_record_{medical_record.id}.pdf',
+            prepare
+        )
@@ -0,0 +1,78 @@
+"""
+Downscaled image renditions for PDFs.
+
+Photos are uploaded at full camera resolution, far more than a PDF needs
+for a few inches of page. A rendition is a JPEG of the photo scaled to
+the size it is printed at, at ``PHOTO_PDF_DPI``. Renditions are kept in
+the private PDF cache storage, outside the public media tree, keyed like cached PDFs by the photo's pk
+and ``updated_at``, so each photo is only decoded at full size once.
+"""
+from io import BytesIO
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .pdf_render import document_key, get_pdf_cache_storage
+
+logger = logging.getLogger(__name__)
+
+RENDITION_DIR = 'renditions'
+RENDITION_QUALITY = 80
+
+
+class ImageRenditionCache:
+    """Create and look up downscaled JPEG renditions of ``Photo`` images"""
+    
+    def __init__(self, storage=None, dpi=None, quality=RENDITION_QUALITY):
+        self.storage = storage or get_pdf_cache_storage()
+        self.dpi = dpi or getattr(settings, 'PHOTO_PDF_DPI', 150)
+        self.quality = quality
+    
+    def pixel_size(self, width, height):
+        """Pixels needed to print ``width`` x ``height`` points at the target DPI"""
+        return round(width / 72 * self.dpi), round(height / 72 * self.dpi)
+    
+    def storage_name(self, photo, size):
+        key = document_key(f'rendition:{self.quality}', photo)
+        return posixpath.join(RENDITION_DIR, str(photo.pk), f'{size[0]}x{size[1]}', f'{key}.jpg')
+    
+    def _downscale(self, photo, size):
+        with photo.image.open('rb') as source, Image.open(source) as image:
+            # Let the JPEG decoder scale down while decoding, so the full
+            # resolution bitmap is never held in memory
+            image.draft('RGB', size)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(size, Image.LANCZOS)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=self.quality, optimize=True)
+            image.close()
+        return output.getvalue()
+    
+    def get(self, photo, width, height):
+        """
+        Storage name of a rendition of ``photo`` fitting ``width`` x
+        ``height`` points, creating it on a miss
+        """
+        size = self.pixel_size(width, height)
+        name = self.storage_name(photo, size)
+        if self.storage.exists(name):
+            return name
+        
+        saved = self.storage.save(name, ContentFile(self._downscale(photo, size)))
+        if saved != name:
+            # Another worker created the same rendition first
+            self.storage.delete(saved)
+            return name
+        
+        # Renditions of earlier versions of the photo are no longer used
+        directory = posixpath.dirname(name)
+        _, files = self.storage.listdir(directory)
+        for filename in files:
+            if filename != posixpath.basename(name):
+                self.storage.delete(posixpath.join(directory, filename))
+        return name
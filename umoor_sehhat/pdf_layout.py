@@ -0,0 +1,137 @@
+"""
+Shared layout pieces for the ReportLab documents in ``pdf_generator``.
+
+Paragraph and table styles are built once per process instead of on
+every call; they are shared, so callers must not modify them. Large
+tables are laid out by ``PagedTable`` as one ``Table`` of fixed-height
+rows per page: ReportLab measures every remaining row again each time it
+splits one long table across a page, which made reports with thousands
+of rows spend most of their time re-measuring rows.
+"""
+from functools import lru_cache
+import itertools
+
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import Flowable, Table, TableStyle
+
+BRAND_COLOR = colors.HexColor('#2c5530')
+
+
+@lru_cache(maxsize=None)
+def get_styles():
+    """ReportLab's sample stylesheet plus the titles used by our reports"""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        'ReportTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=20,
+        textColor=BRAND_COLOR
+    ))
+    styles.add(ParagraphStyle('ScheduleTitle', parent=styles['ReportTitle'], spaceAfter=30))
+    styles.add(ParagraphStyle(
+        'GalleryTitle',
+        parent=styles['ReportTitle'],
+        fontSize=20,
+        spaceAfter=30,
+        alignment=1  # Center alignment
+    ))
+    return styles
+
+
+# Tables with a header row
+HEADER_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), BRAND_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+SCHEDULE_TABLE_STYLE = TableStyle([
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+], parent=HEADER_TABLE_STYLE)
+STATS_TABLE_STYLE = TableStyle([
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+], parent=HEADER_TABLE_STYLE)
+MOZE_STATS_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+], parent=HEADER_TABLE_STYLE)
+OPTIONS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+], parent=HEADER_TABLE_STYLE)
+LIST_TABLE_STYLE = TableStyle([
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+], parent=HEADER_TABLE_STYLE)
+
+
+def truncate(text, length):
+    """``text`` cut to ``length`` characters, with an ellipsis if it was longer"""
+    text = text or ''
+    return text[:length] + '...' if len(text) > length else text
+
+
+class PagedTable(Flowable):
+    """
+    A table of ``rows`` under a ``header`` row, laid out a page at a time.
+    
+    Whenever the frame asks for a split, the rows that fit the space left
+    become one ``Table`` with the header on top, so the first page starts
+    below whatever precedes the table and no page repeats the header.
+    Rows are read from ``rows`` only as pages are filled and get a fixed
+    height so ReportLab never measures their contents; they must be
+    single lines of text that fit their column.
+    """
+    
+    def __init__(self, header, rows, col_widths, style, row_height=16, header_height=18):
+        super().__init__()
+        self.header = header
+        self.rows = iter(rows)
+        self.col_widths = col_widths
+        self.style = style
+        self.row_height = row_height
+        self.header_height = header_height
+        self.hAlign = 'CENTER'
+        self.buffered = []
+    
+    def _rows_fitting(self, avail_height):
+        return int((avail_height - self.header_height) // self.row_height)
+    
+    def _buffer(self, count):
+        """Read rows until ``count`` are buffered or ``rows`` runs out"""
+        if len(self.buffered) < count:
+            self.buffered.extend(itertools.islice(self.rows, count - len(self.buffered)))
+    
+    def _table(self, rows):
+        return Table(
+            [self.header] + rows,
+            colWidths=self.col_widths,
+            rowHeights=[self.header_height] + [self.row_height] * len(rows),
+            style=self.style
+        )
+    
+    def wrap(self, avail_width, avail_height):
+        # One row more than fits is enough to know whether a split is needed
+        self._buffer(max(self._rows_fitting(avail_height), 0) + 1)
+        self.width = sum(self.col_widths)
+        self.height = self.header_height + self.row_height * len(self.buffered)
+        return self.width, self.height
+    
+    def split(self, avail_width, avail_height):
+        fitting = self._rows_fitting(avail_height)
+        if fitting < 1:
+            return []
+        self._buffer(fitting + 1)
+        rest = PagedTable(
+            self.header, self.rows, self.col_widths, self.style, self.row_height, self.header_height
+        )
+        rest.buffered = self.buffered[fitting:]
+        return [self._table(self.buffered[:fitting]), rest]
+    
+    def draw(self):
+        table = self._table(self.buffered)
+        table.wrapOn(self.canv, self.width, self.height)
+        table.drawOn(self.canv, 0, 0)
@@ -0,0 +1,163 @@
+"""
+Content-addressed PDF rendering.
+
+A document is keyed by a hash of what it is rendered from: its kind and
+the pk and ``updated_at`` of each object it shows. Rendered PDFs are kept
+under that key in private storage at ``PDF_CACHE_ROOT``, outside the
+public media tree, so repeat downloads are served straight from
+storage until one of the objects changes. On a miss the template is
+rendered in the request thread (it reads the database) and the slow PDF
+conversion runs in a background worker pool, writing to a temporary file
+that is then stored and streamed back with ``FileResponse``.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import hashlib
+import logging
+import posixpath
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every cached PDF, e.g. after changing a PDF template
+PDF_RENDER_VERSION = 1
+
+
+class PDFRenderError(Exception):
+    """Raised when a PDF could not be rendered"""
+
+
+class PrivateStorage(FileSystemStorage):
+    """File system storage whose files have no URL; views stream them after checking permissions"""
+    
+    def url(self, name):
+        raise ValueError('Files in private storage are not served by URL')
+
+
+def get_pdf_cache_storage():
+    """Private storage for cached PDFs and image renditions"""
+    return PrivateStorage(
+        location=getattr(settings, 'PDF_CACHE_ROOT', settings.BASE_DIR / 'private' / 'pdf_cache')
+    )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_render_executor():
+    """Process-wide worker pool for PDF conversion, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PDF_RENDER_WORKERS', 2),
+                thread_name_prefix='pdf-render'
+            )
+        return _executor
+
+
+def document_key(kind, *instances):
+    """Hash identifying the rendering of ``kind`` for these objects as they are now"""
+    parts = [kind, str(getattr(settings, 'PDF_RENDER_VERSION', PDF_RENDER_VERSION))]
+    for instance in instances:
+        updated_at = getattr(instance, 'updated_at', None)
+        parts.append(f"{instance._meta.label_lower}:{instance.pk}:{updated_at.isoformat() if updated_at else ''}")
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+class PDFRenderService:
+    """
+    Serve PDFs from the storage cache, rendering them on a miss.
+    
+    Renders of the same document requested while one is in progress wait
+    for that render instead of starting another.
+    """
+    
+    _pending = {}
+    _pending_lock = threading.Lock()
+    
+    def __init__(self, storage=None, executor=None, wait_seconds=None):
+        self.storage = storage or get_pdf_cache_storage()
+        self.executor = executor or get_render_executor()
+        self.wait_seconds = wait_seconds if wait_seconds is not None else getattr(settings, 'PDF_RENDER_WAIT_SECONDS', 30)
+    
+    @staticmethod
+    def storage_name(kind, instance, key):
+        return posixpath.join(kind, str(instance.pk), f'{key}.pdf')
+    
+    def _store(self, name, render):
+        with tempfile.TemporaryFile() as tmp:
+            render(tmp)
+            tmp.seek(0)
+            saved = self.storage.save(name, File(tmp, name=posixpath.basename(name)))
+        if saved != name:
+            # Another process stored the same document first
+            self.storage.delete(saved)
+            return name
+        
+        # Earlier versions of the document are no longer reachable
+        directory = posixpath.dirname(name)
+        _, files = self.storage.listdir(directory)
+        for filename in files:
+            if filename != posixpath.basename(name):
+                self.storage.delete(posixpath.join(directory, filename))
+        return name
+    
+    def _render_async(self, name, prepare):
+        with self._pending_lock:
+            future = self._pending.get(name)
+            if future is None:
+                future = self.executor.submit(self._store, name, prepare())
+                self._pending[name] = future
+                future.add_done_callback(lambda _: self._pending.pop(name, None))
+        return future
+    
+    def get_or_render(self, kind, instances, prepare):
+        """
+        Storage name of the cached PDF, rendering it first on a miss.
+        
+        ``prepare()`` is only called on a miss, in the calling thread; it
+        returns a callable that writes the PDF to a binary file and runs
+        in a worker, so it must not touch the database. Raises
+        ``concurrent.futures.TimeoutError`` if the render takes longer
+        than ``wait_seconds`` (it carries on in the background).
+        """
+        key = document_key(kind, *instances)
+        name = self.storage_name(kind, instances[0], key)
+        if self.storage.exists(name):
+            return name
+        
+        return self._render_async(name, prepare).result(timeout=self.wait_seconds)
+    
+    def response(self, request, kind, instances, filename, prepare):
+        """
+        ``FileResponse`` streaming the PDF, 202 while it is still rendering
+        or None if it could not be rendered
+        """
+        key = document_key(kind, *instances)
+        etag = f'"{key}"'
+        if request is not None and request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified()
+        
+        try:
+            name = self.get_or_render(kind, instances, prepare)
+        except FutureTimeoutError:
+            response = HttpResponse('The PDF is being generated, please try again in a moment.', status=202)
+            response['Retry-After'] = '5'
+            return response
+        except Exception as e:
+            logger.error(f"Failed to render {kind} PDF for {instances[0].pk}: {str(e)}")
+            return None
+        
+        response = FileResponse(
+            self.storage.open(name, 'rb'), as_attachment=True, filename=filename, content_type='application/pdf'
+        )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,293 @@
+"""
+Scheduled jobs with cron-like specs, run at most once per occurrence.
+
+Jobs are registered on ``jobs`` with a five-field cron spec evaluated in
+the site's time zone. ``run_due_jobs`` (the ``run_due_jobs`` command,
+called from cron every few minutes on every node) runs each job's most
+recent occurrence unless it already succeeded. A ``ScheduledJobRun`` row
+per occurrence is the lease, so only one node runs it; a heartbeat renews
+the lease while the job runs. Jobs commit their own work in short
+transactions as they go, so a failed run keeps what it finished and its
+retry should skip work already recorded, as the survey and digest jobs do.
+"""
+from datetime import datetime, timedelta
+import logging
+import os
+import socket
+import threading
+import time as timer
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 15 * 60
+DEFAULT_MAX_ATTEMPTS = 3
+# Occurrences missed by longer than this (e.g. while no node was running
+# the command) are skipped rather than run late
+DEFAULT_GRACE_SECONDS = 6 * 60 * 60
+
+
+class CronSpec:
+    """
+    A ``minute hour day-of-month month day-of-week`` schedule.
+    
+    Fields accept ``*``, numbers, ranges (``1-5``), lists (``1,15``) and
+    steps (``*/15``, ``8-18/2``); day of week runs 0-6 from Sunday, and 7
+    is also Sunday. As in cron, when both day fields are restricted a day
+    matching either one is scheduled.
+    """
+    
+    FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+    # How far back previous() searches, enough for yearly specs
+    MAX_LOOKBACK_DAYS = 366 * 4 + 1
+    
+    def __init__(self, spec):
+        parts = spec.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron spec must have 5 fields: {spec!r}")
+        self.spec = spec
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)
+        ]
+        self.weekdays = {day % 7 for day in weekdays}
+        self.days_restricted = parts[2] != '*'
+        self.weekdays_restricted = parts[4] != '*'
+    
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for item in field.split(','):
+            step = 1
+            if '/' in item:
+                item, step = item.split('/', 1)
+                step = int(step)
+            if item == '*':
+                start, end = low, high
+            elif '-' in item:
+                start, end = (int(value) for value in item.split('-', 1))
+            else:
+                start = end = int(item)
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError(f"Invalid cron field {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def __str__(self):
+        return self.spec
+    
+    def matches_day(self, day):
+        if day.month not in self.months:
+            return False
+        day_match = day.day in self.days
+        # isoweekday() is 1-7 from Monday; cron counts 0-6 from Sunday
+        weekday_match = day.isoweekday() % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_match or weekday_match
+        return day_match and weekday_match
+    
+    def previous(self, now):
+        """Most recent scheduled time at or before ``now``, in ``now``'s time zone"""
+        now = now.replace(second=0, microsecond=0)
+        hours = sorted(self.hours, reverse=True)
+        minutes = sorted(self.minutes, reverse=True)
+        for offset in range(self.MAX_LOOKBACK_DAYS):
+            day = (now - timedelta(days=offset)).date()
+            if not self.matches_day(day):
+                continue
+            for hour in hours:
+                if offset == 0 and hour > now.hour:
+                    continue
+                for minute in minutes:
+                    if offset == 0 and hour == now.hour and minute > now.minute:
+                        continue
+                    return timezone.make_aware(datetime(day.year, day.month, day.day, hour, minute), now.tzinfo)
+        return None
+
+
+class Job:
+    """A registered job: a callable run once per occurrence of ``schedule``"""
+    
+    def __init__(self, name, schedule, func, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 grace_seconds=DEFAULT_GRACE_SECONDS):
+        self.name = name
+        self.schedule = CronSpec(schedule)
+        self.func = func
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.grace_seconds = grace_seconds
+    
+    def __repr__(self):
+        return f"<Job {self.name} '{self.schedule}'>"
+    
+    def due_occurrence(self, now=None):
+        """The occurrence to run now, or None if the latest is past its grace period"""
+        now = timezone.localtime(now or timezone.now())
+        scheduled_for = self.schedule.previous(now)
+        if scheduled_for is None or now - scheduled_for > timedelta(seconds=self.grace_seconds):
+            return None
+        return scheduled_for
+
+
+class JobRegistry:
+    """Named jobs; settings.SCHEDULED_JOBS may override schedules by name"""
+    
+    def __init__(self):
+        self._jobs = {}
+    
+    def register(self, name, schedule, func=None, **options):
+        """Register ``func`` under ``name``; usable as a decorator"""
+        if func is None:
+            return lambda func: self.register(name, schedule, func, **options)
+        
+        schedule = getattr(settings, 'SCHEDULED_JOBS', {}).get(name, schedule)
+        self._jobs[name] = Job(name, schedule, func, **options)
+        return func
+    
+    def get(self, name):
+        try:
+            return self._jobs[name]
+        except KeyError:
+            raise ValueError(f"Unknown scheduled job: {name}")
+    
+    def __iter__(self):
+        return iter(sorted(self._jobs.values(), key=lambda job: job.name))
+    
+    def __len__(self):
+        return len(self._jobs)
+
+
+jobs = JobRegistry()
+
+
+class JobRunner:
+    """Acquire, run and record job occurrences on behalf of this node"""
+    
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else jobs
+        self.node = f'{socket.gethostname()}:{os.getpid()}'
+    
+    def acquire(self, job, scheduled_for, now):
+        """
+        Take the lease on one occurrence, returning its run or None.
+        
+        A new occurrence is claimed by inserting its row; an existing one
+        only when it failed with attempts left or its lease has expired.
+        """
+        from accounts.models import ScheduledJobRun
+        
+        owner = f'{self.node}:{uuid.uuid4().hex[:12]}'
+        lease_expires_at = now + timedelta(seconds=job.lease_seconds)
+        try:
+            with transaction.atomic():
+                return ScheduledJobRun.objects.create(
+                    job_name=job.name,
+                    scheduled_for=scheduled_for,
+                    owner=owner,
+                    lease_expires_at=lease_expires_at,
+                    started_at=now
+                )
+        except IntegrityError:
+            pass
+        
+        claimed = ScheduledJobRun.objects.filter(job_name=job.name, scheduled_for=scheduled_for).filter(
+            Q(status='failed', attempts__lt=job.max_attempts) | Q(status='running', lease_expires_at__lt=now)
+        ).update(
+            status='running',
+            owner=owner,
+            lease_expires_at=lease_expires_at,
+            attempts=F('attempts') + 1,
+            started_at=now,
+            finished_at=None,
+            error=''
+        )
+        if not claimed:
+            return None
+        return ScheduledJobRun.objects.get(job_name=job.name, scheduled_for=scheduled_for)
+    
+    def renew_lease(self, job, run):
+        """Extend the lease on a running occurrence; False once it was lost"""
+        from accounts.models import ScheduledJobRun
+        
+        return bool(ScheduledJobRun.objects.filter(pk=run.pk, owner=run.owner, status='running').update(
+            lease_expires_at=timezone.now() + timedelta(seconds=job.lease_seconds)
+        ))
+    
+    def _heartbeat(self, job, run, stop):
+        """Renew the lease every third of its length until ``stop`` is set"""
+        try:
+            while not stop.wait(job.lease_seconds / 3):
+                try:
+                    if not self.renew_lease(job, run):
+                        logger.warning(f"Scheduled job {job.name} for {run.scheduled_for} lost its lease")
+                        return
+                except Exception as e:
+                    logger.error(f"Error renewing lease of scheduled job {job.name}: {str(e)}")
+        finally:
+            connection.close()
+    
+    def run(self, job, run):
+        """Run an acquired occurrence, renewing its lease until the job returns"""
+        from accounts.models import ScheduledJobRun
+        
+        started = timer.perf_counter()
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, run, stop), daemon=True)
+        heartbeat.start()
+        try:
+            result = job.func()
+        except Exception as e:
+            logger.error(f"Scheduled job {job.name} for {run.scheduled_for} failed: {str(e)}")
+            ScheduledJobRun.objects.filter(pk=run.pk, owner=run.owner).update(
+                status='failed',
+                finished_at=timezone.now(),
+                duration_seconds=timer.perf_counter() - started,
+                error=str(e)
+            )
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+        
+        finished = ScheduledJobRun.objects.filter(pk=run.pk, owner=run.owner, status='running').update(
+            status='succeeded',
+            finished_at=timezone.now(),
+            duration_seconds=timer.perf_counter() - started,
+            result=result if isinstance(result, int) else None
+        )
+        if not finished:
+            logger.error(f"Scheduled job {job.name} for {run.scheduled_for} lost its lease before it finished")
+            return False
+        
+        logger.info(f"Scheduled job {job.name} for {run.scheduled_for} finished in {timer.perf_counter() - started:.2f}s")
+        return True
+    
+    def run_due(self, names=None, now=None):
+        """
+        Run every due occurrence this node can acquire
+        
+        Returns ``[(job name, scheduled_for, outcome)]`` where outcome is
+        'succeeded', 'failed' or 'skipped' (already done or held elsewhere).
+        """
+        now = now or timezone.now()
+        selected = [self.registry.get(name) for name in names] if names else list(self.registry)
+        
+        outcomes = []
+        for job in selected:
+            scheduled_for = job.due_occurrence(now)
+            if scheduled_for is None:
+                continue
+            run = self.acquire(job, scheduled_for, now)
+            if run is None:
+                outcomes.append((job.name, scheduled_for, 'skipped'))
+                continue
+            outcomes.append((job.name, scheduled_for, 'succeeded' if self.run(job, run) else 'failed'))
+        return outcomes
+
+
+def run_due_jobs(names=None, now=None):
+    return JobRunner().run_due(names=names, now=now)
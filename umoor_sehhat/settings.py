@@ -221,6 +221,14 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Cached PDFs and photo renditions hold patient data and private photos;
+# they live outside MEDIA_ROOT so they are only ever served by views
+# that check permissions
+PDF_CACHE_ROOT = BASE_DIR / 'private' / 'pdf_cache'
+
+# Worker processes rendering batch PDF exports, shared by all exports
+PDF_BATCH_WORKERS = 2
+
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -21,6 +21,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.shortcuts import redirect
 
+from .pdf_batch import pdf_export_progress
+
 
 def dashboard_redirect(request):
     """Redirect root URL to dashboard based on user role"""
@@ -58,6 +60,7 @@ urlpatterns = [
     path('surveys/', include('surveys.urls')),
     path('photos/', include('photos.urls')),
     path('bulk-upload/', include('bulk_upload.urls')),
+    path('exports/<str:export_id>/progress/', pdf_export_progress, name='pdf_export_progress'),
 
     # API URLs
     path('api/', include('accounts.api_urls')),